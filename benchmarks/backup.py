@@ -0,0 +1,126 @@
+"""Benchmark of online backups and the stall they cause for writers.
+
+A synthetic guild is imported into a database file, then a writer keeps adding
+and removing tags through `SqliteTagRepository`, like members using the bot
+would. Write latencies are measured without a backup first, then while
+`bot.backup.create_backup` runs in a thread like the bot runs it. Run it from
+the repository root with:
+
+    python -m benchmarks.backup --members 100000
+
+The results are printed as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from collections.abc import AsyncIterator, Iterable
+from pathlib import Path
+
+import aiosqlite
+
+from benchmarks.synthetic import generate_guild
+from bot.backup import create_backup
+from bot.repositories.tags import SqliteTagRepository, TagRow
+
+GUILD_ID = 1
+
+
+async def stream(rows: Iterable[TagRow]) -> AsyncIterator[TagRow]:
+    for row in rows:
+        yield row
+
+
+def summarize(latencies: list[float]) -> dict[str, float | int]:
+    latencies = sorted(latencies)
+    return {
+        "writes": len(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+async def write_until(repository: SqliteTagRepository, members: int, done: asyncio.Event) -> list[float]:
+    """Toggle a tag of members one by one, timing each write."""
+    latencies: list[float] = []
+    user_id = 0
+    while not done.is_set():
+        user_id = user_id % members + 1
+        start = time.perf_counter()
+        await repository.add(GUILD_ID, user_id, ["unix"], greeter=False)
+        await repository.remove_tag(GUILD_ID, user_id, "unix")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def benchmark(
+    members: int,
+    pages_per_step: int,
+    step_delay: float,
+    baseline: float,
+    seed: int,
+) -> dict[str, object]:
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = str(Path(directory) / "zz.db")
+
+        async with aiosqlite.connect(database_path) as connection:
+            repository = SqliteTagRepository(connection)
+            await repository.initialize()
+            await repository.import_rows(stream(generate_guild(GUILD_ID, members, seed=seed)))
+
+            done = asyncio.Event()
+            writer = asyncio.create_task(write_until(repository, members, done))
+            await asyncio.sleep(baseline)
+            done.set()
+            without_backup = await writer
+
+            done = asyncio.Event()
+            writer = asyncio.create_task(write_until(repository, members, done))
+            report = await asyncio.to_thread(
+                create_backup,
+                database_path,
+                str(Path(directory) / "backups"),
+                pages_per_step,
+                step_delay,
+            )
+            done.set()
+            during_backup = await writer
+
+        database_bytes = Path(database_path).stat().st_size
+
+    return {
+        "members": members,
+        "database_bytes": database_bytes,
+        "pages_per_step": pages_per_step,
+        "step_delay_s": step_delay,
+        "backup": {
+            "pages": report.pages,
+            "steps": report.steps,
+            "restarts": report.restarts,
+            "duration_s": report.duration,
+            "longest_step_ms": report.longest_step * 1000,
+        },
+        "writes_without_backup": summarize(without_backup),
+        "writes_during_backup": summarize(during_backup),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--pages-per-step", type=int, default=256)
+    parser.add_argument("--step-delay", type=float, default=0.05)
+    parser.add_argument("--baseline", type=float, default=5.0, help="seconds of writes measured without a backup")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    result = asyncio.run(benchmark(args.members, args.pages_per_step, args.step_delay, args.baseline, args.seed))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
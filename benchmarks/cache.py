@@ -0,0 +1,228 @@
+"""Memory benchmark of the gateway cache, with and without `Settings.lean_cache`.
+
+For each configuration, a bot is created with the intents and cache options
+the real bot would use (see `bot.cache`), without connecting to Discord. The
+gateway events Discord would send it for its intents are then fed straight to
+disnake's connection state: a GUILD_CREATE per guild, the member chunks
+requested at startup, and messages. The memory still held once they've been
+processed is measured with tracemalloc, which only sees Python's allocations.
+Run it from the repository root with:
+
+    python -m benchmarks.cache --guilds 1000 --members 500 --messages 20000
+
+The results are printed as JSON, with the memory per 1k guilds.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import random
+import time
+import tracemalloc
+from typing import Any
+
+import disnake
+from disnake import ClientUser, Member
+from disnake.ext.commands import AutoShardedInteractionBot
+
+from bot.cache import gateway_options
+from bot.settings import Settings
+
+BOT_USER_ID = 1
+ROLES_PER_GUILD = 10
+CHANNELS_PER_GUILD = 20
+# Discord only sends the members of guilds this small in their GUILD_CREATE
+LARGE_THRESHOLD = 250
+JOINED_AT = "2024-01-01T00:00:00+00:00"
+
+
+def user_payload(user_id: int) -> dict[str, Any]:
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id}",
+        "discriminator": "0",
+        "global_name": None,
+        "avatar": None,
+    }
+
+
+def member_payload(user_id: int, role_ids: list[int]) -> dict[str, Any]:
+    return {
+        "user": user_payload(user_id),
+        "roles": [str(role_id) for role_id in role_ids],
+        "joined_at": JOINED_AT,
+        "deaf": False,
+        "mute": False,
+    }
+
+
+def guild_payload(guild_id: int, members: list[dict[str, Any]], member_count: int) -> dict[str, Any]:
+    return {
+        "id": str(guild_id),
+        "name": f"guild{guild_id}",
+        "owner_id": str(BOT_USER_ID),
+        "icon": None,
+        "features": [],
+        "verification_level": 0,
+        "default_message_notifications": 0,
+        "explicit_content_filter": 0,
+        "mfa_level": 0,
+        "system_channel_flags": 0,
+        "premium_tier": 0,
+        "preferred_locale": "en-US",
+        "nsfw_level": 0,
+        "member_count": member_count,
+        "large": member_count > LARGE_THRESHOLD,
+        "roles": [
+            {
+                "id": str(guild_id + index),
+                "name": "@everyone" if index == 0 else f"role{index}",
+                "permissions": "0",
+                "position": index,
+                "color": 0,
+                "colors": {"primary_color": 0, "secondary_color": None, "tertiary_color": None},
+                "hoist": False,
+                "managed": False,
+                "mentionable": False,
+            }
+            for index in range(ROLES_PER_GUILD)
+        ],
+        "channels": [
+            {
+                "id": str(guild_id + 100 + index),
+                "type": 0,
+                "name": f"channel{index}",
+                "position": index,
+                "topic": "A channel",
+                "permission_overwrites": [],
+            }
+            for index in range(CHANNELS_PER_GUILD)
+        ],
+        "members": members,
+        "emojis": [],
+        "stickers": [],
+        "voice_states": [],
+        "presences": [],
+        "threads": [],
+        "guild_scheduled_events": [],
+        "stage_instances": [],
+    }
+
+
+def message_payload(message_id: int, guild_id: int, author_id: int) -> dict[str, Any]:
+    return {
+        "id": str(message_id),
+        "channel_id": str(guild_id + 100),
+        "guild_id": str(guild_id),
+        "author": user_payload(author_id),
+        "member": {"roles": [], "joined_at": JOINED_AT, "deaf": False, "mute": False},
+        "content": "Hello there! Has anyone tried the new release yet?",
+        "timestamp": JOINED_AT,
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+
+
+def feed_events(bot: AutoShardedInteractionBot, arguments: argparse.Namespace) -> None:
+    """Feed the bot the events Discord would send it for its intents."""
+    state = bot._connection  # noqa: SLF001
+    intents = bot.intents
+    rng = random.Random(arguments.seed)
+    guild_ids = [(index + 1) << 22 for index in range(arguments.guilds)]
+
+    for guild_id in guild_ids:
+        members = [member_payload(BOT_USER_ID, [])]
+        member_ids = range(guild_id + 1000, guild_id + 1000 + arguments.members)
+        if intents.members and arguments.members <= LARGE_THRESHOLD:
+            members += [member_payload(user_id, [guild_id + 1]) for user_id in member_ids]
+
+        guild = state._add_guild_from_data(guild_payload(guild_id, members, arguments.members + 1))  # noqa: SLF001  # pyright: ignore[reportArgumentType]
+
+        # Chunking caches the whole member list, whatever the member cache flags
+        if intents.members and state._guild_needs_chunking(guild):  # noqa: SLF001
+            for user_id in member_ids:
+                guild._add_member(Member(data=member_payload(user_id, [guild_id + 1]), guild=guild, state=state))  # noqa: SLF001  # pyright: ignore[reportArgumentType]
+
+    if intents.guild_messages:
+        for message_id in range(arguments.messages):
+            guild_id = rng.choice(guild_ids)
+            author_id = guild_id + 1000 + rng.randrange(arguments.members)
+            state.parse_message_create(message_payload(message_id + 1, guild_id, author_id))  # pyright: ignore[reportArgumentType]
+
+
+async def measure(arguments: argparse.Namespace, *, lean_cache: bool, members_intent: bool) -> dict[str, Any]:
+    settings = Settings(
+        discord_bot_token="benchmark",  # noqa: S106
+        ollama_host="localhost",
+        ollama_model="benchmark",
+        lean_cache=lean_cache,
+        members_intent=members_intent,
+    )
+    bot = AutoShardedInteractionBot(**gateway_options(settings))
+    bot._connection.user = ClientUser(state=bot._connection, data=user_payload(BOT_USER_ID))  # noqa: SLF001  # pyright: ignore[reportArgumentType]
+
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+
+    feed_events(bot, arguments)
+    # Let the tasks events were dispatched to finish, so they don't count
+    await asyncio.sleep(0)
+
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    result = {
+        "intents": [name for name, enabled in bot.intents if enabled],
+        "cached_guilds": len(bot.guilds),
+        "cached_members": sum(len(guild.members) for guild in bot.guilds),
+        "cached_messages": len(bot.cached_messages),
+        "memory_bytes": after - before,
+        "memory_bytes_per_1k_guilds": (after - before) / len(bot.guilds) * 1000,
+        "peak_memory_bytes": peak - before,
+        "processing_s": elapsed,
+    }
+    await bot.close()
+    return result
+
+
+async def benchmark(arguments: argparse.Namespace) -> dict[str, Any]:
+    results: dict[str, Any] = {
+        "config": {
+            "guilds": arguments.guilds,
+            "members_per_guild": arguments.members,
+            "messages": arguments.messages,
+            "disnake": disnake.__version__,
+        },
+    }
+    for members_intent in (False, True):
+        for lean_cache in (False, True):
+            name = f"members_intent={members_intent},lean_cache={lean_cache}"
+            results[name] = await measure(arguments, lean_cache=lean_cache, members_intent=members_intent)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--guilds", type=int, default=1000)
+    parser.add_argument("--members", type=int, default=500, help="members per guild")
+    parser.add_argument("--messages", type=int, default=20_000, help="messages sent across all guilds")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    print(json.dumps(asyncio.run(benchmark(arguments)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
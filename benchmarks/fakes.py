@@ -0,0 +1,217 @@
+"""Fake Discord objects, for driving the cogs without a Discord connection.
+
+Only what the cogs use is implemented. Every call that would be an HTTP
+request to Discord sleeps for a configurable round trip instead, so latencies
+include Discord's share.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from types import SimpleNamespace
+from typing import Any
+
+import disnake
+from disnake import InteractionResponded, NotFound
+from disnake.ui import View
+
+
+@dataclass
+class DiscordLatency:
+    """How long, in seconds, a round trip to Discord's API takes."""
+
+    round_trip: float = 0.05
+
+    async def wait(self) -> None:
+        await asyncio.sleep(self.round_trip)
+
+
+@dataclass(eq=False)
+class FakeRole:
+    id: int
+    name: str
+
+    @property
+    def mention(self) -> str:
+        return f"<@&{self.id}>"
+
+
+@dataclass(eq=False)
+class FakeChannel:
+    id: int
+    name: str
+    topic: str | None = None
+
+
+class FakeMember(disnake.Member):
+    """A guild member.
+
+    This subclasses `disnake.Member`, since the cogs check for it. Member's
+    attributes are backed by Discord payloads, so they're shadowed here with
+    plain class attributes that the constructor overrides.
+    """
+
+    id = name = nick = guild = roles = mention = joined_at = display_avatar = None  # pyright: ignore[reportAssignmentType]
+
+    def __init__(self, guild: "FakeGuild", user_id: int, roles: list[FakeRole]) -> None:
+        self.id = user_id
+        self.name = f"member{user_id}"
+        self.nick = None
+        self.guild = guild
+        self.roles = roles
+        self.mention = f"<@{user_id}>"
+        self.joined_at = datetime(2024, 1, 1, tzinfo=UTC)
+        self.display_avatar = SimpleNamespace(url=f"https://cdn.discordapp.com/embed/avatars/{user_id % 6}.png")
+
+    def __str__(self) -> str:
+        return self.name
+
+    def __repr__(self) -> str:
+        return f"<FakeMember id={self.id}>"
+
+    async def add_roles(self, *roles: FakeRole, **_: object) -> None:
+        await self.guild.latency.wait()
+        self.roles.extend(role for role in roles if role not in self.roles)
+
+    async def remove_roles(self, *roles: FakeRole, **_: object) -> None:
+        await self.guild.latency.wait()
+        self.roles = [role for role in self.roles if role not in roles]
+
+
+class FakeGuild:
+    """A guild with a few channels, the Greeter role and a member cache.
+
+    Members in `known_ids` that aren't cached yet are "fetched" from Discord
+    when needed, like members of a guild that isn't chunked.
+    """
+
+    def __init__(self, guild_id: int, latency: DiscordLatency) -> None:
+        self.id = guild_id
+        self.name = f"guild{guild_id}"
+        self.latency = latency
+
+        self.default_role = FakeRole(guild_id, "@everyone")
+        self.greeter_role = FakeRole(guild_id + 1, "Greeter")
+        self.roles = [self.default_role, self.greeter_role]
+        self.channels = [
+            FakeChannel(guild_id + 2, "welcome", "Say hi!"),
+            FakeChannel(guild_id + 3, "general", "Anything goes"),
+            FakeChannel(guild_id + 4, "help", "Ask questions here"),
+        ]
+
+        self.members: dict[int, FakeMember] = {}
+        self.known_ids: set[int] = set()
+        self.greeter_ids: set[int] = set()
+
+    def create_member(self, user_id: int) -> FakeMember:
+        roles = [self.default_role]
+        if user_id in self.greeter_ids:
+            roles.append(self.greeter_role)
+        member = self.members[user_id] = FakeMember(self, user_id, roles)
+        return member
+
+    def get_member(self, user_id: int) -> FakeMember | None:
+        return self.members.get(user_id)
+
+    async def fetch_member(self, user_id: int) -> FakeMember:
+        await self.latency.wait()
+        if user_id not in self.known_ids:
+            raise NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Member")  # pyright: ignore[reportArgumentType]
+        return self.create_member(user_id)
+
+    async def create_role(self, name: str, **_: object) -> FakeRole:
+        await self.latency.wait()
+        role = FakeRole(self.id + len(self.roles) + 10, name)
+        self.roles.append(role)
+        return role
+
+
+@dataclass
+class SentMessage:
+    content: str | None
+    kwargs: dict[str, Any]
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction") -> None:
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self) -> None:
+        if self._done:
+            raise InteractionResponded(self._interaction)  # pyright: ignore[reportArgumentType]
+        self._done = True
+        await self._interaction.guild.latency.wait()
+
+    async def defer(self, **_: object) -> None:
+        await self._respond()
+
+    async def send_message(self, content: str | None = None, **kwargs: object) -> None:
+        await self._respond()
+        self._interaction.sent(content, kwargs)
+
+    async def edit_message(self, content: str | None = None, **kwargs: object) -> None:
+        await self._respond()
+        self._interaction.sent(content, kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction") -> None:
+        self._interaction = interaction
+
+    async def send(self, content: str | None = None, **kwargs: object) -> None:
+        await self._interaction.guild.latency.wait()
+        self._interaction.sent(content, kwargs)
+
+
+@dataclass(eq=False)
+class FakeInteraction:
+    """A slash command or component interaction.
+
+    Attributes:
+        guild: The guild it happened in.
+        author: The member that interacted.
+        values: The selected values, for select menus.
+        messages: Everything sent in response.
+    """
+
+    guild: FakeGuild
+    author: FakeMember
+    values: list[str] | None = None
+    messages: list[SentMessage] = field(default_factory=list)
+
+    def __post_init__(self) -> None:
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    @property
+    def guild_id(self) -> int:
+        return self.guild.id
+
+    @property
+    def user(self) -> FakeMember:
+        return self.author
+
+    @property
+    def resolved_values(self) -> list[str] | None:
+        return self.values
+
+    @property
+    def views(self) -> list[View]:
+        return [message.kwargs["view"] for message in self.messages if isinstance(message.kwargs.get("view"), View)]
+
+    def sent(self, content: str | None, kwargs: dict[str, Any]) -> None:
+        self.messages.append(SentMessage(content, kwargs))
+
+    async def send(self, content: str | None = None, **kwargs: object) -> None:
+        if self.response.is_done():
+            await self.followup.send(content, **kwargs)
+        else:
+            await self.response.send_message(content, **kwargs)
+
+    async def edit_original_message(self, content: str | None = None, **kwargs: object) -> None:
+        await self.guild.latency.wait()
+        self.sent(content, kwargs)
@@ -0,0 +1,412 @@
+"""Load harness replaying traffic through the cogs.
+
+The `Tags`, `Greetings`, `Help` and `ErrorHandler` cogs are driven with fake
+interactions, guilds and members (see `benchmarks.fakes`), backed by a real
+tag repository and a local Ollama stub (see `benchmarks.ollama_stub`). The
+traffic is either recorded from a running bot (see `bot.recording`) or
+generated, and is replayed by a number of concurrent workers. Each user's
+events stay in order, so e.g. a tag selection follows its `/tag add`.
+
+The database is a copy of `--database`, or a synthetic guild of `--members`
+members. Run it from the repository root with:
+
+    python -m benchmarks.load --members 10000 --events 2000 --concurrency 20
+    python -m benchmarks.load --database zz.db --traffic traffic.jsonl --pace
+
+Slash command checks (like `guild_only`) aren't run. The end-to-end latency
+percentiles of every command and component are printed as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from pathlib import Path
+from typing import Any
+
+import aiosqlite
+from disnake.ext.commands import CommandError, CommandInvokeError
+from disnake.ui import Button, StringSelect, View
+
+from benchmarks.fakes import DiscordLatency, FakeGuild, FakeInteraction
+from benchmarks.ollama_stub import StubOptions, start_stub
+from benchmarks.synthetic import generate_guild, tag_popularity
+from bot.backup import create_backup
+from bot.breaker import database_breaker, ollama_breaker
+from bot.exts.error_handler import ErrorHandler
+from bot.exts.greetings import Greetings
+from bot.exts.help import Help
+from bot.exts.tags import Tags
+from bot.recording import TrafficEvent, read_events, write_event
+from bot.repositories.guarded import GuardedTagRepository
+from bot.repositories.tags import DEFAULT_TAGS, DEFAULT_TAXONOMY, SqliteTagRepository, TagRepository, TagRow
+from bot.settings import Settings
+
+SYNTHETIC_GUILD_ID = 1 << 22
+QUESTIONS = [
+    "Where do I introduce myself?",
+    "Which channel is for questions?",
+    "How do I get the Greeter role?",
+    "What is this server about?",
+]
+
+Handler = Callable[[FakeInteraction, dict[str, Any]], Awaitable[None]]
+
+
+async def stream(rows: Iterable[TagRow]) -> AsyncIterator[TagRow]:
+    for row in rows:
+        yield row
+
+
+class HarnessBot:
+    """Stands in for `bot.bot.Bot`, with what the cogs use."""
+
+    def __init__(self, settings: Settings, tag_repository: TagRepository) -> None:
+        self.settings = settings
+        self.database_breaker = database_breaker(settings)
+        self.ollama_breaker = ollama_breaker(settings)
+        self.tag_repository: TagRepository | None = GuardedTagRepository(tag_repository, self.database_breaker)
+        self.database_connection = None
+        self.logger = logging.getLogger("zz.load")
+
+
+class Harness:
+    """Runs traffic events through the cogs."""
+
+    def __init__(self, bot: HarnessBot, latency: DiscordLatency) -> None:
+        self.latency = latency
+        self.logger = bot.logger
+        self.guilds: dict[int, FakeGuild] = {}
+        # The views last sent to each member, for their select menu and button events
+        self.views: dict[tuple[int, int], list[View]] = {}
+
+        self.tags = Tags(bot)  # pyright: ignore[reportArgumentType]
+        self.greetings = Greetings(bot)  # pyright: ignore[reportArgumentType]
+        self.help = Help(bot)  # pyright: ignore[reportArgumentType]
+        self.error_handler = ErrorHandler(bot)  # pyright: ignore[reportArgumentType]
+
+        self.commands: dict[str, Handler] = {
+            "tag add": lambda inter, _: Tags.add.callback(self.tags, inter),
+            "tag remove": lambda inter, options: Tags.remove.callback(self.tags, inter, tag=options["tag"]),
+            "tag suggest_friends": lambda inter, _: Tags.suggest_friends.callback(self.tags, inter),
+            "tag info": lambda inter, options: Tags.info.callback(
+                self.tags,
+                inter,
+                member=inter.guild.get_member(options["member"]) or inter.guild.create_member(options["member"]),
+            ),
+            "greeters": lambda inter, _: Greetings.greeters.callback(self.greetings, inter),
+            "help": lambda inter, options: Help.help.callback(self.help, question=options["question"], inter=inter),
+        }
+
+    async def load_guilds(self, repository: TagRepository, guild_ids: Iterable[int]) -> None:
+        """Create the guilds, knowing every member with tags.
+
+        Members are only cached once they interact, or are fetched.
+        """
+        for guild_id in guild_ids:
+            guild = self.guilds[guild_id] = FakeGuild(guild_id, self.latency)
+            async for row in repository.export_rows(guild_id):
+                guild.known_ids.add(row.user_id)
+                if row.greeter:
+                    guild.greeter_ids.add(row.user_id)
+
+    def interaction(self, event: TrafficEvent, values: list[str] | None = None) -> FakeInteraction:
+        guild = self.guilds.get(event.guild_id)
+        if guild is None:
+            guild = self.guilds[event.guild_id] = FakeGuild(event.guild_id, self.latency)
+        author = guild.get_member(event.user_id) or guild.create_member(event.user_id)
+        return FakeInteraction(guild, author, values)
+
+    async def handle(self, event: TrafficEvent) -> str:
+        """Run an event through the cogs.
+
+        Returns:
+            "ok", "error" if it raised (commands then go through the error
+            handler, like in the bot), or "skipped" if it can't be replayed.
+        """
+        if event.type == "command":
+            return await self.run_command(event)
+        return await self.run_component(event)
+
+    async def run_command(self, event: TrafficEvent) -> str:
+        handler = self.commands.get(event.name)
+        if handler is None:
+            return "skipped"
+
+        interaction = self.interaction(event)
+        try:
+            await handler(interaction, event.options)
+        except Exception as error:  # noqa: BLE001
+            wrapped = error if isinstance(error, CommandError) else CommandInvokeError(error)
+            await self.error_handler.on_slash_command_error(interaction, wrapped)  # pyright: ignore[reportArgumentType]
+            return "error"
+        finally:
+            self.remember_views(event, interaction)
+        return "ok"
+
+    async def run_component(self, event: TrafficEvent) -> str:
+        values = event.options.get("values") if event.type == "select" else None
+        interaction = self.interaction(event, values)
+
+        item = self.find_item(event)
+        if item is None:
+            return "skipped"
+
+        try:
+            if isinstance(item, StringSelect):
+                item.refresh_state(interaction)  # pyright: ignore[reportArgumentType]
+            await item.callback(interaction)  # pyright: ignore[reportArgumentType]
+        except Exception:
+            # Views only log errors, they don't go through the error handler
+            self.logger.exception("Error in the %s %r", event.type, event.name)
+            return "error"
+        finally:
+            self.remember_views(event, interaction)
+        return "ok"
+
+    def find_item(self, event: TrafficEvent) -> Button[Any] | StringSelect[Any] | None:
+        for view in reversed(self.views.get((event.guild_id, event.user_id), [])):
+            for item in view.children:
+                if event.type == "select" and isinstance(item, StringSelect) and item.placeholder == event.name:
+                    return item
+                if event.type == "button" and isinstance(item, Button) and item.label == event.name:
+                    return None if item.disabled else item
+        return None
+
+    def remember_views(self, event: TrafficEvent, interaction: FakeInteraction) -> None:
+        if not interaction.views:
+            return
+        views = self.views.setdefault((event.guild_id, event.user_id), [])
+        views.extend(view for view in interaction.views if view not in views)
+        # A few are enough, older ones would have timed out
+        del views[:-3]
+
+
+def generate_traffic(  # noqa: PLR0913
+    guild_id: int,
+    members: int,
+    events: int,
+    rate: float,
+    seed: int,
+    skew: float,
+) -> Iterable[TrafficEvent]:
+    """Generate a mix of commands and the component interactions following them.
+
+    Args:
+        guild_id: The Discord Server ID.
+        members: How many members the guild has, with IDs from 1.
+        events: Roughly how many events to generate.
+        rate: How many events happen per second, on average.
+        seed: The seed of the random generator, so runs are reproducible.
+        skew: How skewed tag popularity is, see `benchmarks.synthetic`.
+    """
+    rng = random.Random(seed)
+    tags, cumulative_weights = tag_popularity(rng, skew)
+    at = 0.0
+    generated = 0
+
+    def event(user_id: int, type: str, name: str, **options: object) -> TrafficEvent:
+        nonlocal at, generated
+        at += rng.expovariate(rate)
+        generated += 1
+        return TrafficEvent(at, guild_id, user_id, type, name, options)  # pyright: ignore[reportArgumentType]
+
+    while generated < events:
+        # A few members are new, without any tags yet
+        user_id = rng.randint(1, int(members * 1.05))
+        flow = rng.choices(["add", "suggest", "remove", "info", "greeters", "help"], weights=[3, 3, 1, 1, 1, 1])[0]
+
+        if flow == "add":
+            yield event(user_id, "command", "tag add")
+            chosen = set(rng.choices(tags, cum_weights=cumulative_weights, k=rng.randint(1, 4)))
+            # The options' values are tag IDs
+            values = sorted(str(DEFAULT_TAXONOMY.ids[tag]) for tag in chosen)
+            yield event(user_id, "select", "Choose your tags", values=values)
+        elif flow == "suggest":
+            yield event(user_id, "command", "tag suggest_friends")
+            for _ in range(rng.choice([0, 0, 1, 2])):
+                yield event(user_id, "button", "Next")
+        elif flow == "remove":
+            yield event(user_id, "command", "tag remove", tag=rng.choice(DEFAULT_TAGS))
+        elif flow == "info":
+            yield event(user_id, "command", "tag info", member=rng.randint(1, members))
+        elif flow == "greeters":
+            yield event(user_id, "command", "greeters")
+            yield event(user_id, "button", "Be a greeter")
+        else:
+            yield event(user_id, "command", "help", question=rng.choice(QUESTIONS))
+
+
+def event_label(event: TrafficEvent) -> str:
+    return event.name if event.type == "command" else f"{event.type}: {event.name}"
+
+
+async def replay(
+    harness: Harness,
+    events: list[TrafficEvent],
+    concurrency: int,
+    speed: float | None,
+) -> dict[str, Any]:
+    """Replay events with a number of concurrent workers.
+
+    Each user's events go to the same worker, so they stay in order.
+
+    Args:
+        harness: The harness running the events.
+        events: The events, ordered by time.
+        concurrency: How many events may run at once.
+        speed: If set, events are started at their recorded time, sped up by
+               this factor. Otherwise, they're started as soon as a worker is
+               free.
+    """
+    queues: list[list[TrafficEvent]] = [[] for _ in range(concurrency)]
+    for event in events:
+        queues[event.user_id % concurrency].append(event)
+
+    latencies: defaultdict[str, list[float]] = defaultdict(list)
+    outcomes: defaultdict[str, defaultdict[str, int]] = defaultdict(lambda: defaultdict(int))
+    start = time.perf_counter()
+
+    async def work(queue: list[TrafficEvent]) -> None:
+        for event in queue:
+            if speed is not None:
+                await asyncio.sleep(max(start + event.at / speed - time.perf_counter(), 0))
+
+            event_start = time.perf_counter()
+            outcome = await harness.handle(event)
+            label = event_label(event)
+            outcomes[label][outcome] += 1
+            if outcome != "skipped":
+                latencies[label].append(time.perf_counter() - event_start)
+
+    await asyncio.gather(*(work(queue) for queue in queues))
+    elapsed = time.perf_counter() - start
+
+    report: dict[str, Any] = {}
+    for label in sorted(outcomes):
+        samples = sorted(latencies[label])
+        report[label] = {"count": len(samples), **outcomes[label]}
+        if samples:
+            report[label].update(
+                p50_ms=statistics.median(samples) * 1000,
+                p90_ms=samples[int(len(samples) * 0.9)] * 1000,
+                p99_ms=samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1000,
+                max_ms=samples[-1] * 1000,
+            )
+
+    return {
+        "events": len(events),
+        "duration_s": elapsed,
+        "events_per_s": len(events) / elapsed,
+        "commands": report,
+    }
+
+
+async def prepare_database(arguments: argparse.Namespace, directory: str) -> str:
+    """Copy the database to load test, or generate a synthetic one."""
+    if arguments.database is not None:
+        # Replaying writes to the database, so it runs on a snapshot
+        report = await asyncio.to_thread(create_backup, arguments.database, directory, pages_per_step=-1)
+        return report.path
+
+    path = str(Path(directory) / "zz.db")
+    async with aiosqlite.connect(path) as connection:
+        repository = SqliteTagRepository(connection)
+        await repository.initialize()
+        rows = generate_guild(SYNTHETIC_GUILD_ID, arguments.members, seed=arguments.seed, skew=arguments.skew)
+        await repository.import_rows(stream(rows))
+    return path
+
+
+async def run(arguments: argparse.Namespace) -> dict[str, Any]:
+    if arguments.traffic is not None:
+        events = sorted(read_events(arguments.traffic), key=lambda event: event.at)
+    else:
+        events = list(
+            generate_traffic(
+                SYNTHETIC_GUILD_ID,
+                arguments.members,
+                arguments.events,
+                arguments.rate,
+                arguments.seed,
+                arguments.skew,
+            ),
+        )
+        if arguments.save_traffic is not None:
+            with Path(arguments.save_traffic).open("w", encoding="utf-8") as file:  # noqa: ASYNC230
+                for event in events:
+                    write_event(file, event)
+
+    stub_options = StubOptions(arguments.ollama_latency, arguments.ollama_tokens_per_second, arguments.ollama_tokens)
+    runner, ollama_url = await start_stub(stub_options)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = await prepare_database(arguments, directory)
+        settings = Settings(
+            discord_bot_token="load-test",  # noqa: S106
+            database_path=database_path,
+            ollama_host=ollama_url,
+            ollama_model="stub",
+        )
+
+        try:
+            async with aiosqlite.connect(database_path) as connection:
+                repository = SqliteTagRepository(connection, scoring=settings.suggestion_scoring)
+                await repository.initialize()
+
+                bot = HarnessBot(settings, repository)
+                harness = Harness(bot, DiscordLatency(arguments.discord_latency))
+                await harness.load_guilds(repository, {event.guild_id for event in events})
+
+                speed = arguments.speed if arguments.pace else None
+                result = await replay(harness, events, arguments.concurrency, speed)
+                result["breakers"] = {
+                    breaker.name: breaker.collect_metrics() for breaker in (bot.database_breaker, bot.ollama_breaker)
+                }
+        finally:
+            await runner.cleanup()
+
+    result["config"] = {
+        "concurrency": arguments.concurrency,
+        "paced": arguments.pace,
+        "discord_latency_s": arguments.discord_latency,
+        "ollama": vars(stub_options),
+    }
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", help="load test a copy of this database instead of a synthetic guild")
+    parser.add_argument("--members", type=int, default=10_000, help="members of the synthetic guild")
+    parser.add_argument("--skew", type=float, default=1.0, help="how skewed tag popularity is")
+    parser.add_argument("--traffic", help="replay this recording instead of generating traffic")
+    parser.add_argument("--events", type=int, default=2000, help="how many events to generate")
+    parser.add_argument("--rate", type=float, default=50.0, help="generated events per second")
+    parser.add_argument("--save-traffic", help="save the generated traffic, to replay it later")
+    parser.add_argument("--concurrency", type=int, default=20, help="how many events may run at once")
+    parser.add_argument("--pace", action="store_true", help="start events at their (recorded) time")
+    parser.add_argument("--speed", type=float, default=1.0, help="speed-up of paced replays")
+    parser.add_argument("--discord-latency", type=float, default=0.05, help="seconds per Discord API call")
+    parser.add_argument("--ollama-latency", type=float, default=0.5, help="seconds before Ollama's first token")
+    parser.add_argument("--ollama-tokens-per-second", type=float, default=30.0)
+    parser.add_argument("--ollama-tokens", type=int, default=60, help="tokens per Ollama response")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="log the errors the error handler gets")
+    arguments = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR if arguments.verbose else logging.CRITICAL, stream=sys.stderr)
+
+    result = asyncio.run(run(arguments))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
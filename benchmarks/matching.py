@@ -0,0 +1,87 @@
+"""Benchmark of the guild-wide greeter matching job.
+
+A synthetic guild is imported into an in-memory SQLite database, then loaded,
+matched and written back like `bot.exts.matching` does. Runtime is measured
+first, then peak memory in a second pass under tracemalloc (which slows
+Python code down). Run it from the repository root with:
+
+    python -m benchmarks.matching --members 100000
+
+The results are printed as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from collections.abc import AsyncIterator, Iterable
+
+import aiosqlite
+
+from benchmarks.synthetic import generate_guild
+from bot.matching import load_tag_matrix, match_newcomers
+from bot.repositories.tags import SqliteTagRepository, TagRow
+
+GUILD_ID = 1
+
+
+async def stream(rows: Iterable[TagRow]) -> AsyncIterator[TagRow]:
+    for row in rows:
+        yield row
+
+
+async def run_job(repository: SqliteTagRepository, greeters_per_newcomer: int) -> dict[str, float | int]:
+    start = time.perf_counter()
+    matrix = await load_tag_matrix(repository, GUILD_ID)
+    loaded = time.perf_counter()
+    assignments = match_newcomers(matrix, greeters_per_newcomer)
+    matched = time.perf_counter()
+    await repository.save_assignments(GUILD_ID, assignments)
+    saved = time.perf_counter()
+
+    greeters = int(matrix.greeters.sum())
+    return {
+        "members": len(matrix.user_ids),
+        "greeters": greeters,
+        "newcomers": len(matrix.user_ids) - greeters,
+        "assignments": len(assignments),
+        "packed_matrix_bytes": matrix.bits.nbytes,
+        "load_s": loaded - start,
+        "match_s": matched - loaded,
+        "save_s": saved - matched,
+        "total_s": saved - start,
+    }
+
+
+async def benchmark(members: int, greeter_ratio: float, greeters_per_newcomer: int, seed: int) -> dict[str, object]:
+    async with aiosqlite.connect(":memory:") as connection:
+        repository = SqliteTagRepository(connection)
+        await repository.initialize()
+        await repository.import_rows(stream(generate_guild(GUILD_ID, members, seed=seed, greeter_ratio=greeter_ratio)))
+
+        result: dict[str, object] = dict(await run_job(repository, greeters_per_newcomer))
+
+        tracemalloc.start()
+        await run_job(repository, greeters_per_newcomer)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    result["peak_memory_bytes"] = peak
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=100_000)
+    parser.add_argument("--greeter-ratio", type=float, default=0.1)
+    parser.add_argument("--greeters-per-newcomer", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    result = asyncio.run(benchmark(args.members, args.greeter_ratio, args.greeters_per_newcomer, args.seed))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
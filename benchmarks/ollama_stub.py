@@ -0,0 +1,106 @@
+"""A local HTTP stub standing in for Ollama.
+
+It answers `/api/chat` like Ollama would, after waiting for a configurable
+time to the first token and then generating tokens at a configurable rate, so
+`/help` can be load-tested without a model. Streaming and non-streaming
+requests are supported. The load harness (`benchmarks.load`) starts one
+itself, and it can also back a real bot:
+
+    python -m benchmarks.ollama_stub --port 11434 --first-token-latency 0.5 --tokens-per-second 30
+"""
+
+import argparse
+import asyncio
+import json
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+from aiohttp import web
+
+
+@dataclass
+class StubOptions:
+    """How the stub behaves.
+
+    Attributes:
+        first_token_latency: How long, in seconds, before the first token.
+        tokens_per_second: How fast tokens are generated after that.
+        response_tokens: How many tokens every response has.
+    """
+
+    first_token_latency: float = 0.5
+    tokens_per_second: float = 30.0
+    response_tokens: int = 60
+
+
+def chunk(model: str, content: str, *, done: bool, tokens: int = 0) -> dict[str, object]:
+    response: dict[str, object] = {
+        "model": model,
+        "created_at": datetime.now(UTC).isoformat(),
+        "message": {"role": "assistant", "content": content},
+        "done": done,
+    }
+    if done:
+        response.update(done_reason="stop", eval_count=tokens, prompt_eval_count=0)
+    return response
+
+
+def create_app(options: StubOptions) -> web.Application:
+    async def chat(request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        model = body.get("model", "stub")
+        token_delay = 1 / options.tokens_per_second
+
+        await asyncio.sleep(options.first_token_latency)
+
+        if not body.get("stream", True):
+            await asyncio.sleep(token_delay * (options.response_tokens - 1))
+            content = " ".join(["token"] * options.response_tokens)
+            return web.json_response(chunk(model, content, done=True, tokens=options.response_tokens))
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        for index in range(options.response_tokens):
+            if index > 0:
+                await asyncio.sleep(token_delay)
+            await response.write((json.dumps(chunk(model, "token ", done=False)) + "\n").encode())
+        await response.write((json.dumps(chunk(model, "", done=True, tokens=options.response_tokens)) + "\n").encode())
+        await response.write_eof()
+        return response
+
+    app = web.Application()
+    app.router.add_post("/api/chat", chat)
+    return app
+
+
+async def start_stub(options: StubOptions, host: str = "127.0.0.1", port: int = 0) -> tuple[web.AppRunner, str]:
+    """Start the stub in the running event loop.
+
+    Returns:
+        The runner, to clean it up with, and the stub's URL.
+    """
+    runner = web.AppRunner(create_app(options))
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+
+    # With port 0, the OS picks a free port
+    bound_port = runner.addresses[0][1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--first-token-latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=30.0)
+    parser.add_argument("--response-tokens", type=int, default=60)
+    args = parser.parse_args()
+
+    options = StubOptions(args.first_token_latency, args.tokens_per_second, args.response_tokens)
+    web.run_app(create_app(options), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
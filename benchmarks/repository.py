@@ -0,0 +1,286 @@
+"""Benchmark suite of every `TagRepository` operation.
+
+For each guild size and greeter ratio, a synthetic guild (see
+`benchmarks.synthetic`) is imported into a fresh database file. Every
+operation is then timed on a sample of members, as is `suggest_friends` on its
+own (with the candidates the SQLite repository would pass it). Peak memory is
+measured in a second, shorter pass under tracemalloc, which only sees Python's
+allocations and slows Python code down. Run it from the repository root with:
+
+    python -m benchmarks.repository --members 1000,10000,100000 --output results.json
+
+`--backends sqlite,memory` also runs every scenario on the in-memory
+repository, for comparison.
+
+Results are printed as JSON, and saved with `--output`. Comparing them to a
+previous run with `--baseline` lists the operations that got slower (or use
+more memory) by more than `--threshold`, and exits with status 1 if any did.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterable
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any
+
+import aiosqlite
+
+from benchmarks.synthetic import TAGS, generate_guild
+from bot.repositories.memory import MemoryTagRepository
+from bot.repositories.tags import GreeterAssignment, SqliteTagRepository, TagRepository, TagRow, suggest_friends
+
+GUILD_ID = 1
+OTHER_GUILD_ID = 2
+# Whole-guild operations are much slower, so they get fewer samples
+WHOLE_GUILD_SAMPLES = 5
+MEMORY_SAMPLES = 10
+
+# The metrics compared against a baseline, and whether higher is worse
+COMPARED_METRICS = {
+    "p50_ms": True,
+    "p99_ms": True,
+    "ops_per_s": False,
+    "peak_memory_bytes": True,
+    "rows_per_s": False,
+    "total_s": True,
+}
+
+Operation = Callable[[int], Awaitable[object]]
+
+
+async def stream(rows: Iterable[TagRow]) -> AsyncIterator[TagRow]:
+    for row in rows:
+        yield row
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+async def time_operation(operation: Operation, samples: int) -> dict[str, float | int]:
+    """Run an operation once per sample, timing every call.
+
+    The operation gets the index of the sample, so each call can use a
+    different member.
+    """
+    latencies: list[float] = []
+    for index in range(samples):
+        start = time.perf_counter()
+        await operation(index)
+        latencies.append(time.perf_counter() - start)
+
+    latencies.sort()
+    return {
+        "samples": samples,
+        "ops_per_s": samples / sum(latencies),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def measure_peak_memory(operation: Operation, samples: int) -> int:
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for index in range(samples):
+        await operation(index)
+    _, peak = tracemalloc.get_traced_memory()
+    return peak - baseline
+
+
+@asynccontextmanager
+async def open_repository(backend: str, directory: str) -> AsyncIterator[TagRepository]:
+    if backend == "memory":
+        yield MemoryTagRepository()
+        return
+
+    async with aiosqlite.connect(Path(directory) / "zz.db") as connection:
+        repository = SqliteTagRepository(connection)
+        await repository.initialize()
+        yield repository
+
+
+def define_operations(
+    repository: TagRepository,
+    members: int,
+    samples: int,
+    seed: int,
+) -> dict[str, tuple[Operation, int]]:
+    """Define every benchmarked operation and how many samples it gets.
+
+    Operations run in order, and later ones may depend on earlier ones, e.g.
+    `remove_tag` removes the tags `add` added.
+    """
+    rng = random.Random(seed)
+    existing = [rng.randint(1, members) for _ in range(samples)]
+    new = [members + 1 + index for index in range(samples)]
+    new_tags = [rng.choice(TAGS) for _ in range(samples)]
+    candidates: list[list[tuple[int, str]]] = []
+    user_tags: list[list[str]] = []
+
+    async def prepare_suggest_friends(index: int) -> None:
+        if not isinstance(repository, SqliteTagRepository):
+            msg = "Only SQLite gets its candidates as rows for `suggest_friends`"
+            raise TypeError(msg)
+        user_tags.append(await repository.get_tags(GUILD_ID, existing[index]))
+        candidates.append(await repository._get_candidate_tags(GUILD_ID, existing[index]))  # noqa: SLF001
+
+    async def export_guild(_: int) -> None:
+        async for _row in repository.export_rows(GUILD_ID):
+            pass
+
+    # Sampled members may repeat, but a newcomer is only assigned to a greeter once
+    newcomers = dict.fromkeys(user_id for user_id in existing if user_id != existing[0])
+    assignments = [GreeterAssignment(user_id, existing[0], 0.5) for user_id in newcomers]
+
+    operations: dict[str, tuple[Operation, int]] = {
+        "add": (lambda i: repository.add(GUILD_ID, new[i], [new_tags[i]], greeter=i % 2 == 0), samples),  # pyright: ignore[reportArgumentType]
+        "get_greeter": (lambda i: repository.get_greeter(GUILD_ID, new[i]), samples),
+        "update_greeter": (lambda i: repository.update_greeter(GUILD_ID, new[i], i % 2 == 1), samples),
+        "remove_tag": (lambda i: repository.remove_tag(GUILD_ID, new[i], new_tags[i]), samples),  # pyright: ignore[reportArgumentType]
+        "get_tags": (lambda i: repository.get_tags(GUILD_ID, existing[i]), samples),
+        "get_friend_suggestions": (lambda i: repository.get_friend_suggestions(GUILD_ID, existing[i]), samples),
+        "rank_friend_suggestions": (lambda i: repository.rank_friend_suggestions(GUILD_ID, existing[i]), samples),
+        "prepare_suggest_friends": (prepare_suggest_friends, samples),
+        "suggest_friends": (lambda i: suggest_friends(candidates[i], 10, user_tags[i]), samples),
+        "get_tag_counts": (lambda _: repository.get_tag_counts(GUILD_ID), samples),
+        "save_assignments": (lambda _: repository.save_assignments(GUILD_ID, assignments), WHOLE_GUILD_SAMPLES),
+        "get_assignments": (lambda _: repository.get_assignments(GUILD_ID), samples),
+        "get_guild_ids": (lambda _: repository.get_guild_ids(), WHOLE_GUILD_SAMPLES),
+        "get_user_ids": (lambda _: repository.get_user_ids(GUILD_ID), WHOLE_GUILD_SAMPLES),
+        "export_rows": (export_guild, WHOLE_GUILD_SAMPLES),
+        "remove_users": (lambda i: repository.remove_users(GUILD_ID, [new[i]]), samples),
+    }
+    if not isinstance(repository, SqliteTagRepository):
+        del operations["prepare_suggest_friends"], operations["suggest_friends"]
+    return operations
+
+
+async def benchmark_guild(  # noqa: PLR0913
+    backend: str,
+    members: int,
+    greeter_ratio: float,
+    skew: float,
+    samples: int,
+    seed: int,
+) -> dict[str, Any]:
+    with tempfile.TemporaryDirectory() as directory:
+        async with open_repository(backend, directory) as repository:
+            start = time.perf_counter()
+            rows = await repository.import_rows(
+                stream(generate_guild(GUILD_ID, members, seed=seed, greeter_ratio=greeter_ratio, skew=skew)),
+            )
+            import_s = time.perf_counter() - start
+            # A second, small guild to remove
+            await repository.import_rows(stream(generate_guild(OTHER_GUILD_ID, 100, seed=seed)))
+
+            results: dict[str, Any] = {
+                "import_rows": {"samples": 1, "rows": rows, "rows_per_s": rows / import_s, "total_s": import_s},
+            }
+            for name, (operation, count) in define_operations(repository, members, samples, seed).items():
+                results[name] = await time_operation(operation, count)
+
+            # The second pass reruns the operations on the same members,
+            # which works since they leave the guild as it was
+            tracemalloc.start()
+            for name, (operation, count) in define_operations(repository, members, samples, seed).items():
+                results[name]["peak_memory_bytes"] = await measure_peak_memory(operation, min(count, MEMORY_SAMPLES))
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            await repository.remove_guilds([OTHER_GUILD_ID])
+            results["remove_guilds"] = {"samples": 1, "total_s": time.perf_counter() - start}
+
+    results.pop("prepare_suggest_friends", None)
+    return results
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """List the metrics that regressed by more than the threshold."""
+    regressions: list[str] = []
+
+    for scenario, operations in results["scenarios"].items():
+        for operation, metrics in operations.items():
+            baseline_metrics = baseline["scenarios"].get(scenario, {}).get(operation, {})
+            for metric, higher_is_worse in COMPARED_METRICS.items():
+                if metric not in metrics or not baseline_metrics.get(metric):
+                    continue
+
+                change = metrics[metric] / baseline_metrics[metric] - 1
+                if (change if higher_is_worse else -change) > threshold:
+                    regressions.append(
+                        f"{scenario} {operation} {metric}: {baseline_metrics[metric]:.4g} -> {metrics[metric]:.4g} "
+                        f"({change:+.0%})",
+                    )
+
+    return regressions
+
+
+async def benchmark(arguments: argparse.Namespace) -> dict[str, Any]:
+    scenarios: dict[str, Any] = {}
+    for backend in arguments.backends:
+        for members in arguments.members:
+            for greeter_ratio in arguments.greeter_ratios:
+                name = f"members={members},greeter_ratio={greeter_ratio}"
+                # SQLite scenarios keep their names, so older baselines still apply
+                if backend != "sqlite":
+                    name += f",backend={backend}"
+                print(f"Running {name}", file=sys.stderr)
+                scenarios[name] = await benchmark_guild(
+                    backend,
+                    members,
+                    greeter_ratio,
+                    arguments.skew,
+                    arguments.samples,
+                    arguments.seed,
+                )
+
+    return {
+        "config": {"skew": arguments.skew, "samples": arguments.samples, "seed": arguments.seed},
+        "scenarios": scenarios,
+    }
+
+
+def parse_list(convert: Callable[[str], Any]) -> Callable[[str], list[Any]]:
+    return lambda value: [convert(item) for item in value.split(",")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=parse_list(int), default=[1000, 10_000, 100_000], help="guild sizes")
+    parser.add_argument("--greeter-ratios", type=parse_list(float), default=[0.1], help="fractions of greeters")
+    parser.add_argument("--backends", type=parse_list(str), default=["sqlite"], help="sqlite and/or memory")
+    parser.add_argument("--skew", type=float, default=1.0, help="how skewed tag popularity is")
+    parser.add_argument("--samples", type=int, default=200, help="samples per operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="save the results to this file")
+    parser.add_argument("--baseline", help="compare the results to a previous run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative change counted as a regression")
+    arguments = parser.parse_args()
+
+    # Read the baseline first, so a wrong path doesn't waste a whole run
+    baseline = None if arguments.baseline is None else json.loads(Path(arguments.baseline).read_text())
+
+    results = asyncio.run(benchmark(arguments))
+    print(json.dumps(results, indent=2))
+
+    if arguments.output is not None:
+        Path(arguments.output).write_text(json.dumps(results, indent=2))
+
+    if baseline is not None:
+        regressions = compare(results, baseline, arguments.threshold)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Throughput benchmark of the fast runtime (`Settings.fast_runtime`).
+
+Two things are measured, with and without uvloop and orjson:
+
+- Decoding: how fast gateway payloads (GUILD_CREATE, MESSAGE_CREATE and
+  INTERACTION_CREATE) are decoded by the standard library's `json` and orjson.
+- Dispatching: a burst of MESSAGE_CREATE events is sent over a local
+  websocket, and decoded, parsed by disnake's connection state and dispatched
+  to listeners on each event loop, as a shard would during an event storm.
+
+Run it from the repository root with:
+
+    python -m benchmarks.runtime --events 50000
+
+The results are printed as JSON. Configurations whose dependencies aren't
+installed are skipped.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from collections.abc import Callable
+from importlib.util import find_spec
+from typing import Any
+
+import aiohttp
+import disnake.utils
+from aiohttp import web
+from disnake import ClientUser
+from disnake.ext.commands import AutoShardedInteractionBot
+
+from benchmarks.cache import BOT_USER_ID, guild_payload, member_payload, message_payload, user_payload
+from bot.runtime import event_loop_factory
+
+Codec = Callable[[str | bytes], Any]
+
+
+def codecs() -> dict[str, Codec]:
+    available: dict[str, Codec] = {"json": json.loads}
+    if find_spec("orjson") is not None:
+        import orjson
+
+        available["orjson"] = orjson.loads
+    return available
+
+
+def event_loops() -> dict[str, Callable[[], asyncio.AbstractEventLoop] | None]:
+    available: dict[str, Callable[[], asyncio.AbstractEventLoop] | None] = {"asyncio": None}
+    if find_spec("uvloop") is not None:
+        available["uvloop"] = event_loop_factory(fast=True)
+    return available
+
+
+def interaction_payload(guild_id: int, user_id: int) -> dict[str, Any]:
+    return {
+        "id": str(guild_id + 5000),
+        "application_id": str(BOT_USER_ID),
+        "type": 2,
+        "token": "a" * 180,
+        "version": 1,
+        "guild_id": str(guild_id),
+        "channel_id": str(guild_id + 100),
+        "member": member_payload(user_id, [guild_id + 1]) | {"permissions": "2147483647"},
+        "app_permissions": "2147483647",
+        "locale": "en-US",
+        "guild_locale": "en-US",
+        "data": {
+            "id": "1",
+            "name": "tag",
+            "type": 1,
+            "options": [{"name": "add", "type": 1, "options": [{"name": "tag", "type": 3, "value": "unix"}]}],
+        },
+    }
+
+
+def gateway_frame(sequence: int, event: str, data: dict[str, Any]) -> str:
+    return json.dumps({"op": 0, "s": sequence, "t": event, "d": data})
+
+
+def decode_frames(members: int) -> dict[str, str]:
+    guild_id = 1 << 22
+    member_ids = range(guild_id + 1000, guild_id + 1000 + members)
+    guild = guild_payload(guild_id, [member_payload(user_id, [guild_id + 1]) for user_id in member_ids], members)
+    return {
+        "GUILD_CREATE": gateway_frame(1, "GUILD_CREATE", guild),
+        "MESSAGE_CREATE": gateway_frame(2, "MESSAGE_CREATE", message_payload(1, guild_id, guild_id + 1000)),
+        "INTERACTION_CREATE": gateway_frame(3, "INTERACTION_CREATE", interaction_payload(guild_id, guild_id + 1000)),
+    }
+
+
+def measure_decoding(frame: str, decode: Codec, duration: float) -> dict[str, float]:
+    decoded = 0
+    start = time.perf_counter()
+    while (elapsed := time.perf_counter() - start) < duration:
+        for _ in range(100):
+            decode(frame)
+        decoded += 100
+    return {
+        "payloads_per_s": decoded / elapsed,
+        "mb_per_s": decoded * len(frame.encode()) / elapsed / 1e6,
+    }
+
+
+async def serve_frames(frames: list[str]) -> tuple[web.AppRunner, str]:
+    """Start a websocket server sending the frames to whoever connects."""
+
+    async def handler(request: web.Request) -> web.WebSocketResponse:
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        for frame in frames:
+            await websocket.send_str(frame)
+        await websocket.close()
+        return websocket
+
+    app = web.Application()
+    app.router.add_get("/", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    _, port = runner.addresses[0]
+    return runner, f"ws://127.0.0.1:{port}/"
+
+
+async def measure_dispatching(arguments: argparse.Namespace, decode: Codec) -> dict[str, float]:
+    bot = AutoShardedInteractionBot()
+    state = bot._connection  # noqa: SLF001
+    state.user = ClientUser(state=state, data=user_payload(BOT_USER_ID))  # pyright: ignore[reportArgumentType]
+
+    guild_ids = [(index + 1) << 22 for index in range(arguments.guilds)]
+    for guild_id in guild_ids:
+        state._add_guild_from_data(guild_payload(guild_id, [], arguments.members))  # noqa: SLF001  # pyright: ignore[reportArgumentType]
+
+    rng = random.Random(arguments.seed)
+    frames = []
+    for sequence in range(arguments.events):
+        guild_id = rng.choice(guild_ids)
+        author_id = guild_id + 1000 + rng.randrange(arguments.members)
+        frames.append(gateway_frame(sequence, "MESSAGE_CREATE", message_payload(sequence + 1, guild_id, author_id)))
+
+    handled = 0
+    done = asyncio.Event()
+
+    async def on_message(_message: disnake.Message) -> None:
+        nonlocal handled
+        handled += 1
+        if handled == len(frames):
+            done.set()
+
+    for _ in range(arguments.listeners):
+        bot.add_listener(on_message, "on_message")
+
+    server, url = await serve_frames(frames)
+    async with aiohttp.ClientSession() as session, session.ws_connect(url, max_msg_size=0) as websocket:
+        start = time.perf_counter()
+        # What `DiscordWebSocket.received_message` does with dispatch events
+        async for frame in websocket:
+            payload = decode(frame.data)
+            state.parsers[payload["t"]](payload["d"])
+        if arguments.listeners:
+            await done.wait()
+        elapsed = time.perf_counter() - start
+
+    await server.cleanup()
+    await bot.close()
+    return {
+        "events_per_s": len(frames) / elapsed,
+        "listener_calls_per_s": handled / elapsed,
+        "elapsed_s": elapsed,
+    }
+
+
+def benchmark(arguments: argparse.Namespace) -> dict[str, Any]:
+    results: dict[str, Any] = {
+        "config": {
+            "events": arguments.events,
+            "guilds": arguments.guilds,
+            "members_per_guild": arguments.members,
+            "listeners": arguments.listeners,
+            "disnake": disnake.__version__,
+        },
+    }
+
+    for event, frame in decode_frames(arguments.members).items():
+        for codec, decode in codecs().items():
+            results[f"decode,event={event},codec={codec}"] = {"bytes": len(frame.encode())} | measure_decoding(
+                frame,
+                decode,
+                arguments.duration,
+            )
+
+    for loop, factory in event_loops().items():
+        for codec, decode in codecs().items():
+            with asyncio.Runner(loop_factory=factory) as runner:
+                results[f"dispatch,loop={loop},codec={codec}"] = runner.run(measure_dispatching(arguments, decode))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50_000, help="MESSAGE_CREATE events dispatched")
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--members", type=int, default=500, help="members per guild")
+    parser.add_argument("--listeners", type=int, default=2, help="on_message listeners")
+    parser.add_argument("--duration", type=float, default=1.0, help="seconds spent decoding each payload")
+    parser.add_argument("--seed", type=int, default=0)
+    arguments = parser.parse_args()
+
+    print(json.dumps(benchmark(arguments), indent=2))
+
+
+if __name__ == "__main__":
+    main()
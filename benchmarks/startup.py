@@ -0,0 +1,147 @@
+"""Import-time and startup benchmark.
+
+Every sample runs in a fresh interpreter so imports are cold. Run it from the
+repository root with:
+
+    python -m benchmarks.startup --runs 5
+
+The results are printed as JSON.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Runs in the child interpreter. Stages are timed from interpreter start-up
+# until the bot would be ready to serve commands (extensions loaded and the
+# database initialized). Logging in to Discord is excluded as it needs a token.
+# Like `bot.__main__`, the bot is created, set up and closed in a single event
+# loop, as it schedules tasks on the loop it's created in.
+STARTUP_SCRIPT = """
+import asyncio, json, sys, time
+
+start = time.perf_counter()
+from bot.bot import Bot
+imported = time.perf_counter()
+
+async def start_up():
+    bot = Bot()
+    constructed = time.perf_counter()
+    try:
+        await bot.connect_to_database()
+        connected = time.perf_counter()
+        extensions = sorted(bot.extensions)
+    finally:
+        await bot.close_database_connection()
+        await bot.close()
+
+    return {
+        "import": imported - start,
+        "construct": constructed - imported,
+        "database": connected - constructed,
+        "total": connected - start,
+        "extensions": extensions,
+        "ollama_imported": "ollama" in sys.modules,
+    }
+
+print(json.dumps(asyncio.run(start_up())))
+"""
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def child_environment(disabled_extensions: list[str]) -> dict[str, str]:
+    return {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])),
+        "ZZ_DISCORD_BOT_TOKEN": "benchmark",
+        "ZZ_OLLAMA_HOST": "localhost",
+        "ZZ_OLLAMA_MODEL": "benchmark",
+        "ZZ_DATABASE_PATH": "benchmark.db",
+        "ZZ_DISABLED_EXTENSIONS": json.dumps(disabled_extensions),
+    }
+
+
+def measure_imports(env: dict[str, str], cwd: str, top: int) -> dict[str, object]:
+    """Parse `python -X importtime` for `bot.bot` and every extension it loads."""
+    script = "from bot.bot import Bot; Bot()"
+    process = subprocess.run(  # noqa: S603
+        [sys.executable, "-X", "importtime", "-c", script],
+        env=env,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    self_times: dict[str, int] = {}
+    cumulative: dict[str, int] = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match is None:
+            continue
+        self_us, cumulative_us, _, module = match.groups()
+        self_times[module] = int(self_us)
+        cumulative[module] = int(cumulative_us)
+
+    slowest = sorted(self_times.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "total_us": sum(self_times.values()),
+        "bot_modules_us": {module: us for module, us in cumulative.items() if module.startswith("bot")},
+        "slowest_self_us": dict(slowest),
+    }
+
+
+def measure_startup(env: dict[str, str], cwd: str, runs: int) -> dict[str, object]:
+    samples = []
+    for _ in range(runs):
+        Path(cwd, "benchmark.db").unlink(missing_ok=True)
+        process = subprocess.run(  # noqa: S603
+            [sys.executable, "-c", STARTUP_SCRIPT],
+            env=env,
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        samples.append(json.loads(process.stdout.splitlines()[-1]))
+
+    stages = ("import", "construct", "database", "total")
+    return {
+        **{f"{stage}_s": statistics.median(sample[stage] for sample in samples) for stage in stages},
+        "extensions": samples[-1]["extensions"],
+        "ollama_imported": samples[-1]["ollama_imported"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per configuration")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest modules to report")
+    args = parser.parse_args()
+
+    configurations = {"all_extensions": [], "without_help": ["help"]}
+    results = {}
+
+    # The bot writes zz.log and the database to the working directory
+    with tempfile.TemporaryDirectory() as cwd:
+        for name, disabled in configurations.items():
+            env = child_environment(disabled)
+            results[name] = {
+                "startup": measure_startup(env, cwd, args.runs),
+                "imports": measure_imports(env, cwd, args.top),
+            }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Seeded generator of synthetic guilds for benchmarks."""
+
+import itertools
+import random
+from collections.abc import Iterator
+
+from bot.repositories.tags import DEFAULT_TAGS, TagRow
+
+TAGS = DEFAULT_TAGS
+
+
+def tag_popularity(rng: random.Random, skew: float) -> tuple[list[str], list[float]]:
+    """Rank the tags in a random order and weigh them by a Zipf distribution.
+
+    Returns:
+        The tags, most popular first, and their cumulative weights.
+    """
+    tags = rng.sample(TAGS, len(TAGS))
+    weights = [1 / rank**skew for rank in range(1, len(tags) + 1)]
+    return tags, list(itertools.accumulate(weights))
+
+
+def generate_guild(  # noqa: PLR0913
+    guild_id: int,
+    members: int,
+    *,
+    seed: int = 0,
+    greeter_ratio: float = 0.1,
+    max_tags: int = 6,
+    skew: float = 1.0,
+    first_user_id: int = 1,
+) -> Iterator[TagRow]:
+    """Generate the tags of a guild's members.
+
+    Every member has between 1 and `max_tags` distinct tags. Like in real
+    guilds, a few tags are much more popular than the rest: the nth most
+    popular tag is picked 1/n^`skew` times as often as the most popular one.
+
+    Args:
+        guild_id: The ID of the generated guild.
+        members: How many members have tags.
+        seed: The seed of the random generator, so runs are reproducible.
+        greeter_ratio: The fraction of members that are greeters.
+        max_tags: The most tags a member has.
+        skew: How skewed tag popularity is. 0 makes every tag as popular.
+        first_user_id: The user ID of the first member.
+
+    Yields:
+        The rows of every member, ordered by user ID.
+    """
+    rng = random.Random(seed)
+    tags, cumulative_weights = tag_popularity(rng, skew)
+    max_tags = min(max_tags, len(tags))
+
+    for user_id in range(first_user_id, first_user_id + members):
+        greeter = rng.random() < greeter_ratio
+        count = rng.randint(1, max_tags)
+        chosen: set[str] = set()
+        while len(chosen) < count:
+            chosen.update(rng.choices(tags, cum_weights=cumulative_weights, k=count - len(chosen)))
+        for tag in sorted(chosen):
+            yield TagRow(guild_id, user_id, tag, greeter)
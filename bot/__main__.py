@@ -1,14 +1,38 @@
 import asyncio
+import math
 
 from bot.bot import Bot
+from bot.cluster import failing_fast, write_health
+from bot.runtime import run
+from bot.settings import Settings
+
+
+async def publish_health(bot: Bot) -> None:
+    """Log the bot's health and write it to the health file, like the cluster launcher does."""
+    while True:
+        await asyncio.sleep(bot.settings.cluster_health_interval)
+        metrics = bot.collect_metrics()
+        failing = failing_fast(metrics["breakers"])
+        bot.logger.info(
+            "%s, %d guilds, latency %s%s",
+            "Ready" if metrics["ready"] else "Not ready",
+            len(bot.guilds),
+            f"{bot.latency * 1000:.0f}ms" if math.isfinite(bot.latency) else "n/a",
+            f", failing fast: {', '.join(failing)}" if failing else "",
+        )
+
+        if bot.settings.cluster_health_path is not None:
+            write_health(bot.settings.cluster_health_path, metrics)
 
 
 async def main() -> None:
     bot = Bot()
-    await bot.connect_to_database()
-    await bot.start(bot.settings.discord_bot_token)
-    await bot.close_database_connection()
+    publisher = asyncio.create_task(publish_health(bot))
+    try:
+        await bot.serve()
+    finally:
+        publisher.cancel()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(main(), fast=Settings().fast_runtime)  # pyright: ignore[reportCallIssue]
@@ -0,0 +1,264 @@
+"""Online backups of the database.
+
+Copying `zz.db` while the bot runs can produce a torn copy, since pages (and
+the write-ahead log next to it) may change halfway through. Backups instead
+use SQLite's online backup API from a separate connection, copying a few pages
+per step and sleeping in between. This runs in a thread (see
+`bot.maintenance`), so the event loop keeps going, and writers only ever wait
+for a single step.
+
+If writers change the database during a backup, SQLite starts it over. After
+a few restarts, the rest is copied in a single step instead, which reads one
+consistent snapshot. In WAL mode that doesn't block writers either.
+
+Snapshots are named after the database and the time they were taken, and only
+the newest ones are kept. Run it from the repository root:
+
+    python -m bot.backup create
+    python -m bot.backup list
+    python -m bot.backup restore backups/zz-20240101T000000Z.db
+
+Restoring checks the snapshot's integrity first, and should only be done while
+the bot is stopped.
+"""
+
+import argparse
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime
+from pathlib import Path
+
+from bot.settings import Settings
+
+TIMESTAMP_FORMAT = "%Y%m%dT%H%M%SZ"
+
+
+class IntegrityError(Exception):
+    """Raised when a snapshot fails SQLite's integrity check."""
+
+
+class _TooManyRestartsError(Exception):
+    pass
+
+
+@dataclass
+class BackupReport:
+    """What a backup did.
+
+    Attributes:
+        path: The path of the snapshot.
+        pages: The number of pages copied.
+        steps: The number of steps the copy took.
+        restarts: How many times SQLite started the copy over because the
+                  database changed.
+        duration: How long the backup took, in seconds.
+        longest_step: The longest step, in seconds. Writers may have to wait
+                      for up to this long.
+    """
+
+    path: str
+    pages: int
+    steps: int
+    restarts: int
+    duration: float
+    longest_step: float
+
+
+def snapshot_path(database_path: str, directory: str, taken_at: datetime) -> Path:
+    return Path(directory) / f"{Path(database_path).stem}-{taken_at.strftime(TIMESTAMP_FORMAT)}.db"
+
+
+def list_backups(database_path: str, directory: str) -> list[Path]:
+    """List the snapshots of a database, oldest first."""
+    return sorted(Path(directory).glob(f"{Path(database_path).stem}-*Z.db"))
+
+
+def rotate_backups(database_path: str, directory: str, retention: int) -> list[Path]:
+    """Delete all but the newest snapshots of a database.
+
+    Returns:
+        The deleted snapshots.
+    """
+    snapshots = list_backups(database_path, directory)
+    expired = snapshots[: max(len(snapshots) - retention, 0)]
+    for path in expired:
+        path.unlink()
+    return expired
+
+
+def create_backup(  # noqa: PLR0913
+    database_path: str,
+    directory: str,
+    pages_per_step: int = 256,
+    step_delay: float = 0.05,
+    *,
+    max_restarts: int = 3,
+    busy_timeout: float = 5.0,
+) -> BackupReport:
+    """Copy the database into a new snapshot.
+
+    This blocks, so run it in a thread from async code.
+
+    Args:
+        database_path: The database to back up.
+        directory: The directory to write the snapshot to.
+        pages_per_step: How many pages are copied per step.
+        step_delay: How long, in seconds, to sleep between steps.
+        max_restarts: How many times the copy may start over before the rest
+                      is copied in a single step.
+        busy_timeout: How long, in seconds, to wait for locks.
+    """
+    start = time.perf_counter()
+    path = snapshot_path(database_path, directory, datetime.now(UTC))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Only complete snapshots get their final name
+    temporary_path = path.with_suffix(".db.tmp")
+
+    steps = 0
+    restarts = 0
+    pages = 0
+    longest_step = 0.0
+    remaining_before: int | None = None
+    step_start = time.perf_counter()
+
+    def progress(_: int, remaining: int, total: int) -> None:
+        nonlocal steps, restarts, pages, longest_step, remaining_before, step_start
+
+        longest_step = max(longest_step, time.perf_counter() - step_start)
+        steps += 1
+        pages = total
+        if remaining_before is not None and remaining >= remaining_before:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _TooManyRestartsError
+        remaining_before = remaining
+
+        if remaining > 0:
+            time.sleep(step_delay)
+        step_start = time.perf_counter()
+
+    source = sqlite3.connect(database_path, timeout=busy_timeout)
+    destination = sqlite3.connect(temporary_path)
+    try:
+        try:
+            try:
+                source.backup(destination, pages=pages_per_step, progress=progress)
+            except _TooManyRestartsError:
+                step_start = time.perf_counter()
+                source.backup(destination, pages=-1, progress=progress)
+
+            # Snapshots are self-contained files, without a write-ahead log
+            destination.execute("PRAGMA journal_mode = DELETE")
+        finally:
+            destination.close()
+            source.close()
+
+        temporary_path.replace(path)
+    finally:
+        # A failed backup doesn't leave its partial copy behind
+        temporary_path.unlink(missing_ok=True)
+    return BackupReport(
+        path=str(path),
+        pages=pages,
+        steps=steps,
+        restarts=restarts,
+        duration=time.perf_counter() - start,
+        longest_step=longest_step,
+    )
+
+
+def check_integrity(path: str | Path) -> None:
+    """Run SQLite's integrity check on a database.
+
+    Raises:
+        IntegrityError: The database is corrupt, or isn't a database.
+    """
+    if not Path(path).is_file():
+        msg = f"{path} doesn't exist"
+        raise IntegrityError(msg)
+
+    connection = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        problems = [problem for (problem,) in connection.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as error:
+        raise IntegrityError(str(error)) from error
+    finally:
+        connection.close()
+
+    if problems != ["ok"]:
+        raise IntegrityError("\n".join(problems))
+
+
+def restore_backup(snapshot: str | Path, database_path: str, busy_timeout: float = 5.0) -> None:
+    """Replace the contents of the database with a snapshot.
+
+    Raises:
+        IntegrityError: The snapshot failed the integrity check, so the
+                        database was left alone.
+    """
+    check_integrity(snapshot)
+
+    source = sqlite3.connect(snapshot)
+    destination = sqlite3.connect(database_path, timeout=busy_timeout)
+    try:
+        source.backup(destination)
+    finally:
+        destination.close()
+        source.close()
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m bot.backup",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--database", help="the SQLite database (defaults to ZZ_DATABASE_PATH)")
+    parser.add_argument("--directory", help="the snapshot directory (defaults to ZZ_BACKUP_DIRECTORY)")
+
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("create", help="take a snapshot and delete expired ones")
+    commands.add_parser("list", help="list the snapshots, oldest first")
+    restore_parser = commands.add_parser("restore", help="check a snapshot and restore it")
+    restore_parser.add_argument("snapshot", help="the snapshot to restore")
+
+    return parser.parse_args()
+
+
+def main() -> None:
+    arguments = parse_arguments()
+
+    settings = Settings()  # pyright: ignore[reportCallIssue]
+    database_path = arguments.database or settings.database_path
+    directory = arguments.directory or settings.backup_directory
+
+    if arguments.command == "create":
+        report = create_backup(
+            database_path,
+            directory,
+            settings.backup_pages_per_step,
+            settings.backup_step_delay,
+            busy_timeout=settings.database_busy_timeout,
+        )
+        print(
+            f"Backed up {report.pages} pages to {report.path} in {report.duration:.2f}s "
+            f"({report.steps} steps, {report.restarts} restarts, longest step {report.longest_step * 1000:.1f}ms)",
+            file=sys.stderr,
+        )
+        for path in rotate_backups(database_path, directory, settings.backup_retention):
+            print(f"Deleted {path}", file=sys.stderr)
+    elif arguments.command == "list":
+        for path in list_backups(database_path, directory):
+            print(path)
+    else:
+        try:
+            restore_backup(arguments.snapshot, database_path, settings.database_busy_timeout)
+        except IntegrityError as error:
+            sys.exit(f"Not restoring {arguments.snapshot}, it failed the integrity check:\n{error}")
+        print(f"Restored {arguments.snapshot} to {database_path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
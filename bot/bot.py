@@ -1,10 +1,24 @@
+import asyncio
 import logging
+import time
+from collections import Counter
+from pkgutil import iter_modules
+from typing import Any
 
 import aiosqlite
-from disnake.ext.commands import InteractionBot
+from disnake.ext.commands import AutoShardedInteractionBot
 from rich.logging import RichHandler
 
+from bot import exts
+from bot.breaker import database_breaker, ollama_breaker
+from bot.cache import gateway_options
+from bot.maintenance import MaintenanceScheduler
+from bot.outbound import OutboundScheduler
+from bot.recording import TrafficRecorder
+from bot.repositories.guarded import GuardedTagRepository
+from bot.repositories.memory import MemoryTagRepository
 from bot.repositories.tags import SqliteTagRepository, TagRepository
+from bot.runtime import describe_runtime
 from bot.settings import Settings
 
 
@@ -24,27 +38,129 @@ def configure_logging() -> None:
     )
 
 
-class Bot(InteractionBot):
-    def __init__(self) -> None:
-        super().__init__()
+class Bot(AutoShardedInteractionBot):
+    def __init__(self, *, shard_ids: list[int] | None = None, shard_count: int | None = None) -> None:
+        """Create the bot.
 
+        Without any shard settings, Discord's recommended number of shards is
+        used and they all run in this process. The cluster launcher
+        (`bot.cluster`) overrides `shard_ids` and `shard_count` for each worker.
+
+        Args:
+            shard_ids: The shards to run, defaulting to `Settings.shard_ids`.
+            shard_count: The total number of shards, defaulting to
+                         `Settings.shard_count`.
+        """
         self.settings = Settings()  # pyright: ignore[reportCallIssue]
 
+        super().__init__(
+            **gateway_options(self.settings),
+            shard_ids=shard_ids if shard_ids is not None else self.settings.shard_ids,
+            shard_count=shard_count if shard_count is not None else self.settings.shard_count,
+        )
+
+        # Used to report the time it takes to become ready
+        self.created_at = time.perf_counter()
+        self.ready_after: float | None = None
+
         configure_logging()
         self.logger = logging.getLogger("zz")
 
+        self.outbound = OutboundScheduler(self.settings.outbound_max_in_flight)
+        self.outbound.install(self.http)
+
+        self.database_breaker = database_breaker(self.settings)
+        self.ollama_breaker = ollama_breaker(self.settings)
+
         self.database_connection: aiosqlite.Connection | None = None
         self.tag_repository: TagRepository | None = None
+        self.maintenance = MaintenanceScheduler(self)
+        self.traffic_recorder = None
+        if self.settings.traffic_record_path is not None:
+            self.traffic_recorder = TrafficRecorder(self, self.settings.traffic_record_path)
+
+        self.load_enabled_extensions()
 
-        self.load_extensions("bot/exts")
+    def load_enabled_extensions(self) -> None:
+        """Load every extension in `bot.exts` that isn't disabled in the settings.
+
+        Modules are discovered without importing them, so a disabled extension
+        (and whatever it imports) never gets loaded.
+        """
+        for module in iter_modules(exts.__path__, f"{exts.__name__}."):
+            name = module.name.rpartition(".")[2]
+            if name in self.settings.disabled_extensions:
+                self.logger.info("Skipping disabled extension %s", name)
+                continue
+
+            self.load_extension(module.name)
+
+    async def serve(self) -> None:
+        """Connect to the database and Discord, and run until the bot is closed."""
+        # The database and the gateway login don't depend on each other, so do both at once
+        await asyncio.gather(
+            self.connect_to_database(),
+            self.login(self.settings.discord_bot_token),
+        )
+        await self.connect()
+        await self.close_database_connection()
+        if self.traffic_recorder is not None:
+            self.traffic_recorder.close()
 
     async def connect_to_database(self) -> None:
-        # TODO: Use PostgreSQL
-        self.database_connection = await aiosqlite.connect(self.settings.database_path)
+        repository: TagRepository
+        if self.settings.tag_repository == "memory":
+            repository = MemoryTagRepository(scoring=self.settings.suggestion_scoring)
+        else:
+            # TODO: Use PostgreSQL
+            self.database_connection = await aiosqlite.connect(
+                self.settings.database_path,
+                timeout=self.settings.database_busy_timeout,
+            )
+            repository = SqliteTagRepository(
+                self.database_connection,
+                scoring=self.settings.suggestion_scoring,
+            )
 
-        self.tag_repository = SqliteTagRepository(self.database_connection)
+        self.tag_repository = GuardedTagRepository(repository, self.database_breaker)
         await self.tag_repository.initialize()
+        self.maintenance.start()
 
     async def close_database_connection(self) -> None:
+        await self.maintenance.stop()
         if self.database_connection is not None:
             await self.database_connection.close()
+
+    async def on_ready(self) -> None:
+        # on_ready is also dispatched after reconnects, so only the first one counts
+        if self.ready_after is None:
+            self.ready_after = time.perf_counter() - self.created_at
+            self.logger.info("Ready after %.2fs", self.ready_after)
+
+    def collect_metrics(self) -> dict[str, Any]:
+        """Collect a snapshot of the bot's health.
+
+        The snapshot only contains plain data so it can be sent between
+        processes by the cluster launcher.
+        """
+        guilds_per_shard = Counter(guild.shard_id for guild in self.guilds)
+        return {
+            "ready": self.is_ready(),
+            "ready_after": self.ready_after,
+            "uptime": time.perf_counter() - self.created_at,
+            "shards": {
+                shard_id: {
+                    "latency": shard.latency,
+                    "closed": shard.is_closed(),
+                    "ratelimited": shard.is_ws_ratelimited(),
+                    "guilds": guilds_per_shard[shard_id],
+                }
+                for shard_id, shard in self.shards.items()
+            },
+            "maintenance": self.maintenance.collect_metrics(),
+            "outbound": self.outbound.collect_metrics(),
+            "breakers": {
+                breaker.name: breaker.collect_metrics() for breaker in (self.database_breaker, self.ollama_breaker)
+            },
+            "runtime": describe_runtime(),
+        }
@@ -0,0 +1,173 @@
+"""Circuit breakers, so commands fail fast while a dependency is down.
+
+Without them, every command using a dependency that's down waits for it to
+time out: Ollama's HTTP timeout for `/help`, or SQLite's busy timeout for
+`/tag` when another process holds a lock on the database.
+
+A breaker bounds each call with its own timeout and counts the calls that
+fail in a row. Once `Settings.breaker_failure_threshold` have, it opens, and
+calls are refused straight away with `DependencyUnavailableError` for
+`Settings.breaker_open_duration` seconds. The next call is then let through as
+a probe: the breaker closes again if it succeeds, and stays open for another
+period if it fails.
+
+The bot has a breaker for the database (see
+`bot.repositories.guarded.GuardedTagRepository`) and one for Ollama (see
+`bot.exts.help`). Their state is reported in the bot's metrics.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from collections.abc import Awaitable, Callable
+from typing import TYPE_CHECKING, Any, Literal, TypeVar
+
+from bot.errors import DependencyUnavailableError
+
+if TYPE_CHECKING:
+    from bot.settings import Settings
+
+logger = logging.getLogger("zz.breaker")
+
+T = TypeVar("T")
+
+State = Literal["closed", "open", "half-open"]
+
+
+class CircuitBreaker:
+    """Guards calls to a dependency, see the module's documentation.
+
+    Attributes:
+        name: The name of the dependency, as shown in errors and metrics.
+        timeout: How many seconds a call may take before it counts as failed.
+        failure_threshold: How many calls in a row have to fail to open.
+        open_duration: How many seconds calls are refused for once open.
+        failures: The exceptions that count as failures. Any other exception
+                  is the caller's problem rather than the dependency's, and
+                  is passed through without counting.
+        shield: Whether calls that time out are left to finish rather than
+                cancelled, for calls that mustn't be interrupted halfway (like
+                a transaction on a shared connection).
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        name: str,
+        *,
+        timeout: float,
+        failure_threshold: int,
+        open_duration: float,
+        failures: tuple[type[BaseException], ...] = (Exception,),
+        shield: bool = False,
+    ) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.open_duration = open_duration
+        self.failures = failures
+        self.shield = shield
+
+        self.state: State = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self.last_error: str | None = None
+
+    @property
+    def retry_after(self) -> float:
+        """How many seconds are left until the breaker lets a probe through."""
+        return max(self.opened_at + self.open_duration - time.monotonic(), 0.0)
+
+    async def call(self, function: Callable[[], Awaitable[T]]) -> T:
+        """Call a dependency through the breaker.
+
+        Raises:
+            DependencyUnavailableError: The breaker is open, or the call
+                                        timed out.
+        """
+        if self.state == "half-open" or (self.state == "open" and self.retry_after > 0):
+            # Only one probe at a time, the others fail fast until it's done
+            self.rejected += 1
+            raise DependencyUnavailableError(self.name, self.retry_after)
+
+        if self.state == "open":
+            self.state = "half-open"
+            logger.info("Probing %s", self.name)
+
+        awaitable = function()
+        if self.shield:
+            task = asyncio.ensure_future(awaitable)
+            # Nobody is left to retrieve the error of a call that timed out
+            task.add_done_callback(lambda task: task.cancelled() or task.exception())
+            awaitable = asyncio.shield(task)
+
+        try:
+            async with asyncio.timeout(self.timeout):
+                result = await awaitable
+        except TimeoutError as error:
+            self._record_failure(f"Timed out after {self.timeout}s")
+            raise DependencyUnavailableError(self.name, self.retry_after) from error
+        except self.failures as error:
+            self._record_failure(repr(error))
+            raise
+        except BaseException:
+            # Not the dependency's fault (e.g. the call was cancelled), but a
+            # probe has to let the next call through
+            if self.state == "half-open":
+                self.state = "open"
+            raise
+
+        if self.state != "closed":
+            logger.info("%s recovered, closing its circuit breaker", self.name)
+        self.state = "closed"
+        self.consecutive_failures = 0
+        return result
+
+    def collect_metrics(self) -> dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after": self.retry_after if self.state != "closed" else 0.0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "last_error": self.last_error,
+        }
+
+    def _record_failure(self, error: str) -> None:
+        self.consecutive_failures += 1
+        self.last_error = error
+        if self.state == "half-open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state == "closed":
+                logger.warning(
+                    "%s failed %d times in a row (%s), failing fast for %.0fs",
+                    self.name,
+                    self.consecutive_failures,
+                    error,
+                    self.open_duration,
+                )
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+def database_breaker(settings: "Settings") -> CircuitBreaker:
+    return CircuitBreaker(
+        "database",
+        timeout=settings.database_timeout,
+        failure_threshold=settings.breaker_failure_threshold,
+        open_duration=settings.breaker_open_duration,
+        failures=(sqlite3.Error,),
+        # Cancelling a write halfway would leave its transaction open on the shared connection
+        shield=True,
+    )
+
+
+def ollama_breaker(settings: "Settings") -> CircuitBreaker:
+    return CircuitBreaker(
+        "Ollama",
+        timeout=settings.ollama_timeout,
+        failure_threshold=settings.breaker_failure_threshold,
+        open_duration=settings.breaker_open_duration,
+    )
@@ -0,0 +1,236 @@
+"""Bulk import and export of tag data.
+
+Tags and greeter flags are streamed to and from JSON lines or CSV files, so
+migrating or auditing even very large databases runs in constant memory. Run
+it from the repository root:
+
+    python -m bot.bulk export --guild 1234 tags.jsonl
+    python -m bot.bulk import tags.csv
+
+The file defaults to stdin/stdout, and the format to the file's extension (or
+JSON lines when streaming).
+
+Imported rows are checked against their guild's tags, and rows with a tag the
+guild doesn't have are rejected. With `--add-tags`, those tags are added to
+the guild's tags instead, as long as they'd be accepted by `/taxonomy add`.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import sys
+import time
+from collections.abc import AsyncIterator, Iterator
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import Literal, TextIO
+
+import aiosqlite
+
+from bot.repositories.tags import (
+    MAX_GUILD_TAGS,
+    SqliteTagRepository,
+    TagRepository,
+    TagRow,
+    is_valid_tag_name,
+)
+from bot.settings import Settings
+
+Format = Literal["jsonl", "csv"]
+
+CSV_FIELDS = TagRow._fields
+
+
+class InvalidRowError(Exception):
+    """Raised when a row being imported is malformed."""
+
+
+def parse_greeter(value: object) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int):
+        return value != 0
+
+    normalized = str(value).strip().lower()
+    if normalized in {"1", "true", "yes"}:
+        return True
+    if normalized in {"", "0", "false", "no"}:
+        return False
+    msg = f"Invalid greeter flag: {value!r}"
+    raise InvalidRowError(msg)
+
+
+def parse_row(fields: dict[str, object], line_number: int) -> TagRow:
+    try:
+        return TagRow(
+            guild_id=int(fields["guild_id"]),  # pyright: ignore[reportArgumentType]
+            user_id=int(fields["user_id"]),  # pyright: ignore[reportArgumentType]
+            tag=str(fields["tag"]),
+            greeter=parse_greeter(fields.get("greeter", False)),
+        )
+    except (KeyError, TypeError, ValueError, InvalidRowError) as error:
+        msg = f"Line {line_number}: {error}"
+        raise InvalidRowError(msg) from error
+
+
+@dataclass
+class TagChecker:
+    """Checks the tags of imported rows against their guild's tags.
+
+    Attributes:
+        repository: The repository the rows are imported into.
+        add_tags: Whether tags missing from a guild's tags are added to them,
+                  rather than rejected.
+    """
+
+    repository: TagRepository
+    add_tags: bool = False
+    _tags: dict[int, set[str]] = field(default_factory=dict, init=False, repr=False)
+
+    async def check(self, row: TagRow, line_number: int) -> None:
+        tags = self._tags.get(row.guild_id)
+        if tags is None:
+            taxonomy = await self.repository.get_taxonomy(row.guild_id)
+            tags = self._tags[row.guild_id] = set(taxonomy.ids)
+
+        if row.tag in tags:
+            return
+
+        if not self.add_tags:
+            msg = f"Line {line_number}: Guild {row.guild_id} doesn't have the tag {row.tag!r} (see --add-tags)"
+        elif not is_valid_tag_name(row.tag):
+            msg = f"Line {line_number}: Invalid tag name: {row.tag!r}"
+        elif len(tags) >= MAX_GUILD_TAGS:
+            msg = f"Line {line_number}: Guild {row.guild_id} can't have more than {MAX_GUILD_TAGS} tags"
+        else:
+            tags.add(row.tag)
+            return
+        raise InvalidRowError(msg)
+
+
+def read_fields(file: TextIO, format: Format) -> Iterator[tuple[int, dict[str, object]]]:
+    """Decode the fields of each row in a file, along with its line number."""
+    if format == "csv":
+        reader = csv.DictReader(file)
+        for fields in reader:
+            yield reader.line_num, fields
+        return
+
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            fields = json.loads(line)
+        except json.JSONDecodeError as error:
+            msg = f"Line {line_number}: {error}"
+            raise InvalidRowError(msg) from error
+        yield line_number, fields
+
+
+async def read_rows(file: TextIO, format: Format, checker: TagChecker | None = None) -> AsyncIterator[TagRow]:
+    """Parse rows from a file one at a time.
+
+    Args:
+        file: The file to read.
+        format: The file's format.
+        checker: What checks the tags of the rows, if anything.
+    """
+    for line_number, fields in read_fields(file, format):
+        row = parse_row(fields, line_number)
+        if checker is not None:
+            await checker.check(row, line_number)
+        yield row
+
+
+async def write_rows(rows: AsyncIterator[TagRow], file: TextIO, format: Format) -> int:
+    """Write rows to a file as they arrive.
+
+    Returns:
+        The number of rows written.
+    """
+    written = 0
+
+    if format == "csv":
+        writer = csv.writer(file)
+        writer.writerow(CSV_FIELDS)
+        async for row in rows:
+            writer.writerow((row.guild_id, row.user_id, row.tag, int(row.greeter)))
+            written += 1
+    else:
+        async for row in rows:
+            file.write(json.dumps(row._asdict()) + "\n")
+            written += 1
+
+    return written
+
+
+async def export_tags(repository: TagRepository, file: TextIO, format: Format, guild_id: int | None = None) -> int:
+    return await write_rows(repository.export_rows(guild_id), file, format)
+
+
+async def import_tags(repository: TagRepository, file: TextIO, format: Format, *, add_tags: bool = False) -> int:
+    checker = TagChecker(repository, add_tags=add_tags)
+    return await repository.import_rows(read_rows(file, format, checker))
+
+
+def guess_format(path: str | None) -> Format:
+    if path is not None and path.lower().endswith(".csv"):
+        return "csv"
+    return "jsonl"
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m bot.bulk",
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--database", help="the SQLite database (defaults to ZZ_DATABASE_PATH)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="the file format")
+
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="export tags to a file")
+    export_parser.add_argument("--guild", type=int, help="only export this guild")
+    export_parser.add_argument("file", nargs="?", help="the file to write (defaults to stdout)")
+
+    import_parser = commands.add_parser("import", help="import tags from a file")
+    import_parser.add_argument("--add-tags", action="store_true", help="add tags that guilds don't have yet")
+    import_parser.add_argument("file", nargs="?", help="the file to read (defaults to stdin)")
+
+    return parser.parse_args()
+
+
+async def main() -> None:
+    arguments = parse_arguments()
+
+    database_path = arguments.database or Settings().database_path  # pyright: ignore[reportCallIssue]
+    format: Format = arguments.format or guess_format(arguments.file)
+
+    async with aiosqlite.connect(database_path) as connection:
+        repository = SqliteTagRepository(connection)
+        await repository.initialize()
+
+        with ExitStack() as stack:
+            start = time.perf_counter()
+
+            if arguments.command == "export":
+                file = sys.stdout
+                if arguments.file is not None:
+                    file = stack.enter_context(open(arguments.file, "w", newline="", encoding="utf-8"))  # noqa: ASYNC230, PTH123
+                count = await export_tags(repository, file, format, arguments.guild)
+                action = "Exported"
+            else:
+                file = sys.stdin
+                if arguments.file is not None:
+                    file = stack.enter_context(open(arguments.file, newline="", encoding="utf-8"))  # noqa: ASYNC230, PTH123
+                count = await import_tags(repository, file, format, add_tags=arguments.add_tags)
+                action = "Imported"
+
+    elapsed = time.perf_counter() - start
+    print(f"{action} {count} rows in {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
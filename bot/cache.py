@@ -0,0 +1,56 @@
+"""What the bot caches from Discord's gateway, and how cogs cope with what it doesn't.
+
+By default, the bot uses disnake's default intents and caches, which keep
+every member and recent message of every guild in memory. The cogs only read
+guilds with their roles and channels, and the members interacting (which come
+with the interaction), so `Settings.lean_cache` turns everything else off.
+Members the cogs look up are then fetched from Discord instead.
+
+Guilds may still be missing from the cache, e.g. right after the bot starts,
+so cogs get them through `require_guild`.
+"""
+
+from typing import TYPE_CHECKING, Any
+
+import disnake
+from disnake import Guild, Interaction
+from disnake.ext.commands import NoPrivateMessage
+
+from bot.errors import GuildNotCachedError
+
+if TYPE_CHECKING:
+    from bot.settings import Settings
+
+
+def gateway_options(settings: "Settings") -> dict[str, Any]:
+    """Get the intents and cache options to create the bot with."""
+    if not settings.lean_cache:
+        intents = disnake.Intents.default()
+        intents.members = settings.members_intent
+        return {"intents": intents}
+
+    # Guild events bring roles and channels, which is all the cogs read. The
+    # members intent is only used to notice members leaving (see `bot.maintenance`).
+    intents = disnake.Intents.none()
+    intents.guilds = True
+    intents.members = settings.members_intent
+    return {
+        "intents": intents,
+        "member_cache_flags": disnake.MemberCacheFlags.none(),
+        "max_messages": None,
+        "chunk_guilds_at_startup": False,
+    }
+
+
+def require_guild(interaction: Interaction) -> Guild:
+    """Get the guild an interaction happened in.
+
+    Raises:
+        NoPrivateMessage: The interaction didn't happen in a guild.
+        GuildNotCachedError: The guild isn't cached yet.
+    """
+    if interaction.guild is not None:
+        return interaction.guild
+    if interaction.guild_id is None:
+        raise NoPrivateMessage
+    raise GuildNotCachedError
@@ -0,0 +1,337 @@
+"""Run the bot as a cluster of processes, each owning a range of shards.
+
+A single process only uses one core and one gateway connection per shard it
+runs. The launcher splits the shards into contiguous ranges, starts a worker
+process for each range, restarts workers that exit or stop reporting, and
+aggregates the health each worker reports.
+
+Start it from the repository root with:
+
+    python -m bot.cluster
+
+The shard and process counts are read from the settings (see
+`bot.settings.Settings`).
+"""
+
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from dataclasses import dataclass, field
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from queue import Empty
+from typing import TYPE_CHECKING, Any
+
+import aiohttp
+import aiosqlite
+
+from bot.bot import Bot, configure_logging
+from bot.repositories.tags import SqliteTagRepository
+from bot.runtime import run
+from bot.settings import Settings
+
+if TYPE_CHECKING:
+    from multiprocessing.queues import Queue
+
+GATEWAY_BOT_URL = "https://discord.com/api/v10/gateway/bot"
+
+# A worker that has been up for this long is considered healthy again, so its
+# restart backoff starts over.
+STABLE_AFTER = 60.0
+MAX_BACKOFF = 60.0
+
+# A worker that hasn't reported for this many health intervals is restarted.
+UNRESPONSIVE_INTERVALS = 5
+
+logger = logging.getLogger("zz.cluster")
+
+
+def split_shards(shard_count: int, processes: int) -> list[list[int]]:
+    """Split the shards into contiguous, evenly sized ranges.
+
+    Args:
+        shard_count: The total number of shards.
+        processes: The number of ranges to split the shards into.
+
+    Returns:
+        A list of shard ID ranges, one per process. Processes never get an
+        empty range, so there may be fewer ranges than processes.
+    """
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+
+    ranges: list[list[int]] = []
+    start = 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def fetch_recommended_shard_count(token: str) -> int:
+    """Ask Discord how many shards the bot should use."""
+    headers = {"Authorization": f"Bot {token}"}
+    async with aiohttp.ClientSession() as session, session.get(GATEWAY_BOT_URL, headers=headers) as response:
+        response.raise_for_status()
+        data = await response.json()
+    return int(data["shards"])
+
+
+def write_health(path: str, health: dict[str, Any]) -> None:
+    """Write the health as JSON, replacing the file at once so readers never see half of it."""
+    temporary_path = Path(path).with_suffix(Path(path).suffix + ".tmp")
+    temporary_path.write_text(json.dumps(health, indent=2))
+    temporary_path.replace(path)
+
+
+def failing_fast(breakers: dict[str, dict[str, Any]]) -> list[str]:
+    """Get the names of the dependencies whose circuit breaker isn't closed."""
+    return [name for name, breaker in breakers.items() if breaker["state"] != "closed"]
+
+
+async def prepare_database(settings: Settings) -> None:
+    """Create the schema once, before any worker opens the database."""
+    async with aiosqlite.connect(settings.database_path, timeout=settings.database_busy_timeout) as connection:
+        await SqliteTagRepository(connection).initialize()
+
+
+def run_worker(cluster_id: int, shard_ids: list[int], shard_count: int, reports: "Queue[Any]") -> None:
+    """Entry point of a worker process."""
+    run(serve_worker(cluster_id, shard_ids, shard_count, reports), fast=Settings().fast_runtime)  # pyright: ignore[reportCallIssue]
+
+
+async def serve_worker(cluster_id: int, shard_ids: list[int], shard_count: int, reports: "Queue[Any]") -> None:
+    bot = Bot(shard_ids=shard_ids, shard_count=shard_count)
+    bot.logger.info("Cluster %d starting with shards %s", cluster_id, shard_ids)
+
+    async def report_health() -> None:
+        while True:
+            reports.put((cluster_id, bot.collect_metrics()))
+            await asyncio.sleep(bot.settings.cluster_health_interval)
+
+    reporter = asyncio.create_task(report_health())
+    try:
+        await bot.serve()
+    finally:
+        reporter.cancel()
+
+
+@dataclass
+class Worker:
+    """A worker process and what the launcher knows about it."""
+
+    cluster_id: int
+    shard_ids: list[int]
+    process: BaseProcess | None = None
+    started_at: float = 0.0
+    restarts: int = 0
+    consecutive_failures: int = 0
+    restart_at: float | None = None
+    report: dict[str, Any] = field(default_factory=dict)
+    reported_at: float | None = None
+
+
+class ClusterSupervisor:
+    """Starts, supervises and restarts the worker processes."""
+
+    def __init__(self, settings: Settings, shard_count: int, processes: int) -> None:
+        self.settings = settings
+        self.shard_count = shard_count
+
+        self.context = multiprocessing.get_context("spawn")
+        self.reports: Queue[Any] = self.context.Queue()
+        self.workers = [
+            Worker(cluster_id, shard_ids) for cluster_id, shard_ids in enumerate(split_shards(shard_count, processes))
+        ]
+
+    def start(self, worker: Worker) -> None:
+        worker.process = self.context.Process(
+            target=run_worker,
+            args=(worker.cluster_id, worker.shard_ids, self.shard_count, self.reports),
+            name=f"zz-cluster-{worker.cluster_id}",
+            daemon=True,
+        )
+        worker.process.start()
+        worker.started_at = time.monotonic()
+        worker.report = {}
+        worker.reported_at = None
+        worker.restart_at = None
+        logger.info(
+            "Started cluster %d (pid %s) with shards %s",
+            worker.cluster_id,
+            worker.process.pid,
+            worker.shard_ids,
+        )
+
+    def stop(self, worker: Worker) -> None:
+        if worker.process is None:
+            return
+        worker.process.terminate()
+        worker.process.join(timeout=10)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+
+    def schedule_restart(self, worker: Worker, reason: str) -> None:
+        now = time.monotonic()
+        if now - worker.started_at >= STABLE_AFTER:
+            worker.consecutive_failures = 0
+        worker.consecutive_failures += 1
+        backoff = min(2.0 ** (worker.consecutive_failures - 1), MAX_BACKOFF)
+
+        worker.restarts += 1
+        worker.restart_at = now + backoff
+        logger.warning("Cluster %d %s, restarting in %.0fs", worker.cluster_id, reason, backoff)
+
+    def check(self, worker: Worker) -> None:
+        """Restart the worker if it exited or stopped reporting."""
+        now = time.monotonic()
+
+        if worker.restart_at is not None:
+            if now >= worker.restart_at:
+                self.start(worker)
+            return
+
+        if worker.process is None:
+            return
+
+        if not worker.process.is_alive():
+            self.schedule_restart(worker, f"exited with code {worker.process.exitcode}")
+            return
+
+        last_seen = worker.reported_at if worker.reported_at is not None else worker.started_at
+        if now - last_seen > self.settings.cluster_health_interval * UNRESPONSIVE_INTERVALS:
+            self.stop(worker)
+            self.schedule_restart(worker, "stopped reporting")
+
+    def wait_for_workers(self) -> None:
+        """Wait until a worker exits or is due a restart, and at most a second."""
+        now = time.monotonic()
+        restarts = (worker.restart_at - now for worker in self.workers if worker.restart_at is not None)
+        timeout = max(min(1.0, *restarts), 0.0)
+
+        # A dead process's sentinel stays ready, so workers waiting for their
+        # restart would wake the launcher up straight away until then
+        sentinels = [
+            worker.process.sentinel
+            for worker in self.workers
+            if worker.process is not None and worker.restart_at is None
+        ]
+        if sentinels:
+            wait(sentinels, timeout=timeout)
+        else:
+            time.sleep(timeout)
+
+    def drain_reports(self) -> None:
+        while True:
+            try:
+                cluster_id, report = self.reports.get_nowait()
+            except Empty:
+                return
+            worker = self.workers[cluster_id]
+            worker.report = report
+            worker.reported_at = time.monotonic()
+
+    def health(self) -> dict[str, Any]:
+        """Aggregate the latest reports of every worker."""
+        now = time.monotonic()
+        shards: dict[int, dict[str, Any]] = {}
+        clusters: dict[int, dict[str, Any]] = {}
+
+        for worker in self.workers:
+            alive = worker.process is not None and worker.process.is_alive()
+            clusters[worker.cluster_id] = {
+                "pid": worker.process.pid if worker.process is not None else None,
+                "alive": alive,
+                "ready": worker.report.get("ready", False),
+                "restarts": worker.restarts,
+                "last_report_age": None if worker.reported_at is None else now - worker.reported_at,
+                "breakers": worker.report.get("breakers", {}),
+                "outbound": worker.report.get("outbound", {}),
+                "maintenance": worker.report.get("maintenance", {}),
+            }
+            for shard_id in worker.shard_ids:
+                # Shards without a report yet are either still connecting or down
+                shard = worker.report.get("shards", {}).get(shard_id, {"closed": True, "guilds": 0})
+                shards[shard_id] = {**shard, "cluster_id": worker.cluster_id, "alive": alive}
+
+        latencies = [shard["latency"] for shard in shards.values() if shard.get("latency") not in (None, float("inf"))]
+        return {
+            "shard_count": self.shard_count,
+            "shards_up": sum(1 for shard in shards.values() if shard["alive"] and not shard["closed"]),
+            "guilds": sum(shard["guilds"] for shard in shards.values()),
+            "max_latency": max(latencies, default=None),
+            "clusters": clusters,
+            "shards": shards,
+        }
+
+    def publish_health(self) -> None:
+        health = self.health()
+        clusters = health["clusters"].values()
+        failing = sorted({name for cluster in clusters for name in failing_fast(cluster["breakers"])})
+        logger.info(
+            "%d/%d shards up, %d guilds, max latency %s%s",
+            health["shards_up"],
+            health["shard_count"],
+            health["guilds"],
+            "n/a" if health["max_latency"] is None else f"{health['max_latency'] * 1000:.0f}ms",
+            f", failing fast: {', '.join(failing)}" if failing else "",
+        )
+
+        if self.settings.cluster_health_path is not None:
+            write_health(self.settings.cluster_health_path, health)
+
+    def run(self) -> None:
+        for worker in self.workers:
+            self.start(worker)
+
+        next_publish = time.monotonic() + self.settings.cluster_health_interval
+        try:
+            while True:
+                self.wait_for_workers()
+
+                self.drain_reports()
+                for worker in self.workers:
+                    self.check(worker)
+
+                if time.monotonic() >= next_publish:
+                    self.publish_health()
+                    next_publish += self.settings.cluster_health_interval
+        finally:
+            for worker in self.workers:
+                self.stop(worker)
+
+
+def main() -> None:
+    configure_logging()
+    settings = Settings()  # pyright: ignore[reportCallIssue]
+
+    shard_count = settings.shard_count
+    if shard_count is None:
+        shard_count = asyncio.run(fetch_recommended_shard_count(settings.discord_bot_token))
+
+    processes = settings.cluster_processes or os.cpu_count() or 1
+
+    asyncio.run(prepare_database(settings))
+
+    # Make sure the workers are stopped when the launcher is stopped by a service manager
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    supervisor = ClusterSupervisor(settings, shard_count, processes)
+    logger.info("Running %d shards in %d processes", shard_count, len(supervisor.workers))
+
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        logger.info("Shutting down the cluster")
+
+
+if __name__ == "__main__":
+    main()
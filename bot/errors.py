@@ -7,3 +7,69 @@ class DatabaseNotConnectedError(CommandError):
 
 class GreeterRoleNotConfiguredError(CommandError):
     """Raised when the guild is missing the Greeter role."""
+
+
+class GuildNotCachedError(CommandError):
+    """Raised when the guild of an interaction isn't in the bot's cache yet."""
+
+
+class DependencyUnavailableError(CommandError):
+    """Raised when a dependency is failing, so commands don't wait for it (see `bot.breaker`).
+
+    Attributes:
+        dependency: The name of the dependency, e.g. "database" or "Ollama".
+        retry_after: How many seconds are left until the dependency is tried again.
+    """
+
+    def __init__(self, dependency: str, retry_after: float) -> None:
+        super().__init__(f"{dependency} is unavailable")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+class InvalidTagNameError(CommandError):
+    """Raised when a tag name isn't lowercase words separated by dashes.
+
+    Attributes:
+        name: The invalid name.
+    """
+
+    def __init__(self, name: str) -> None:
+        super().__init__(f"Invalid tag name {name!r}")
+        self.name = name
+
+
+class UnknownTagError(CommandError):
+    """Raised when the guild has no tag of a given name.
+
+    Attributes:
+        name: The name of the missing tag.
+    """
+
+    def __init__(self, name: str) -> None:
+        super().__init__(f"Unknown tag {name!r}")
+        self.name = name
+
+
+class DuplicateTagError(CommandError):
+    """Raised when the guild already has a tag of a given name.
+
+    Attributes:
+        name: The name of the existing tag.
+    """
+
+    def __init__(self, name: str) -> None:
+        super().__init__(f"Duplicate tag {name!r}")
+        self.name = name
+
+
+class TooManyTagsError(CommandError):
+    """Raised when the guild has as many tags as `/tag add` can show.
+
+    Attributes:
+        limit: The most tags a guild can have.
+    """
+
+    def __init__(self, limit: int) -> None:
+        super().__init__(f"A guild can't have more than {limit} tags")
+        self.limit = limit
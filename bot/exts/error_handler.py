@@ -1,11 +1,32 @@
+import logging
+import math
 from contextlib import suppress
+from typing import Any, override
 
-from disnake import ApplicationCommandInteraction, Color, Embed, InteractionResponded
+from disnake import ApplicationCommandInteraction, Color, Embed, InteractionResponded, MessageInteraction
 from disnake.ext.commands import BotMissingPermissions, Cog, CommandError, NoPrivateMessage
+from disnake.ui import Item, View
 from disnake.ui.button import Button
 
 from bot.bot import Bot
-from bot.errors import DatabaseNotConnectedError, GreeterRoleNotConfiguredError
+from bot.errors import (
+    DatabaseNotConnectedError,
+    DependencyUnavailableError,
+    DuplicateTagError,
+    GreeterRoleNotConfiguredError,
+    GuildNotCachedError,
+    InvalidTagNameError,
+    TooManyTagsError,
+    UnknownTagError,
+)
+
+logger = logging.getLogger("zz")
+
+# What's unavailable while a circuit breaker is open, see `bot.breaker`
+UNAVAILABLE_FEATURES = {
+    "database": "Tags are",
+    "Ollama": "AI help is",
+}
 
 
 class ErrorEmbed(Embed):
@@ -47,6 +68,84 @@ class ReportButton(Button[None]):
         )
 
 
+def create_error_embed(error: Exception) -> ErrorEmbed:  # noqa: C901
+    """Create the embed telling the user what went wrong."""
+    embed = ErrorEmbed(error)
+
+    if isinstance(error, DatabaseNotConnectedError):
+        embed.internal = True
+        embed.set_error("Database not connected")
+
+    if isinstance(error, BotMissingPermissions):
+        embed.internal = False
+        embed.set_error("I don't have the correct permissions to do that.")
+        embed.set_tip("Ensure my role is high enough in the role hierarchy.")
+
+    if isinstance(error, GreeterRoleNotConfiguredError):
+        embed.internal = False
+        embed.set_error("There is no role Greeter configured in this server.")
+        embed.set_tip("Create a role called 'Greeter'.")
+        embed.internal = False
+
+    if isinstance(error, GuildNotCachedError):
+        embed.internal = False
+        embed.set_error("I haven't finished loading this server yet.")
+        embed.set_tip("Try again in a minute.")
+
+    if isinstance(error, DependencyUnavailableError):
+        embed.internal = False
+        feature = UNAVAILABLE_FEATURES.get(error.dependency, f"{error.dependency} is")
+        embed.set_error(f"{feature} temporarily unavailable.")
+        if error.retry_after > 0:
+            embed.set_tip(f"Try again in {math.ceil(error.retry_after)} seconds.")
+        else:
+            embed.set_tip("Try again in a moment.")
+
+    if isinstance(error, InvalidTagNameError):
+        embed.internal = False
+        embed.set_error(f"`{error.name}` isn't a valid tag name.")
+        embed.set_tip("Use lowercase letters, digits and dashes, like `web-development`.")
+
+    if isinstance(error, UnknownTagError):
+        embed.internal = False
+        embed.set_error(f"This server has no `{error.name}` tag.")
+        embed.set_tip("Use `/tag add` to see the server's tags.")
+
+    if isinstance(error, DuplicateTagError):
+        embed.internal = False
+        embed.set_error(f"This server already has a `{error.name}` tag.")
+
+    if isinstance(error, TooManyTagsError):
+        embed.internal = False
+        embed.set_error(f"This server already has {error.limit} tags, the most `/tag add` can show.")
+        embed.set_tip("Remove a tag with `/taxonomy remove` first.")
+
+    if isinstance(error, NoPrivateMessage):
+        embed.internal = False
+        embed.set_error("This command can't be used in DMs.")
+        embed.set_tip("Use this command in a server.")
+
+    return embed
+
+
+class ErrorHandlingView(View):
+    """A view that tells the user what went wrong when a component's callback fails.
+
+    Without it, the user only sees Discord's "This interaction failed".
+    """
+
+    @override
+    async def on_error(self, error: Exception, item: Item[Any], interaction: MessageInteraction) -> None:
+        logger.error("Error in %r of %r", item, self, exc_info=error)
+
+        embed = create_error_embed(error)
+        await interaction.send(
+            embed=embed,
+            components=[ReportButton()] if embed.internal else [],
+            ephemeral=True,
+        )
+
+
 class ErrorHandler(Cog):
     def __init__(self, bot: Bot) -> None:
         self.bot = bot
@@ -62,28 +161,7 @@ class ErrorHandler(Cog):
         with suppress(InteractionResponded):
             await interaction.response.defer()
 
-        embed = ErrorEmbed(error)
-
-        if isinstance(error, DatabaseNotConnectedError):
-            embed.internal = True
-            embed.set_error("Database not connected")
-
-        if isinstance(error, BotMissingPermissions):
-            embed.internal = False
-            embed.set_error("I don't have the correct permissions to do that.")
-            embed.set_tip("Ensure my role is high enough in the role hierarchy.")
-
-        if isinstance(error, GreeterRoleNotConfiguredError):
-            embed.internal = False
-            embed.set_error("There is no role Greeter configured in this server.")
-            embed.set_tip("Create a role called 'Greeter'.")
-            embed.internal = False
-
-        if isinstance(error, NoPrivateMessage):
-            embed.internal = False
-            embed.set_error("This command can't be used in DMs.")
-            embed.set_tip("Use this command in a server.")
-
+        embed = create_error_embed(error)
         await interaction.followup.send(
             embed=embed,
             components=[ReportButton()] if embed.internal else [],
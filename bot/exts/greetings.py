@@ -2,9 +2,11 @@ from logging import Logger
 
 from disnake import AppCmdInter, ButtonStyle, Guild, Member, MessageInteraction, Role
 from disnake.ext.commands import Cog, CommandError, NoPrivateMessage, bot_has_permissions, guild_only, slash_command
-from disnake.ui import Button, View, button
+from disnake.ui import Button, button
 
 from bot.bot import Bot
+from bot.cache import require_guild
+from bot.exts.error_handler import ErrorHandlingView
 from bot.repositories.tags import TagRepository
 
 GREETER_ROLE_NAME = "Greeter"
@@ -22,7 +24,7 @@ async def get_greeter_role(guild: Guild) -> Role:
     raise CommandError
 
 
-class GreetingRoleView(View):
+class GreetingRoleView(ErrorHandlingView):
     def __init__(self, tag_repository: TagRepository, logger: Logger) -> None:
         super().__init__()
 
@@ -31,12 +33,7 @@ class GreetingRoleView(View):
 
     @button(label="Be a greeter", style=ButtonStyle.green)
     async def add_or_remove_role(self, button: Button[None], inter: MessageInteraction) -> None:
-        guild = inter.guild
-        if guild is None:
-            # The command requires the Manage Guild and Manage Roles permissions,
-            # so this should never happen
-            return
-
+        guild = require_guild(inter)
         member = inter.author
         if not isinstance(member, Member):
             # The author is a member since the command is guild-only, so this
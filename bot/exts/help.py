@@ -1,8 +1,14 @@
-import ollama
+from typing import TYPE_CHECKING
+
 from disnake import AppCmdInter, Guild, TextChannel, VoiceChannel
-from disnake.ext.commands import Cog, NoPrivateMessage, guild_only, slash_command
+from disnake.ext.commands import Cog, guild_only, slash_command
 
 from bot.bot import Bot
+from bot.cache import require_guild
+
+if TYPE_CHECKING:
+    # ollama pulls in a whole HTTP stack, so it's only imported on the first /help
+    import ollama
 
 SYSTEM_PROMPT_TEMPLATE = """
 You are a helpful AI assistant guiding new Discord server members. Here is the
@@ -23,27 +29,32 @@ class Help(Cog):
 
     def __init__(self, bot: Bot) -> None:
         self.bot = bot
+        self._client: ollama.AsyncClient | None = None
+
+    def get_client(self) -> "ollama.AsyncClient":
+        if self._client is None:
+            import ollama
+
+            self._client = ollama.AsyncClient(self.bot.settings.ollama_host)
+        return self._client
 
     @guild_only()
     @slash_command()
     async def help(self, question: str, inter: AppCmdInter) -> None:
         """Get general AI help."""
 
-        if inter.guild is None:
-            raise NoPrivateMessage
-
-        host = self.bot.settings.ollama_host
+        guild = require_guild(inter)
         model = self.bot.settings.ollama_model
 
         await inter.response.defer()
 
         messages: list[ollama.Message] = [
-            {"role": "system", "content": build_system_prompt(inter.guild)},
+            {"role": "system", "content": build_system_prompt(guild)},
             {"role": "user", "content": question},
         ]
 
-        client = ollama.AsyncClient(host)
-        response = await client.chat(model, messages)
+        # Fails fast while Ollama is down, instead of every /help waiting for it
+        response = await self.bot.ollama_breaker.call(lambda: self.get_client().chat(model, messages))
         response_text: str = response["message"]["content"]
 
         await inter.send(response_text)
@@ -0,0 +1,80 @@
+import asyncio
+import time
+from importlib.util import find_spec
+
+from disnake.ext import tasks
+from disnake.ext.commands import Cog
+
+from bot.bot import Bot
+from bot.outbound import background
+from bot.repositories.tags import TagRepository
+
+
+class Matching(Cog):
+    """Cog that periodically pairs every newcomer with greeters.
+
+    See `bot.matching` for how the pairs are chosen.
+    """
+
+    def __init__(self, bot: Bot) -> None:
+        self.bot = bot
+
+        self.match_guilds.change_interval(hours=bot.settings.matching_interval_hours)
+        self.match_guilds.start()
+
+    def cog_unload(self) -> None:
+        self.match_guilds.cancel()
+
+    @tasks.loop(hours=24)
+    async def match_guilds(self) -> None:
+        tag_repo = self.bot.tag_repository
+        if tag_repo is None:
+            return
+
+        # Anything the job asks Discord for can wait for interactions
+        with background():
+            for guild in self.bot.guilds:
+                try:
+                    await self.match_guild(tag_repo, guild.id)
+                except Exception:
+                    # A failing guild (or the database being down) mustn't stop the others, or the next runs
+                    self.bot.logger.exception("Failed to match the members of guild %d", guild.id)
+
+    async def match_guild(self, tag_repo: TagRepository, guild_id: int) -> None:
+        # NumPy is only needed (and imported) once the job runs
+        from bot.matching import load_tag_matrix, match_newcomers
+
+        start = time.perf_counter()
+
+        matrix = await load_tag_matrix(tag_repo, guild_id)
+        # Scoring is CPU-bound, so keep it off the event loop
+        assignments = await asyncio.to_thread(
+            match_newcomers,
+            matrix,
+            self.bot.settings.matching_greeters_per_newcomer,
+            self.bot.settings.matching_greeter_capacity,
+        )
+        await tag_repo.save_assignments(guild_id, assignments)
+
+        self.bot.logger.info(
+            "Matched %d members of guild %d into %d assignments in %.2fs",
+            len(matrix.user_ids),
+            guild_id,
+            len(assignments),
+            time.perf_counter() - start,
+        )
+
+    @match_guilds.before_loop
+    async def before_match_guilds(self) -> None:
+        await self.bot.wait_until_ready()
+        # Right after startup, guilds are still being chunked
+        await asyncio.sleep(self.bot.settings.matching_start_delay)
+
+
+def setup(bot: Bot) -> None:
+    """Load the Matching cog."""
+    if find_spec("numpy") is None:
+        bot.logger.warning("NumPy isn't installed, so greeter matching is disabled")
+        return
+
+    bot.add_cog(Matching(bot))
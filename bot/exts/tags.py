@@ -1,26 +1,168 @@
-from typing import cast, get_args, override
-
-from disnake import AllowedMentions, AppCmdInter, Color, Embed, Member, MessageInteraction, SelectOption
-from disnake.ext.commands import Cog, slash_command
-from disnake.ui import StringSelect, View
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from operator import attrgetter
+from typing import override
+
+from disnake import (
+    AllowedMentions,
+    AppCmdInter,
+    ButtonStyle,
+    Color,
+    Embed,
+    Guild,
+    Member,
+    MessageInteraction,
+    NotFound,
+    Permissions,
+    SelectOption,
+)
+from disnake.ext.commands import Cog, NoPrivateMessage, Param, slash_command
+from disnake.ui import Button, StringSelect, button
 
 from bot.bot import Bot
-from bot.errors import DatabaseNotConnectedError
+from bot.cache import require_guild
+from bot.errors import (
+    DatabaseNotConnectedError,
+    DuplicateTagError,
+    InvalidTagNameError,
+    TooManyTagsError,
+    UnknownTagError,
+)
+from bot.exts.error_handler import ErrorHandlingView
 from bot.exts.greetings import GREETER_ROLE_NAME, get_greeter_role
-from bot.repositories.tags import TagType
+from bot.repositories.tags import (
+    DEFAULT_TAXONOMY,
+    MAX_GUILD_TAGS,
+    MAX_TAG_NAME_LENGTH,
+    FriendRanking,
+    Taxonomy,
+    is_valid_tag_name,
+)
+
+# Discord shows up to 25 options per select menu, so a guild's tags (at most
+# `MAX_GUILD_TAGS`) are split across up to 5 select menus
+OPTIONS_PER_MENU = 25
+# Discord shows up to 25 autocomplete choices
+MAX_CHOICES = 25
+
+# The longest description a select option can have
+MAX_TAG_DESCRIPTION_LENGTH = 100
+
+
+@dataclass
+class CachedRanking:
+    ranking: FriendRanking
+    expires_at: float
+
+
+class SuggestionCache:
+    """Keeps friend suggestion rankings for a short while.
+
+    Paging through suggestions, or asking for them again soon after, reuses
+    the ranking instead of querying the database again.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        # Every entry lives for the same time, so insertion order is expiry order
+        self._entries: OrderedDict[tuple[int, int], CachedRanking] = OrderedDict()
+
+    def get(self, guild_id: int, user_id: int) -> FriendRanking | None:
+        self._evict_expired()
+        entry = self._entries.get((guild_id, user_id))
+        return entry.ranking if entry is not None else None
+
+    def put(self, guild_id: int, user_id: int, ranking: FriendRanking) -> None:
+        self._evict_expired()
+        self._entries[(guild_id, user_id)] = CachedRanking(ranking, time.monotonic() + self.ttl)
+        self._entries.move_to_end((guild_id, user_id))
+
+    def invalidate(self, guild_id: int, user_id: int) -> None:
+        """Forget a user's ranking, e.g. because their tags changed."""
+        self._entries.pop((guild_id, user_id), None)
+
+    def invalidate_guild(self, guild_id: int) -> None:
+        """Forget the rankings of a guild, e.g. because its tags were renamed."""
+        for key in [key for key in self._entries if key[0] == guild_id]:
+            del self._entries[key]
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                return
+            del self._entries[key]
+
+
+class TagMenus:
+    """The select menu options of a taxonomy, built once for every `/tag add`.
+
+    Options are ordered by name, and split into pages of up to 25 options, one
+    per select menu. Their values are tag IDs, so menus sent before a tag was
+    renamed still add the right tag.
+
+    Attributes:
+        taxonomy: The taxonomy the options were built from.
+        pages: The options of every select menu.
+    """
+
+    def __init__(self, taxonomy: Taxonomy) -> None:
+        self.taxonomy = taxonomy
+
+        options = [
+            SelectOption(
+                label=tag.name,
+                value=str(tag.tag_id),
+                description=tag.description or f"You're interested in {tag.name}",
+            )
+            for tag in sorted(taxonomy.tags, key=attrgetter("name"))
+        ]
+        # Commands don't add more tags than fit, but imports might
+        self.pages = [
+            options[start : start + OPTIONS_PER_MENU]
+            for start in range(0, min(len(options), MAX_GUILD_TAGS), OPTIONS_PER_MENU)
+        ]
+
+
+class TagMenuCache:
+    """Keeps the select menu options of every guild's taxonomy.
+
+    Repositories return the same taxonomy until it changes, so the options are
+    rebuilt as soon as a guild's taxonomy is edited, without a restart. Guilds
+    using the default taxonomy share its options.
+    """
+
+    def __init__(self) -> None:
+        self._default = TagMenus(DEFAULT_TAXONOMY)
+        self._menus: dict[int, TagMenus] = {}
+
+    def get(self, guild_id: int, taxonomy: Taxonomy) -> TagMenus:
+        if taxonomy is DEFAULT_TAXONOMY:
+            self._menus.pop(guild_id, None)
+            return self._default
+
+        menus = self._menus.get(guild_id)
+        if menus is None or menus.taxonomy is not taxonomy:
+            menus = self._menus[guild_id] = TagMenus(taxonomy)
+        return menus
 
 
 class TagsDropdown(StringSelect[None]):
-    def __init__(self, bot: Bot) -> None:
+    def __init__(
+        self,
+        bot: Bot,
+        suggestion_cache: SuggestionCache,
+        options: list[SelectOption],
+        placeholder: str,
+    ) -> None:
         self.bot = bot
-
-        options = [
-            SelectOption(label=tag, description=f"You're interested in {tag}")  # pyright: ignore[reportAny]
-            for tag in get_args(TagType)  # pyright: ignore[reportAny]
-        ]
+        self.suggestion_cache = suggestion_cache
 
         super().__init__(
-            placeholder="Choose your tags",
+            placeholder=placeholder,
             min_values=1,
             max_values=len(options),
             options=options,
@@ -32,33 +174,166 @@ class TagsDropdown(StringSelect[None]):
         if tag_repo is None:
             raise DatabaseNotConnectedError
 
-        guild = interaction.guild
+        guild = require_guild(interaction)
         user = interaction.author
+
+        # The guild's tags may have changed since the menu was sent
+        taxonomy = await tag_repo.get_taxonomy(guild.id)
+        tags = [taxonomy.names[tag_id] for tag_id in map(int, self.values) if tag_id in taxonomy.names]
+        if not tags:
+            message = "❌ These tags were removed from the server. Use `/tag add` again to see its tags."
+            await interaction.send(message, ephemeral=True)
+            return
+
         greeter_role = await get_greeter_role(guild)
         has_greeter_role = greeter_role in user.roles
 
         await tag_repo.add(
-            guild_id=interaction.guild.id,
+            guild_id=guild.id,
             user_id=interaction.author.id,
-            tags=cast(list[TagType], self.values),
+            tags=tags,
             greeter=has_greeter_role,
         )
+        self.suggestion_cache.invalidate(guild.id, interaction.author.id)
 
-        s = "s" if len(self.values) > 1 else ""  # Fix grammar if multiple tags are added
-        added_tags = ", ".join(f"`{tag}`" for tag in self.values)
+        s = "s" if len(tags) > 1 else ""  # Fix grammar if multiple tags are added
+        added_tags = ", ".join(f"`{tag}`" for tag in tags)
 
         await interaction.send(f"Added tag{s} {added_tags} to {interaction.user}", ephemeral=True)
 
 
-class DropdownView(View):
-    def __init__(self, bot: Bot) -> None:
+class DropdownView(ErrorHandlingView):
+    def __init__(self, bot: Bot, suggestion_cache: SuggestionCache, menus: TagMenus) -> None:
         super().__init__()
-        self.add_item(TagsDropdown(bot=bot))
+
+        for options in menus.pages:
+            placeholder = "Choose your tags"
+            if len(menus.pages) > 1:
+                placeholder += f" ({options[0].label} to {options[-1].label})"
+            self.add_item(TagsDropdown(bot, suggestion_cache, list(options), placeholder))
+
+
+class SuggestionsView(ErrorHandlingView):
+    """Pages through a friend suggestion ranking with previous/next buttons.
+
+    Suggestions are only resolved to members when they're first shown, and
+    those who aren't greeters (or left the guild) are skipped before paging,
+    so only the last page may have fewer suggestions. Rendered pages are kept
+    so that going back doesn't fetch the members again.
+
+    Newcomers also see the greeters the matching job assigned them (see
+    `bot.exts.matching`, and `assigned_ids`) on every page.
+    """
+
+    def __init__(self, guild: Guild, ranking: FriendRanking, page_size: int, timeout: float) -> None:
+        super().__init__(timeout=timeout)
+
+        self.guild = guild
+        self.ranking = ranking
+        self.page_size = page_size
+        # The greeters assigned to the user, if any
+        self.assigned_ids: list[int] = []
+
+        # The cursor is the index of the page being shown
+        self.cursor = 0
+        # How many ranked suggestions were resolved, and those that can be shown
+        self._resolved = 0
+        self._suggestions: list[tuple[Member, list[str]]] = []
+        self._embeds: dict[int, Embed] = {}
+        self._assigned: list[Member] | None = None
+
+        self._update_buttons()
+
+    @property
+    def page_count(self) -> int:
+        """How many pages of the suggestions resolved so far there are."""
+        return -(-len(self._suggestions) // self.page_size)
+
+    async def resolve_member(self, user_id: int) -> Member | None:
+        member = self.guild.get_member(user_id)
+        if member is not None:
+            return member
+
+        try:
+            return await self.guild.fetch_member(user_id)
+        except NotFound:
+            # The suggested user has left the guild
+            return None
+
+    async def resolve(self, count: int) -> None:
+        """Resolve ranked suggestions until `count` can be shown, or none are left."""
+        while len(self._suggestions) < count and self._resolved < len(self.ranking):
+            batch = self.ranking.take(self._resolved + self.page_size)[self._resolved :]
+            self._resolved += len(batch)
+
+            # The outbound scheduler paces the fetches, and merges those other users are making
+            members = await asyncio.gather(*(self.resolve_member(user_id) for user_id, _ in batch))
+            for member, (_, common_tags) in zip(members, batch, strict=True):
+                if member is not None and GREETER_ROLE_NAME in (role.name for role in member.roles):
+                    self._suggestions.append((member, common_tags))
+
+    async def resolve_assigned(self) -> list[Member]:
+        """Resolve the assigned greeters who are still in the guild."""
+        if self._assigned is None:
+            members = await asyncio.gather(*(self.resolve_member(user_id) for user_id in self.assigned_ids))
+            self._assigned = [member for member in members if member is not None]
+        return self._assigned
+
+    async def render(self) -> Embed | None:
+        """Render the page at the cursor, or return None if there's nothing to suggest."""
+        start = self.cursor * self.page_size
+        # One more than the page, to know whether there's a next one
+        await self.resolve(start + self.page_size + 1)
+        self._update_buttons()
+
+        if self.cursor in self._embeds:
+            return self._embeds[self.cursor]
+
+        page = self._suggestions[start : start + self.page_size]
+        if not page:
+            return None
+
+        # Construct the response message
+        response = "Here are some friend suggestions based on your tags:\n\n"
+        for member, common_tags in page:
+            tag_list = ", ".join(f"`{tag}`" for tag in common_tags)
+            response += f"- {member.mention}\n  Common tags: {tag_list}\n\n"
+
+        embed = Embed(title="🫂 Friend suggestions", description=response, color=Color.blue())
+        if assigned := await self.resolve_assigned():
+            embed.add_field(name="🤝 Your greeters", value=", ".join(member.mention for member in assigned))
+        # The number of pages is only known once every suggestion was resolved
+        total = f"/{self.page_count}" if self._resolved == len(self.ranking) else ""
+        embed.set_footer(text=f"Page {self.cursor + 1}{total}")
+
+        self._embeds[self.cursor] = embed
+        return embed
+
+    async def show(self, interaction: MessageInteraction, cursor: int) -> None:
+        self.cursor = cursor
+
+        # Resolving members may take longer than Discord waits for a response
+        await interaction.response.defer()
+        await interaction.edit_original_message(embed=await self.render(), view=self)
+
+    def _update_buttons(self) -> None:
+        self.previous_page.disabled = self.cursor == 0
+        self.next_page.disabled = self.cursor >= self.page_count - 1
+
+    @button(label="Previous", emoji="◀️", style=ButtonStyle.gray)
+    async def previous_page(self, _: Button[None], interaction: MessageInteraction) -> None:
+        await self.show(interaction, max(self.cursor - 1, 0))
+
+    @button(label="Next", emoji="▶️", style=ButtonStyle.gray)
+    async def next_page(self, _: Button[None], interaction: MessageInteraction) -> None:
+        await self.show(interaction, min(self.cursor + 1, self.page_count - 1))
 
 
 class Tags(Cog):
     def __init__(self, bot: Bot) -> None:
         self.bot = bot
+        self.suggestion_cache = SuggestionCache(bot.settings.suggestion_cache_ttl)
+        self.tag_menus = TagMenuCache()
 
     @slash_command()
     async def tag(self, _: AppCmdInter) -> None:
@@ -68,69 +343,93 @@ class Tags(Cog):
     async def add(self, interaction: AppCmdInter) -> None:
         """Add a user tag to yourself."""
 
-        if self.bot.tag_repository is None:
+        tag_repo = self.bot.tag_repository
+        if tag_repo is None:
             raise DatabaseNotConnectedError
 
-        view = DropdownView(self.bot)
+        guild_id = interaction.guild_id
+        if guild_id is None:
+            raise NoPrivateMessage
+
+        menus = self.tag_menus.get(guild_id, await tag_repo.get_taxonomy(guild_id))
+        if not menus.pages:
+            await interaction.response.send_message("❌ This server doesn't have any tags yet.", ephemeral=True)
+            return
+
+        view = DropdownView(self.bot, self.suggestion_cache, menus)
         await interaction.response.send_message("What are you interested in?", view=view)
 
     @tag.sub_command()
-    async def remove(self, interaction: AppCmdInter, tag: TagType) -> None:
+    async def remove(self, interaction: AppCmdInter, tag: str) -> None:
         """Remove a user tag from yourself."""
 
         tag_repo = self.bot.tag_repository
         if tag_repo is None:
             raise DatabaseNotConnectedError
 
+        # Only the guild's ID is needed, so this works even if it isn't cached
+        guild_id = interaction.guild_id
+        if guild_id is None:
+            raise NoPrivateMessage
+
         user_id = interaction.user.id
-        user_tags = await tag_repo.get(user_id)
+        user_tags = await tag_repo.get_tags(guild_id, user_id)
 
         if tag not in user_tags:
             message = f"❌ You don't currently have the `{tag}` tag."
             await interaction.response.send_message(message, ephemeral=True)
             return
 
-        await tag_repo.remove(user_id, tag)
+        await tag_repo.remove_tag(guild_id, user_id, tag)
+        self.suggestion_cache.invalidate(guild_id, user_id)
+
         message = f"✅ Removed tag `{tag}` from {interaction.user}"
         await interaction.response.send_message(message, ephemeral=True)
 
+    @remove.autocomplete("tag")
+    async def autocomplete_user_tag(self, interaction: AppCmdInter, current: str) -> list[str]:
+        tag_repo = self.bot.tag_repository
+        if tag_repo is None or interaction.guild_id is None:
+            return []
+
+        tags = await tag_repo.get_tags(interaction.guild_id, interaction.user.id)
+        return [tag for tag in tags if current.lower() in tag][:MAX_CHOICES]
+
     @tag.sub_command()
     async def suggest_friends(self, interaction: AppCmdInter) -> None:
         """Suggest friends for you based on your tags."""
 
-        await interaction.response.defer()
+        await interaction.response.defer(ephemeral=True)
 
+        guild = require_guild(interaction)
         user_id = interaction.user.id
-        guild_id = interaction.guild.id
 
         tag_repo = self.bot.tag_repository
         if not tag_repo:
             raise DatabaseNotConnectedError
 
-        suggestions = []
-        candidates = await tag_repo.get_friend_suggestions(guild_id, user_id)
-
-        for candidate_user_id, common_tags in candidates:
-            member = await self.bot.fetch_user(candidate_user_id)
-            member_roles = [role.name for role in member.roles]
-            member_mention = member.mention
-            tag_list = ", ".join(f"`{tag}`" for tag in common_tags)
-            if GREETER_ROLE_NAME in member_roles:
-                suggestions.add(tuple(member_mention, tag_list))
-
-        if suggestions == []:
+        # Reruns within the cache TTL reuse the ranking instead of querying again
+        ranking = self.suggestion_cache.get(guild.id, user_id)
+        if ranking is None:
+            ranking = await tag_repo.rank_friend_suggestions(guild.id, user_id)
+            self.suggestion_cache.put(guild.id, user_id, ranking)
+
+        assignments = await tag_repo.get_assignments(guild.id, user_id)
+        view = SuggestionsView(
+            guild,
+            ranking,
+            page_size=self.bot.settings.suggestion_page_size,
+            timeout=self.bot.settings.suggestion_cache_ttl,
+        )
+        view.assigned_ids = [assignment.greeter_id for assignment in assignments]
+        # Suggestions who aren't greeters are skipped, so there may be none left
+        embed = await view.render()
+        if embed is None:
             message = "❌ No friend suggestions found. Try adding more tags!"
             await interaction.followup.send(message, ephemeral=True)
             return
 
-        # Construct the response message
-        response = "Here are some friend suggestions based on your tags:\n\n"
-        for member_mention, tag_list in suggestions:
-            response += f"- {member_mention}\n  Common tags: {tag_list}\n\n"
-
-        embed = Embed(title="🫂 Friend suggestions", description=response, color=Color.blue())
-
-        await interaction.followup.send(embed=embed, ephemeral=True)
+        await interaction.followup.send(embed=embed, view=view, ephemeral=True)
 
     @tag.sub_command()
     async def info(self, interaction: AppCmdInter, member: Member) -> None:
@@ -140,7 +439,10 @@ class Tags(Cog):
         if not tag_repo:
             raise DatabaseNotConnectedError
 
-        tag_list = await tag_repo.get_tags(interaction.guild.id, member.id)
+        if interaction.guild_id is None:
+            raise NoPrivateMessage
+
+        tag_list = await tag_repo.get_tags(interaction.guild_id, member.id)
 
         name = member.name
         if member.nick:
@@ -169,6 +471,105 @@ class Tags(Cog):
 
         await interaction.send(embed=user_info, allowed_mentions=AllowedMentions.none())
 
+    @slash_command(
+        default_member_permissions=Permissions(manage_guild=True),
+        dm_permission=False,
+    )
+    async def taxonomy(self, _: AppCmdInter) -> None:
+        """Manage the tags members of this server can pick from."""
+
+    @taxonomy.sub_command(name="add")
+    async def add_to_taxonomy(
+        self,
+        interaction: AppCmdInter,
+        name: str = Param(max_length=MAX_TAG_NAME_LENGTH),
+        description: str | None = Param(None, max_length=MAX_TAG_DESCRIPTION_LENGTH),
+    ) -> None:
+        """Add a tag members can pick, or change the description of one."""
+
+        tag_repo = self.bot.tag_repository
+        if tag_repo is None:
+            raise DatabaseNotConnectedError
+
+        guild_id = interaction.guild_id
+        if guild_id is None:
+            raise NoPrivateMessage
+
+        if not is_valid_tag_name(name):
+            raise InvalidTagNameError(name)
+
+        taxonomy = await tag_repo.get_taxonomy(guild_id)
+        if name not in taxonomy.ids and len(taxonomy.tags) >= MAX_GUILD_TAGS:
+            raise TooManyTagsError(MAX_GUILD_TAGS)
+
+        await tag_repo.define_tag(guild_id, name, description)
+
+        message = f"✅ Updated the `{name}` tag." if name in taxonomy.ids else f"✅ Added the `{name}` tag."
+        await interaction.response.send_message(message, ephemeral=True)
+
+    @taxonomy.sub_command(name="rename")
+    async def rename_in_taxonomy(
+        self,
+        interaction: AppCmdInter,
+        name: str,
+        new_name: str = Param(max_length=MAX_TAG_NAME_LENGTH),
+    ) -> None:
+        """Rename a tag. Members with the tag keep it."""
+
+        tag_repo = self.bot.tag_repository
+        if tag_repo is None:
+            raise DatabaseNotConnectedError
+
+        guild_id = interaction.guild_id
+        if guild_id is None:
+            raise NoPrivateMessage
+
+        if not is_valid_tag_name(new_name):
+            raise InvalidTagNameError(new_name)
+
+        if not await tag_repo.rename_tag(guild_id, name, new_name):
+            taxonomy = await tag_repo.get_taxonomy(guild_id)
+            raise UnknownTagError(name) if name not in taxonomy.ids else DuplicateTagError(new_name)
+        # Rankings show the names of common tags
+        self.suggestion_cache.invalidate_guild(guild_id)
+
+        message = f"✅ Renamed the `{name}` tag to `{new_name}`."
+        await interaction.response.send_message(message, ephemeral=True)
+
+    @taxonomy.sub_command(name="remove")
+    async def remove_from_taxonomy(self, interaction: AppCmdInter, name: str) -> None:
+        """Remove a tag, from the server and from every member with it."""
+
+        tag_repo = self.bot.tag_repository
+        if tag_repo is None:
+            raise DatabaseNotConnectedError
+
+        guild_id = interaction.guild_id
+        if guild_id is None:
+            raise NoPrivateMessage
+
+        if name not in (await tag_repo.get_taxonomy(guild_id)).ids:
+            raise UnknownTagError(name)
+
+        # Removing a popular tag from every member may take a while
+        await interaction.response.defer(ephemeral=True)
+        removed = await tag_repo.delete_tag(guild_id, name)
+        self.suggestion_cache.invalidate_guild(guild_id)
+
+        s = "" if removed == 1 else "s"
+        message = f"✅ Removed the `{name}` tag, which {removed} member{s} had."
+        await interaction.followup.send(message, ephemeral=True)
+
+    @rename_in_taxonomy.autocomplete("name")
+    @remove_from_taxonomy.autocomplete("name")
+    async def autocomplete_guild_tag(self, interaction: AppCmdInter, current: str) -> list[str]:
+        tag_repo = self.bot.tag_repository
+        if tag_repo is None or interaction.guild_id is None:
+            return []
+
+        taxonomy = await tag_repo.get_taxonomy(interaction.guild_id)
+        return sorted(name for name in taxonomy.ids if current.lower() in name)[:MAX_CHOICES]
+
 
 def setup(bot: Bot) -> None:
     bot.add_cog(Tags(bot))
@@ -0,0 +1,320 @@
+"""Background maintenance of the database.
+
+Without maintenance the database only grows: members leave guilds, the bot is
+removed from guilds, and their tags stay behind, while SQLite's statistics
+get stale and deleted pages are never given back.
+
+The scheduler, owned by `bot.bot.Bot`, handles both:
+
+- Members and guilds that go away are queued when their events arrive and
+  deleted in batches. A periodic sweep catches whatever was missed while the
+  bot was offline (member events need the members intent, see
+  `bot.settings.Settings.members_intent`).
+- Once in a while, when nobody has used the bot for a bit, the database is
+  analyzed, free pages are vacuumed and the WAL is checkpointed.
+- Snapshots of the database are taken regularly, see `bot.backup`.
+"""
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from contextlib import suppress
+from dataclasses import asdict, dataclass
+from typing import TYPE_CHECKING, Any
+
+import aiosqlite
+import disnake
+
+from bot.backup import BackupReport, create_backup, rotate_backups
+from bot.outbound import background
+
+if TYPE_CHECKING:
+    from bot.bot import Bot
+    from bot.repositories.tags import TagRepository
+
+logger = logging.getLogger("zz.maintenance")
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+
+@dataclass
+class MaintenanceReport:
+    """What a database maintenance run did.
+
+    Attributes:
+        duration: How long the run took, in seconds.
+        converted: Whether the database was converted to incremental vacuum,
+                   which rewrites the whole file.
+        pages: The number of pages in the database after the run.
+        freed_pages: How many free pages were given back to the OS.
+        checkpointed_frames: How many WAL frames were written to the database.
+    """
+
+    duration: float
+    converted: bool
+    pages: int
+    freed_pages: int
+    checkpointed_frames: int
+
+
+async def pragma(connection: aiosqlite.Connection, statement: str) -> int:
+    async with connection.execute(f"PRAGMA {statement}") as cursor:
+        row = await cursor.fetchone()
+    return 0 if row is None else row[0]
+
+
+async def run_database_maintenance(connection: aiosqlite.Connection) -> MaintenanceReport:
+    """Analyze the database, give free pages back and checkpoint the WAL.
+
+    Databases created before incremental vacuum was enabled are converted
+    first, with a full `VACUUM`.
+    """
+    start = time.perf_counter()
+    # VACUUM and checkpoints can't run inside a transaction
+    await connection.commit()
+
+    converted = False
+    if await pragma(connection, "auto_vacuum") != AUTO_VACUUM_INCREMENTAL:
+        await connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        await connection.execute("VACUUM")
+        converted = True
+
+    await connection.execute("ANALYZE")
+    await connection.commit()
+
+    free_pages = await pragma(connection, "freelist_count")
+    # incremental_vacuum frees a page each time the statement is stepped, which
+    # only executescript does until it's done
+    await connection.executescript("PRAGMA incremental_vacuum")
+    freed_pages = free_pages - await pragma(connection, "freelist_count")
+
+    async with connection.execute("PRAGMA wal_checkpoint(TRUNCATE)") as cursor:
+        row = await cursor.fetchone()
+    # The row is (busy, WAL frames, checkpointed frames), or -1s outside of WAL mode
+    checkpointed_frames = max(row[2], 0) if row is not None else 0
+
+    return MaintenanceReport(
+        duration=time.perf_counter() - start,
+        converted=converted,
+        pages=await pragma(connection, "page_count"),
+        freed_pages=freed_pages,
+        checkpointed_frames=checkpointed_frames,
+    )
+
+
+def shard_of(guild_id: int, shard_count: int) -> int:
+    """Get the shard a guild belongs to (see Discord's sharding docs)."""
+    return (guild_id >> 22) % shard_count
+
+
+class MaintenanceScheduler:
+    """Prunes departed members and guilds, and maintains the database.
+
+    Every `Settings.prune_interval` seconds, the scheduler deletes the members
+    and guilds queued by events, runs the sweep if it's due, and runs the
+    database maintenance if it's due and the bot has been quiet. Backups don't
+    wait for the bot to be quiet, since they don't get in its way.
+
+    When running as a cluster, each process only sweeps the guilds of its own
+    shards, and only the process running shard 0 maintains and backs up the
+    database.
+    """
+
+    def __init__(self, bot: "Bot") -> None:
+        self.bot = bot
+
+        self.departed_members: defaultdict[int, set[int]] = defaultdict(set)
+        self.departed_guilds: set[int] = set()
+
+        now = time.monotonic()
+        self.last_activity = now
+        self.next_sweep = now + bot.settings.prune_sweep_interval_hours * 3600
+        self.next_maintenance = now + bot.settings.maintenance_interval_hours * 3600
+        self.last_report: MaintenanceReport | None = None
+        self.next_backup = now + (bot.settings.backup_interval_hours or 0.0) * 3600
+        self.last_backup: BackupReport | None = None
+
+        self._task: asyncio.Task[None] | None = None
+
+        bot.add_listener(self.on_raw_member_remove)
+        bot.add_listener(self.on_member_join)
+        bot.add_listener(self.on_guild_remove)
+        bot.add_listener(self.on_interaction)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop the scheduler, deleting whatever is still queued."""
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+        if self.bot.tag_repository is not None:
+            await self.prune_departed(self.bot.tag_repository)
+
+    async def on_raw_member_remove(self, payload: disnake.RawGuildMemberRemoveEvent) -> None:
+        self.departed_members[payload.guild_id].add(payload.user.id)
+
+    async def on_member_join(self, member: disnake.Member) -> None:
+        # Members who come back before their tags were deleted keep them
+        if (user_ids := self.departed_members.get(member.guild.id)) is not None:
+            user_ids.discard(member.id)
+
+    async def on_guild_remove(self, guild: disnake.Guild) -> None:
+        self.departed_guilds.add(guild.id)
+        self.departed_members.pop(guild.id, None)
+
+    async def on_interaction(self, _: disnake.Interaction) -> None:
+        self.last_activity = time.monotonic()
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.bot.settings.prune_interval)
+            try:
+                with background():
+                    await self.tick()
+            except Exception:
+                logger.exception("Maintenance failed")
+
+    async def tick(self) -> None:
+        repository = self.bot.tag_repository
+        if repository is None:
+            return
+
+        await self.prune_departed(repository)
+
+        now = time.monotonic()
+        if self.bot.is_ready() and now >= self.next_sweep:
+            self.next_sweep = now + self.bot.settings.prune_sweep_interval_hours * 3600
+            await self.sweep(repository)
+
+        quiet = now - self.last_activity >= self.bot.settings.maintenance_quiet_period
+        if quiet and now >= self.next_maintenance and self.owns_database():
+            self.next_maintenance = now + self.bot.settings.maintenance_interval_hours * 3600
+            await self.maintain_database(repository)
+
+        backup_interval_hours = self.bot.settings.backup_interval_hours
+        if backup_interval_hours is not None and now >= self.next_backup and self.owns_database():
+            self.next_backup = now + backup_interval_hours * 3600
+            await self.back_up_database()
+
+    def owns_database(self) -> bool:
+        # There's no database to look after when tags are only kept in memory
+        if self.bot.database_connection is None:
+            return False
+        return self.bot.shard_ids is None or 0 in self.bot.shard_ids
+
+    def owns_guild(self, guild_id: int) -> bool:
+        if self.bot.shard_ids is None or self.bot.shard_count is None:
+            return True
+        return shard_of(guild_id, self.bot.shard_count) in self.bot.shard_ids
+
+    async def prune_departed(self, repository: "TagRepository") -> None:
+        """Delete the members and guilds queued by events."""
+        if not self.departed_members and not self.departed_guilds:
+            return
+
+        start = time.perf_counter()
+        departed_members, self.departed_members = self.departed_members, defaultdict(set)
+        departed_guilds, self.departed_guilds = self.departed_guilds, set()
+
+        removed = await repository.remove_guilds(departed_guilds)
+        for guild_id, user_ids in departed_members.items():
+            removed += await repository.remove_users(guild_id, user_ids)
+
+        logger.info(
+            "Pruned %d departed members and %d departed guilds (%d tags) in %.2fs",
+            sum(map(len, departed_members.values())),
+            len(departed_guilds),
+            removed,
+            time.perf_counter() - start,
+        )
+
+    async def sweep(self, repository: "TagRepository") -> None:
+        """Delete the members and guilds that went away while the bot was offline.
+
+        Members are only swept in guilds whose member list is complete, which
+        needs the members intent.
+        """
+        start = time.perf_counter()
+
+        departed_guilds = [
+            guild_id
+            for guild_id in await repository.get_guild_ids()
+            if self.owns_guild(guild_id) and self.bot.get_guild(guild_id) is None
+        ]
+        removed = await repository.remove_guilds(departed_guilds)
+
+        departed_members = 0
+        for guild in self.bot.guilds:
+            if not guild.chunked:
+                continue
+            user_ids = [
+                user_id for user_id in await repository.get_user_ids(guild.id) if guild.get_member(user_id) is None
+            ]
+            departed_members += len(user_ids)
+            removed += await repository.remove_users(guild.id, user_ids)
+
+        logger.info(
+            "Swept %d departed members and %d departed guilds (%d tags) in %.2fs",
+            departed_members,
+            len(departed_guilds),
+            removed,
+            time.perf_counter() - start,
+        )
+
+    async def maintain_database(self, repository: "TagRepository") -> None:
+        report = await repository.maintain()
+        if report is None:
+            return
+
+        self.last_report = report
+        logger.info(
+            "Maintained the database in %.2fs: %sanalyzed, freed %d of %d pages, checkpointed %d WAL frames",
+            report.duration,
+            "converted to incremental vacuum, " if report.converted else "",
+            report.freed_pages,
+            report.pages + report.freed_pages,
+            report.checkpointed_frames,
+        )
+
+    async def back_up_database(self) -> None:
+        settings = self.bot.settings
+        # Backups use their own connection, in a thread, so the bot's connection stays free
+        report = await asyncio.to_thread(
+            create_backup,
+            settings.database_path,
+            settings.backup_directory,
+            settings.backup_pages_per_step,
+            settings.backup_step_delay,
+            busy_timeout=settings.database_busy_timeout,
+        )
+        self.last_backup = report
+        expired = await asyncio.to_thread(
+            rotate_backups,
+            settings.database_path,
+            settings.backup_directory,
+            settings.backup_retention,
+        )
+        logger.info(
+            "Backed up %d pages to %s in %.2fs (%d steps, %d restarts, longest step %.1fms), deleted %d old backups",
+            report.pages,
+            report.path,
+            report.duration,
+            report.steps,
+            report.restarts,
+            report.longest_step * 1000,
+            len(expired),
+        )
+
+    def collect_metrics(self) -> dict[str, Any]:
+        return {
+            "pending_members": sum(map(len, self.departed_members.values())),
+            "pending_guilds": len(self.departed_guilds),
+            "last_run": None if self.last_report is None else asdict(self.last_report),
+            "last_backup": None if self.last_backup is None else asdict(self.last_backup),
+        }
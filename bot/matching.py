@@ -0,0 +1,194 @@
+"""Guild-wide matching of newcomers with greeters.
+
+Rather than every newcomer asking for friend suggestions one by one, the
+matching job loads a guild's tags once and scores every newcomer against
+every greeter with NumPy. Newcomers are members with tags that aren't
+greeters.
+
+Each member's tags are packed into a bit matrix (one bit per tag), which keeps
+even a 100k member guild in a few hundred kilobytes. Blocks of newcomers are
+unpacked and multiplied with the greeters' matrix to count shared tags, which
+gives the Jaccard similarity of all pairs at once. The best candidates of each
+newcomer are then assigned greedily, best score first, while capping how many
+newcomers each greeter gets.
+
+NumPy is an optional dependency (the `matching` extra), so this module is only
+imported when the job runs.
+"""
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+import numpy.typing as npt
+
+from bot.repositories.tags import GreeterAssignment, TagRepository
+
+# Each newcomer keeps this many candidates per greeter it needs, so that
+# there are alternatives when its favorite greeters are full
+CANDIDATE_FACTOR = 4
+# Roughly how much memory a block of pair scores may use
+BLOCK_MEMORY = 64 * 1024 * 1024
+
+
+@dataclass
+class TagMatrix:
+    """The tags of every member of a guild, packed into bits.
+
+    Attributes:
+        tags: The tag of each bit column.
+        user_ids: The user ID of each row.
+        bits: The packed bits of each row, as produced by `numpy.packbits`.
+        greeters: Whether each row is a greeter.
+    """
+
+    tags: list[str]
+    user_ids: npt.NDArray[np.int64]
+    bits: npt.NDArray[np.uint8]
+    greeters: npt.NDArray[np.bool_]
+
+    def unpack(self, rows: slice | npt.NDArray[np.intp]) -> npt.NDArray[np.float32]:
+        """Unpack rows into a matrix of 0s and 1s."""
+        return np.unpackbits(self.bits[rows], axis=1, count=len(self.tags)).astype(np.float32)
+
+
+async def load_tag_matrix(repository: TagRepository, guild_id: int) -> TagMatrix:
+    """Load a guild's tags from a repository into a packed bit matrix."""
+    tag_indices: dict[str, int] = {}
+    rows_by_user: dict[int, list[int]] = {}
+    greeters: dict[int, bool] = {}
+
+    async for row in repository.export_rows(guild_id):
+        index = tag_indices.setdefault(row.tag, len(tag_indices))
+        rows_by_user.setdefault(row.user_id, []).append(index)
+        greeters[row.user_id] = greeters.get(row.user_id, False) or row.greeter
+
+    user_ids = np.fromiter(rows_by_user, dtype=np.int64, count=len(rows_by_user))
+    unpacked = np.zeros((len(user_ids), len(tag_indices)), dtype=np.uint8)
+    for row_index, indices in enumerate(rows_by_user.values()):
+        unpacked[row_index, indices] = 1
+
+    return TagMatrix(
+        tags=list(tag_indices),
+        user_ids=user_ids,
+        bits=np.packbits(unpacked, axis=1),
+        greeters=np.fromiter(greeters.values(), dtype=np.bool_, count=len(greeters)),
+    )
+
+
+def find_candidates(
+    matrix: TagMatrix,
+    newcomers: npt.NDArray[np.intp],
+    greeters: npt.NDArray[np.intp],
+    count: int,
+    block_memory: int = BLOCK_MEMORY,
+) -> tuple[npt.NDArray[np.intp], npt.NDArray[np.intp], npt.NDArray[np.float32]]:
+    """Find the best scoring greeters of every newcomer.
+
+    Ties at the cut-off are broken arbitrarily.
+
+    Args:
+        matrix: The guild's tag matrix.
+        newcomers: The rows of the newcomers.
+        greeters: The rows of the greeters.
+        count: How many candidates to keep per newcomer.
+        block_memory: Roughly how many bytes a block of scores may use.
+
+    Returns:
+        The newcomer rows, greeter rows and Jaccard scores of the candidate
+        pairs. Pairs without any tags in common are left out.
+    """
+    count = min(count, len(greeters))
+    if count == 0 or len(newcomers) == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty, np.empty(0, dtype=np.float32)
+
+    greeter_tags = matrix.unpack(greeters)
+    greeter_sizes = greeter_tags.sum(axis=1)
+
+    # Per pair, a block holds the float32 scores and union, and argpartition's int64 indices
+    block_size = max(1, block_memory // (16 * len(greeters)))
+
+    newcomer_rows, greeter_rows, scores = [], [], []
+    for start in range(0, len(newcomers), block_size):
+        block = newcomers[start : start + block_size]
+        block_tags = matrix.unpack(block)
+
+        # Computed in place to keep the number of (block, greeters) matrices down
+        intersection = block_tags @ greeter_tags.T
+        union = block_tags.sum(axis=1)[:, None] + greeter_sizes[None, :]
+        union -= intersection
+        np.maximum(union, 1, out=union)
+        block_scores = np.divide(intersection, union, out=intersection)
+
+        best = np.argpartition(np.negative(block_scores, out=union), count - 1, axis=1)[:, :count]
+        best_scores = np.take_along_axis(block_scores, best, axis=1)
+        shared = best_scores > 0
+
+        newcomer_rows.append(np.broadcast_to(block[:, None], best.shape)[shared])
+        greeter_rows.append(greeters[best[shared]])
+        scores.append(best_scores[shared])
+
+    return np.concatenate(newcomer_rows), np.concatenate(greeter_rows), np.concatenate(scores)
+
+
+def match_newcomers(
+    matrix: TagMatrix,
+    greeters_per_newcomer: int,
+    greeter_capacity: int | None = None,
+    block_memory: int = BLOCK_MEMORY,
+) -> list[GreeterAssignment]:
+    """Assign greeters to every newcomer of a guild.
+
+    Pairs are assigned best score first, ties going to the greeter with the
+    highest user ID (like friend suggestions). A pair is skipped if the
+    newcomer already has enough greeters or the greeter is full.
+
+    Args:
+        matrix: The guild's tag matrix.
+        greeters_per_newcomer: How many greeters each newcomer gets at most.
+        greeter_capacity: How many newcomers each greeter gets at most. By
+                          default, the load is spread evenly.
+        block_memory: Roughly how many bytes a block of scores may use.
+
+    Returns:
+        The assignments, in the order they were made.
+    """
+    newcomers = np.flatnonzero(~matrix.greeters)
+    greeters = np.flatnonzero(matrix.greeters)
+    if len(newcomers) == 0 or len(greeters) == 0:
+        return []
+
+    if greeter_capacity is None:
+        greeter_capacity = math.ceil(len(newcomers) * greeters_per_newcomer / len(greeters))
+
+    newcomer_rows, greeter_rows, scores = find_candidates(
+        matrix,
+        newcomers,
+        greeters,
+        greeters_per_newcomer * CANDIDATE_FACTOR,
+        block_memory,
+    )
+
+    # lexsort sorts by the last key first
+    order = np.lexsort((matrix.user_ids[newcomer_rows], -matrix.user_ids[greeter_rows], -scores))
+
+    user_ids = matrix.user_ids.tolist()
+    newcomer_load = [0] * len(user_ids)
+    greeter_load = [0] * len(user_ids)
+    assignments: list[GreeterAssignment] = []
+
+    for newcomer, greeter, score in zip(
+        newcomer_rows[order].tolist(),
+        greeter_rows[order].tolist(),
+        scores[order].tolist(),
+        strict=True,
+    ):
+        if newcomer_load[newcomer] >= greeters_per_newcomer or greeter_load[greeter] >= greeter_capacity:
+            continue
+
+        newcomer_load[newcomer] += 1
+        greeter_load[greeter] += 1
+        assignments.append(GreeterAssignment(user_ids[newcomer], user_ids[greeter], score))
+
+    return assignments
@@ -0,0 +1,371 @@
+"""Scheduling of the bot's requests to Discord's REST API.
+
+Every request disnake sends goes through `disnake.http.HTTPClient.request`,
+which `OutboundScheduler.install` wraps. Requests then wait in one queue:
+
+- Discord groups routes into rate limit buckets, which it names in the
+  `X-RateLimit-Bucket` header of its responses, along with how many requests
+  the bucket has left. Up to that many requests to a bucket are sent at once,
+  and none while it's exhausted (or the bot is globally rate limited). Until a
+  route's bucket is known, its requests are sent one at a time.
+- Interactive requests go before background ones, which are only ever given
+  half of `Settings.outbound_max_in_flight`. Requests are interactive unless
+  they're made in a `background()` block, like maintenance and matching jobs.
+- Identical GET requests made while one is already waiting or being sent get
+  its response instead of being sent again.
+
+How long requests waited, per route, is reported with the bot's metrics.
+"""
+
+import asyncio
+import itertools
+import logging
+import statistics
+from collections import defaultdict, deque
+from collections.abc import Awaitable, Callable, Hashable, Iterator, Mapping
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from functools import partial
+from typing import Any, TypeVar, override
+
+import aiohttp
+from disnake.http import HTTPClient, Route
+
+logger = logging.getLogger("zz.outbound")
+
+TOO_MANY_REQUESTS = 429
+
+T = TypeVar("T")
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+_priority: ContextVar[Priority] = ContextVar("outbound_priority", default=Priority.INTERACTIVE)
+# The route and bucket of the request being sent, for `OutboundScheduler.observe`
+_sending: ContextVar[tuple[str, str] | None] = ContextVar("outbound_sending", default=None)
+
+
+@contextmanager
+def background() -> Iterator[None]:
+    """Make the requests sent in the block give way to interactive ones."""
+    token = _priority.set(Priority.BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@dataclass
+class Bucket:
+    """What's known about a rate limit bucket.
+
+    Attributes:
+        limit: How many requests Discord allows between resets, or None if it
+               hasn't said yet.
+        remaining: How many more requests Discord allows before the bucket
+                   resets, or None if it hasn't said yet.
+        reset_at: When the bucket resets, in event loop time.
+        in_flight: How many requests to the bucket are being sent.
+    """
+
+    limit: int | None = None
+    remaining: int | None = None
+    reset_at: float = 0.0
+    in_flight: int = 0
+
+    def available(self, now: float) -> int:
+        """Get how many more requests to the bucket can be sent right now."""
+        reset = now >= self.reset_at
+        if self.remaining is None or (reset and self.limit is None):
+            # Requests are sent one at a time until Discord says how many it allows
+            return 1 - self.in_flight
+        remaining = self.limit if reset and self.limit is not None else self.remaining
+        return remaining - self.in_flight
+
+
+class UnlockedRoute(Route):
+    """A route disnake doesn't send one request to at a time.
+
+    disnake locks each route while a request to it is being sent, which the
+    scheduler does instead, knowing how many requests Discord allows at once.
+    """
+
+    _lock_keys = itertools.count()
+
+    def __init__(self, route: Route) -> None:
+        # The route's URL is already formatted, so only its attributes are copied
+        vars(self).update(vars(route))
+        self._lock_key = f"{route.bucket}:{next(self._lock_keys)}"
+
+    @property
+    @override
+    def bucket(self) -> str:
+        # disnake locks routes by bucket, so every request gets a lock of its own
+        return self._lock_key
+
+
+@dataclass
+class Waiter:
+    priority: Priority
+    sequence: int
+    route: str
+    major: str
+    ready: asyncio.Future[Bucket]
+
+
+@dataclass
+class RouteMetrics:
+    """How requests to a route fared.
+
+    Attributes:
+        requests: How many requests were sent.
+        merged: How many requests got the response of an identical one instead.
+        rate_limited: How many responses were 429s.
+        delays: How long, in seconds, the latest requests waited to be sent.
+    """
+
+    requests: int = 0
+    merged: int = 0
+    rate_limited: int = 0
+    delays: deque[float] = field(default_factory=lambda: deque(maxlen=1024))
+
+    def to_dict(self) -> dict[str, Any]:
+        delays = sorted(self.delays)
+        return {
+            "requests": self.requests,
+            "merged": self.merged,
+            "rate_limited": self.rate_limited,
+            "mean_delay": statistics.fmean(delays) if delays else 0.0,
+            "p95_delay": delays[int(len(delays) * 0.95)] if delays else 0.0,
+            "max_delay": delays[-1] if delays else 0.0,
+        }
+
+
+class OutboundScheduler:
+    """Queues the bot's requests to Discord, see the module's documentation."""
+
+    def __init__(self, max_in_flight: int) -> None:
+        self.max_in_flight = max_in_flight
+        self.max_background_in_flight = max(max_in_flight // 2, 1)
+
+        # Discord's bucket of each route, learned from the X-RateLimit-Bucket header
+        self.route_buckets: dict[str, str] = {}
+        self.buckets: defaultdict[str, Bucket] = defaultdict(Bucket)
+        self.routes: defaultdict[str, RouteMetrics] = defaultdict(RouteMetrics)
+        self.global_reset_at = 0.0
+
+        self._waiters: list[Waiter] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._background_in_flight = 0
+        self._pending: dict[Hashable, asyncio.Future[Any]] = {}
+        self._wakeup: asyncio.TimerHandle | None = None
+
+        self._trace = aiohttp.TraceConfig()
+        self._trace.on_request_end.append(self._on_request_end)
+        self._trace.freeze()
+        self._untraceable = False
+
+    def install(self, http: HTTPClient) -> None:
+        """Send every request of a disnake HTTP client through the scheduler."""
+        send = http.request
+
+        async def request(route: Route, **kwargs: Any) -> Any:  # noqa: ANN401
+            # Without the rate limit headers, disnake's lock is all that keeps requests to a route apart
+            traced = self._trace_session(http)
+            # Only plain GETs are safe to merge, anything else has side effects
+            key = (
+                (route.url, repr(kwargs.get("params")))
+                if route.method == "GET" and kwargs.keys() <= {"params"}
+                else None
+            )
+            return await self.submit(
+                f"{route.method} {route.path}",
+                f"{route.channel_id}:{route.guild_id}:{route.webhook_id}",
+                partial(send, UnlockedRoute(route) if traced else route, **kwargs),
+                key=key,
+            )
+
+        http.request = request
+
+    async def submit(
+        self,
+        route: str,
+        major: str,
+        send: Callable[[], Awaitable[T]],
+        *,
+        key: Hashable | None = None,
+    ) -> T:
+        """Send a request once its bucket and priority allow it.
+
+        Args:
+            route: The route of the request, which metrics are grouped by.
+            major: The major parameters of the request (its channel, guild and
+                   webhook), which Discord splits every bucket by.
+            send: Sends the request.
+            key: Identifies the request, so that identical ones are merged.
+                 If None, the request is never merged.
+        """
+        if key is None:
+            return await self._send(route, major, send)
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.routes[route].merged += 1
+        else:
+            pending = asyncio.ensure_future(self._send(route, major, send))
+            self._pending[key] = pending
+            pending.add_done_callback(partial(self._forget, key))
+
+        # Whoever is waiting for the response may give up without cancelling it for the others
+        return await asyncio.shield(pending)
+
+    def bucket(self, route: str, major: str) -> Bucket:
+        """Get the rate limit bucket of a request."""
+        # Until Discord names a route's bucket, the route is its own
+        return self.buckets[f"{self.route_buckets.get(route, route)}:{major}"]
+
+    def observe(self, route: str, major: str, status: int, headers: Mapping[str, str]) -> None:
+        """Update a request's bucket from the response to it."""
+        now = asyncio.get_running_loop().time()
+        if (bucket_name := headers.get("X-RateLimit-Bucket")) is not None:
+            self.route_buckets[route] = bucket_name
+        bucket = self.bucket(route, major)
+
+        if status == TOO_MANY_REQUESTS:
+            self.routes[route].rate_limited += 1
+            retry_after = float(headers.get("Retry-After", 1.0))
+            if headers.get("X-RateLimit-Global", "").lower() == "true":
+                logger.warning("Globally rate limited for %.2fs", retry_after)
+                self.global_reset_at = now + retry_after
+            else:
+                bucket.remaining = 0
+                bucket.reset_at = now + retry_after
+            return
+
+        if (remaining := headers.get("X-RateLimit-Remaining")) is not None:
+            bucket.remaining = int(remaining)
+            bucket.reset_at = now + float(headers.get("X-RateLimit-Reset-After", 0.0))
+        if (limit := headers.get("X-RateLimit-Limit")) is not None:
+            bucket.limit = int(limit)
+
+    def collect_metrics(self) -> dict[str, Any]:
+        return {
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+            "routes": {route: metrics.to_dict() for route, metrics in self.routes.items()},
+        }
+
+    async def _send(self, route: str, major: str, send: Callable[[], Awaitable[T]]) -> T:
+        loop = asyncio.get_running_loop()
+        queued_at = loop.time()
+        priority = _priority.get()
+        waiter = Waiter(priority, next(self._sequence), route, major, loop.create_future())
+        self._waiters.append(waiter)
+        self._pump()
+
+        try:
+            # The bucket the request was counted against, in case it's learned meanwhile
+            bucket = await waiter.ready
+        except asyncio.CancelledError:
+            if waiter.ready.done() and not waiter.ready.cancelled():
+                # Cancelled right after its turn came
+                self._release(waiter.ready.result(), priority)
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+        metrics = self.routes[route]
+        metrics.requests += 1
+        metrics.delays.append(loop.time() - queued_at)
+
+        token = _sending.set((route, major))
+        try:
+            return await send()
+        finally:
+            _sending.reset(token)
+            self._release(bucket, priority)
+
+    def _pump(self) -> None:
+        """Let the requests whose turn it is go."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        wake_at: float | None = None
+
+        for waiter in sorted(self._waiters, key=lambda waiter: (waiter.priority, waiter.sequence)):
+            if self._in_flight >= self.max_in_flight or now < self.global_reset_at:
+                wake_at = self.global_reset_at if now < self.global_reset_at else None
+                break
+            background = waiter.priority is Priority.BACKGROUND
+            if background and self._background_in_flight >= self.max_background_in_flight:
+                continue
+
+            # Cancelled waiters are removed once their task gets to run
+            if waiter.ready.done():
+                continue
+            bucket = self.bucket(waiter.route, waiter.major)
+            if bucket.available(now) <= 0:
+                if now < bucket.reset_at:
+                    wake_at = bucket.reset_at if wake_at is None else min(wake_at, bucket.reset_at)
+                continue
+
+            self._waiters.remove(waiter)
+            bucket.in_flight += 1
+            self._in_flight += 1
+            self._background_in_flight += background
+            waiter.ready.set_result(bucket)
+
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+            self._wakeup = None
+        if wake_at is not None and self._waiters:
+            self._wakeup = loop.call_at(wake_at, self._pump)
+
+    def _release(self, bucket: Bucket, priority: Priority) -> None:
+        bucket.in_flight -= 1
+        self._in_flight -= 1
+        self._background_in_flight -= priority is Priority.BACKGROUND
+        self._pump()
+
+    def _forget(self, key: Hashable, pending: asyncio.Future[Any]) -> None:
+        del self._pending[key]
+        # Nobody may be left to retrieve the error
+        if not pending.cancelled():
+            pending.exception()
+
+    def _trace_session(self, http: HTTPClient) -> bool:
+        """Trace the responses of disnake's session, returning whether it could be.
+
+        disnake creates its session when logging in, and again after
+        reconnecting, without a way to trace it, and disnake only returns the
+        response's body. So the trace is added to the private attributes of
+        both, which tests/test_outbound.py checks against a local server.
+        """
+        session = getattr(http, "_HTTPClient__session", None)
+        trace_configs = getattr(session, "_trace_configs", None)
+        if isinstance(session, aiohttp.ClientSession) and isinstance(trace_configs, list):
+            if self._trace not in trace_configs:
+                trace_configs.append(self._trace)
+            return True
+
+        # disnake sets the session to a placeholder until it logs in, otherwise either of them changed
+        if not self._untraceable and (session is None or isinstance(session, aiohttp.ClientSession)):
+            logger.warning("Can't trace disnake's session, so rate limits are left to disnake")
+            self._untraceable = True
+        return False
+
+    async def _on_request_end(
+        self,
+        _session: aiohttp.ClientSession,
+        _context: object,
+        params: aiohttp.TraceRequestEndParams,
+    ) -> None:
+        # Webhooks and interaction responses share the session, but not the scheduler
+        if (sending := _sending.get()) is not None:
+            route, major = sending
+            self.observe(route, major, params.response.status, params.response.headers)
@@ -0,0 +1,128 @@
+"""Recording of the bot's traffic, for replaying it in load tests.
+
+When `Settings.traffic_record_path` is set, every slash command, select menu
+and button interaction is appended to that file as a line of JSON. The load
+harness (`benchmarks.load`) replays these files, or generates its own in the
+same format.
+
+Recordings hold user and guild IDs, and whatever members ask `/help`, so treat
+them like the database.
+"""
+
+import json
+import time
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Literal, TextIO
+
+from disnake import ApplicationCommandInteraction, MessageInteraction
+
+if TYPE_CHECKING:
+    from disnake.interactions.application_command import ApplicationCommandInteractionData
+
+    from bot.bot import Bot
+
+EventType = Literal["command", "select", "button"]
+
+
+@dataclass
+class TrafficEvent:
+    """An interaction with the bot.
+
+    Attributes:
+        at: When it happened, in seconds since the recording started.
+        guild_id: The Discord Server ID.
+        user_id: The user's Discord ID.
+        type: Whether it's a slash command, select menu or button interaction.
+        name: The command's full name (e.g. "tag add"), the select menu's
+              placeholder or the button's label.
+        options: The command's options, or the selected values (as "values").
+                 Members, roles and channels are stored as their IDs.
+    """
+
+    at: float
+    guild_id: int
+    user_id: int
+    type: EventType
+    name: str
+    options: dict[str, Any] = field(default_factory=dict)
+
+
+def read_events(path: str | Path) -> Iterator[TrafficEvent]:
+    with Path(path).open(encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield TrafficEvent(**json.loads(line))
+
+
+def write_event(file: TextIO, event: TrafficEvent) -> None:
+    file.write(json.dumps(asdict(event)) + "\n")
+
+
+def plain(value: object) -> object:
+    """Convert an option value to something JSON can hold."""
+    if isinstance(value, str | int | float | bool) or value is None:
+        return value
+    snowflake = getattr(value, "id", None)
+    return snowflake if snowflake is not None else str(value)
+
+
+def describe_command(data: "ApplicationCommandInteractionData") -> tuple[str, dict[str, Any]]:
+    """Get the full name and the options of an invoked slash command."""
+    names = [data.name]
+    options = data.options
+    # Sub-commands and groups are options without a value
+    while options and options[0].value is None:
+        names.append(options[0].name)
+        options = options[0].options
+    return " ".join(names), {option.name: plain(option.value) for option in options}
+
+
+class TrafficRecorder:
+    """Appends every interaction with the bot to a file."""
+
+    def __init__(self, bot: "Bot", path: str) -> None:
+        self.started_at = time.monotonic()
+        # Line buffered, so a crash loses at most the line being written
+        self.file = Path(path).open("a", buffering=1, encoding="utf-8")  # noqa: SIM115
+
+        bot.add_listener(self.on_application_command)
+        bot.add_listener(self.on_dropdown)
+        bot.add_listener(self.on_button_click)
+
+    def close(self) -> None:
+        self.file.close()
+
+    def record(
+        self,
+        interaction: ApplicationCommandInteraction | MessageInteraction,
+        type: EventType,
+        name: str,
+        options: dict[str, Any],
+    ) -> None:
+        if interaction.guild_id is None:
+            return
+
+        event = TrafficEvent(
+            at=time.monotonic() - self.started_at,
+            guild_id=interaction.guild_id,
+            user_id=interaction.author.id,
+            type=type,
+            name=name,
+            options=options,
+        )
+        write_event(self.file, event)
+
+    async def on_application_command(self, interaction: ApplicationCommandInteraction) -> None:
+        name, options = describe_command(interaction.data)
+        self.record(interaction, "command", name, options)
+
+    async def on_dropdown(self, interaction: MessageInteraction) -> None:
+        name = getattr(interaction.component, "placeholder", None) or ""
+        # The options picked in the select menu
+        values = getattr(interaction, "values", None) or []
+        self.record(interaction, "select", name, {"values": values})
+
+    async def on_button_click(self, interaction: MessageInteraction) -> None:
+        self.record(interaction, "button", interaction.component.label or "", {})
@@ -0,0 +1,123 @@
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, override
+
+from bot.breaker import CircuitBreaker
+from bot.repositories.tags import (
+    FriendRanking,
+    GreeterAssignment,
+    TagCounts,
+    TagDefinition,
+    TagRepository,
+    TagRow,
+    Taxonomy,
+)
+
+if TYPE_CHECKING:
+    from bot.maintenance import MaintenanceReport
+
+
+@dataclass
+class GuardedTagRepository(TagRepository):
+    """A tag repository whose operations go through a circuit breaker.
+
+    Only the operations commands use are guarded, so that they fail fast while
+    the database is failing (see `bot.breaker`). Bulk transfers, maintenance,
+    the matching job and deleting a tag from every member may rightly take
+    longer than commands are given, so they go straight to the repository.
+
+    Attributes:
+        repository: The repository being guarded.
+        breaker: The database's circuit breaker.
+    """
+
+    repository: TagRepository
+    breaker: CircuitBreaker
+
+    @override
+    async def initialize(self) -> None:
+        await self.repository.initialize()
+
+    @override
+    async def add(self, guild_id: int, user_id: int, tags: list[str], greeter: bool) -> None:
+        await self.breaker.call(lambda: self.repository.add(guild_id, user_id, tags, greeter))
+
+    @override
+    async def get_tags(self, guild_id: int, user_id: int) -> list[str]:
+        return await self.breaker.call(lambda: self.repository.get_tags(guild_id, user_id))
+
+    @override
+    async def remove_tag(self, guild_id: int, user_id: int, tag: str) -> None:
+        await self.breaker.call(lambda: self.repository.remove_tag(guild_id, user_id, tag))
+
+    @override
+    async def update_greeter(self, guild_id: int, user_id: int, greeter: bool) -> None:
+        await self.breaker.call(lambda: self.repository.update_greeter(guild_id, user_id, greeter))
+
+    @override
+    async def get_greeter(self, guild_id: int, user_id: int) -> bool:
+        return await self.breaker.call(lambda: self.repository.get_greeter(guild_id, user_id))
+
+    @override
+    async def get_friend_suggestions(self, guild_id: int, user_id: int) -> list[tuple[int, list[str]]]:
+        return await self.breaker.call(lambda: self.repository.get_friend_suggestions(guild_id, user_id))
+
+    @override
+    async def get_tag_counts(self, guild_id: int) -> TagCounts:
+        return await self.breaker.call(lambda: self.repository.get_tag_counts(guild_id))
+
+    @override
+    async def rank_friend_suggestions(self, guild_id: int, user_id: int) -> FriendRanking:
+        return await self.breaker.call(lambda: self.repository.rank_friend_suggestions(guild_id, user_id))
+
+    @override
+    async def get_taxonomy(self, guild_id: int) -> Taxonomy:
+        return await self.breaker.call(lambda: self.repository.get_taxonomy(guild_id))
+
+    @override
+    async def define_tag(self, guild_id: int, name: str, description: str | None) -> TagDefinition:
+        return await self.breaker.call(lambda: self.repository.define_tag(guild_id, name, description))
+
+    @override
+    async def rename_tag(self, guild_id: int, name: str, new_name: str) -> bool:
+        return await self.breaker.call(lambda: self.repository.rename_tag(guild_id, name, new_name))
+
+    @override
+    async def delete_tag(self, guild_id: int, name: str) -> int:
+        return await self.repository.delete_tag(guild_id, name)
+
+    @override
+    async def get_assignments(self, guild_id: int, newcomer_id: int | None = None) -> list[GreeterAssignment]:
+        return await self.breaker.call(lambda: self.repository.get_assignments(guild_id, newcomer_id))
+
+    @override
+    def export_rows(self, guild_id: int | None = None) -> AsyncIterator[TagRow]:
+        return self.repository.export_rows(guild_id)
+
+    @override
+    async def import_rows(self, rows: AsyncIterable[TagRow]) -> int:
+        return await self.repository.import_rows(rows)
+
+    @override
+    async def save_assignments(self, guild_id: int, assignments: Iterable[GreeterAssignment]) -> None:
+        await self.repository.save_assignments(guild_id, assignments)
+
+    @override
+    async def get_guild_ids(self) -> list[int]:
+        return await self.repository.get_guild_ids()
+
+    @override
+    async def get_user_ids(self, guild_id: int) -> list[int]:
+        return await self.repository.get_user_ids(guild_id)
+
+    @override
+    async def remove_users(self, guild_id: int, user_ids: Iterable[int]) -> int:
+        return await self.repository.remove_users(guild_id, user_ids)
+
+    @override
+    async def remove_guilds(self, guild_ids: Iterable[int]) -> int:
+        return await self.repository.remove_guilds(guild_ids)
+
+    @override
+    async def maintain(self) -> "MaintenanceReport | None":
+        return await self.repository.maintain()
@@ -0,0 +1,362 @@
+from collections import Counter
+from collections.abc import AsyncIterable, AsyncIterator, Iterable
+from dataclasses import dataclass, field
+from typing import override
+
+from bot.repositories.tags import (
+    DEFAULT_TAXONOMY,
+    FriendRanking,
+    GreeterAssignment,
+    Scorer,
+    Scoring,
+    TagCounts,
+    TagDefinition,
+    TagRepository,
+    TagRow,
+    Taxonomy,
+    idf_weighted,
+    jaccard,
+)
+
+
+@dataclass
+class GuildTags:
+    """Everything stored about a guild.
+
+    Attributes:
+        taxonomy: The guild's taxonomy. Every tag's ID is its bit in bitmasks.
+        tags: The tags of every user with any, as a bitmask.
+        greeter_tags: The tags flagged as a greeter's, for every user with
+                      any. Its keys are the guild's greeters.
+        counts: The tag counts, updated along with the tags.
+        assignments: The greeter assignments, ordered like `get_assignments`.
+    """
+
+    taxonomy: Taxonomy = DEFAULT_TAXONOMY
+    tags: dict[int, int] = field(default_factory=dict)
+    greeter_tags: dict[int, int] = field(default_factory=dict)
+    counts: TagCounts = field(default_factory=TagCounts)
+    assignments: list[GreeterAssignment] = field(default_factory=list)
+
+    def __bool__(self) -> bool:
+        return bool(self.tags or self.assignments or self.taxonomy.stored)
+
+    def bit(self, tag: str) -> int:
+        """Get the bit standing for a tag in bitmasks, or 0 if the guild has no such tag."""
+        tag_id = self.taxonomy.ids.get(tag)
+        return 0 if tag_id is None else 1 << tag_id
+
+    def names(self, mask: int) -> list[str]:
+        """Get the sorted names of the tags in a bitmask."""
+        tag_names = self.taxonomy.names
+        names: list[str] = []
+        while mask:
+            bit = mask & -mask
+            names.append(tag_names[bit.bit_length() - 1])
+            mask ^= bit
+        return sorted(names)
+
+
+@dataclass
+class MemoryTagRepository(TagRepository):
+    """A tag repository that keeps everything in memory.
+
+    Each guild maps its users to bitmasks of their tags, so finding the
+    greeters who share a tag with someone is a single `&` per greeter. Nothing
+    is persisted, so this is meant for ephemeral deployments, development and
+    as a reference for testing other repositories against. Every process of a
+    cluster has its own, which still works since a guild is only handled by a
+    single process.
+
+    Attributes:
+        scoring: How friend suggestions are scored.
+    """
+
+    scoring: Scoring = "jaccard"
+    _guilds: dict[int, GuildTags] = field(default_factory=dict, init=False, repr=False)
+
+    def _drop_if_empty(self, guild_id: int) -> None:
+        guild = self._guilds.get(guild_id)
+        if guild is not None and not guild:
+            del self._guilds[guild_id]
+
+    @override
+    async def initialize(self) -> None:
+        pass
+
+    @override
+    async def add(self, guild_id: int, user_id: int, tags: list[str], greeter: bool) -> None:
+        guild = self._guilds.setdefault(guild_id, GuildTags())
+        guild.taxonomy = guild.taxonomy.with_tags(tags)
+        mask = guild.tags.get(user_id, 0)
+        greeter_mask = guild.greeter_tags.get(user_id, 0)
+        was_greeter = greeter_mask != 0
+
+        deltas: Counter[str] = Counter()
+        for tag in tags:
+            bit = guild.bit(tag)
+            # Tags the user already had keep their flag, like in SQLite
+            if mask & bit:
+                continue
+            mask |= bit
+            if greeter:
+                greeter_mask |= bit
+                deltas[tag] += 1
+
+        if mask:
+            guild.tags[user_id] = mask
+        if greeter_mask:
+            guild.greeter_tags[user_id] = greeter_mask
+        guild.counts.apply(deltas, 1 if deltas and not was_greeter else 0)
+        self._drop_if_empty(guild_id)
+
+    @override
+    async def get_tags(self, guild_id: int, user_id: int) -> list[str]:
+        guild = self._guilds.get(guild_id)
+        if guild is None:
+            return []
+        return guild.names(guild.tags.get(user_id, 0))
+
+    @override
+    async def remove_tag(self, guild_id: int, user_id: int, tag: str) -> None:
+        guild = self._guilds.get(guild_id)
+        if guild is None:
+            return
+        bit = guild.bit(tag)
+        if not guild.tags.get(user_id, 0) & bit:
+            return
+
+        guild.tags[user_id] &= ~bit
+        if not guild.tags[user_id]:
+            del guild.tags[user_id]
+
+        greeter_mask = guild.greeter_tags.get(user_id, 0)
+        if greeter_mask & bit:
+            greeter_mask &= ~bit
+            if greeter_mask:
+                guild.greeter_tags[user_id] = greeter_mask
+            else:
+                del guild.greeter_tags[user_id]
+            guild.counts.apply(Counter({tag: -1}), 0 if greeter_mask else -1)
+
+        self._drop_if_empty(guild_id)
+
+    @override
+    async def update_greeter(self, guild_id: int, user_id: int, greeter: bool) -> None:
+        guild = self._guilds.get(guild_id)
+        if guild is None or user_id not in guild.tags:
+            return
+
+        greeter_mask = guild.greeter_tags.get(user_id, 0)
+        if greeter:
+            flipped = guild.tags[user_id] & ~greeter_mask
+            guild.greeter_tags[user_id] = guild.tags[user_id]
+        else:
+            flipped = greeter_mask
+            guild.greeter_tags.pop(user_id, None)
+
+        if not flipped:
+            return
+        deltas = Counter(dict.fromkeys(guild.names(flipped), 1 if greeter else -1))
+        # When promoting, the user was already a greeter if any other tag was flagged
+        greeters_delta = -1 if not greeter else 0 if greeter_mask else 1
+        guild.counts.apply(deltas, greeters_delta)
+
+    @override
+    async def get_greeter(self, guild_id: int, user_id: int) -> bool:
+        guild = self._guilds.get(guild_id)
+        return guild is not None and user_id in guild.greeter_tags
+
+    @override
+    async def get_taxonomy(self, guild_id: int) -> Taxonomy:
+        guild = self._guilds.get(guild_id)
+        return DEFAULT_TAXONOMY if guild is None else guild.taxonomy
+
+    @override
+    async def define_tag(self, guild_id: int, name: str, description: str | None) -> TagDefinition:
+        guild = self._guilds.setdefault(guild_id, GuildTags())
+        guild.taxonomy = guild.taxonomy.with_definition(name, description)
+        self._drop_if_empty(guild_id)
+        return guild.taxonomy.definitions[name]
+
+    @override
+    async def rename_tag(self, guild_id: int, name: str, new_name: str) -> bool:
+        guild = self._guilds.setdefault(guild_id, GuildTags())
+        renamed = guild.taxonomy.renamed(name, new_name)
+        if renamed is not None:
+            guild.taxonomy = renamed
+            # The counts are kept by name
+            self._recount_tags(guild)
+        self._drop_if_empty(guild_id)
+        return renamed is not None
+
+    @override
+    async def delete_tag(self, guild_id: int, name: str) -> int:
+        guild = self._guilds.setdefault(guild_id, GuildTags())
+        bit = guild.bit(name)
+        if not bit:
+            self._drop_if_empty(guild_id)
+            return 0
+
+        removed = 0
+        for user_tags in (guild.tags, guild.greeter_tags):
+            for user_id, mask in list(user_tags.items()):
+                if not mask & bit:
+                    continue
+                if user_tags is guild.tags:
+                    removed += 1
+                if mask == bit:
+                    del user_tags[user_id]
+                else:
+                    user_tags[user_id] = mask & ~bit
+
+        guild.taxonomy = guild.taxonomy.without(name)
+        self._recount_tags(guild)
+        return removed
+
+    def _get_candidates(self, guild: GuildTags, user_id: int, mask: int) -> dict[int, set[str]]:
+        """Get every tag of the greeters sharing at least one tag with the user."""
+        return {
+            greeter_id: set(guild.names(guild.tags[greeter_id]))
+            for greeter_id, greeter_mask in guild.greeter_tags.items()
+            if greeter_mask & mask and greeter_id != user_id
+        }
+
+    def _get_scorer(self, guild: GuildTags) -> Scorer:
+        if self.scoring == "idf":
+            return idf_weighted(guild.counts)
+        return jaccard
+
+    @override
+    async def get_friend_suggestions(self, guild_id: int, user_id: int) -> list[tuple[int, list[str]]]:
+        # Limit to top 10 users with best ratio of tags in common
+        ranking = await self.rank_friend_suggestions(guild_id, user_id)
+        return ranking.take(10)
+
+    @override
+    async def rank_friend_suggestions(self, guild_id: int, user_id: int) -> FriendRanking:
+        guild = self._guilds.get(guild_id)
+        mask = 0 if guild is None else guild.tags.get(user_id, 0)
+        if guild is None or not mask:
+            return FriendRanking({}, [])
+
+        candidates = self._get_candidates(guild, user_id, mask)
+        return FriendRanking(candidates, guild.names(mask), self._get_scorer(guild))
+
+    @override
+    async def get_tag_counts(self, guild_id: int) -> TagCounts:
+        guild = self._guilds.get(guild_id)
+        return TagCounts() if guild is None else guild.counts
+
+    def _recount_tags(self, guild: GuildTags) -> None:
+        guild.counts = TagCounts(greeters=len(guild.greeter_tags))
+        for greeter_mask in guild.greeter_tags.values():
+            guild.counts.tags.update(guild.names(greeter_mask))
+
+    @override
+    async def export_rows(self, guild_id: int | None = None) -> AsyncIterator[TagRow]:
+        guild_ids = sorted(self._guilds) if guild_id is None else [guild_id]
+        for row_guild_id in guild_ids:
+            guild = self._guilds.get(row_guild_id)
+            if guild is None:
+                continue
+
+            for user_id, mask in sorted(guild.tags.items()):
+                greeter_mask = guild.greeter_tags.get(user_id, 0)
+                for tag in guild.names(mask):
+                    yield TagRow(row_guild_id, user_id, tag, bool(greeter_mask & guild.bit(tag)))
+
+    @override
+    async def import_rows(self, rows: AsyncIterable[TagRow]) -> int:
+        imported = 0
+        guild_ids: set[int] = set()
+
+        async for row in rows:
+            guild = self._guilds.setdefault(row.guild_id, GuildTags())
+            guild.taxonomy = guild.taxonomy.with_tags([row.tag])
+            bit = guild.bit(row.tag)
+            guild.tags[row.user_id] = guild.tags.get(row.user_id, 0) | bit
+
+            greeter_mask = guild.greeter_tags.get(row.user_id, 0)
+            greeter_mask = greeter_mask | bit if row.greeter else greeter_mask & ~bit
+            if greeter_mask:
+                guild.greeter_tags[row.user_id] = greeter_mask
+            else:
+                guild.greeter_tags.pop(row.user_id, None)
+
+            imported += 1
+            guild_ids.add(row.guild_id)
+
+        # Counting once at the end is much cheaper than updating the counts per row
+        for guild_id in guild_ids:
+            self._recount_tags(self._guilds[guild_id])
+        return imported
+
+    @override
+    async def save_assignments(self, guild_id: int, assignments: Iterable[GreeterAssignment]) -> None:
+        guild = self._guilds.setdefault(guild_id, GuildTags())
+        guild.assignments = sorted(
+            assignments,
+            key=lambda assignment: (assignment.newcomer_id, -assignment.score, -assignment.greeter_id),
+        )
+        self._drop_if_empty(guild_id)
+
+    @override
+    async def get_assignments(self, guild_id: int, newcomer_id: int | None = None) -> list[GreeterAssignment]:
+        guild = self._guilds.get(guild_id)
+        if guild is None:
+            return []
+        return [
+            assignment
+            for assignment in guild.assignments
+            if newcomer_id is None or assignment.newcomer_id == newcomer_id
+        ]
+
+    @override
+    async def get_guild_ids(self) -> list[int]:
+        return sorted(self._guilds)
+
+    @override
+    async def get_user_ids(self, guild_id: int) -> list[int]:
+        guild = self._guilds.get(guild_id)
+        return [] if guild is None else sorted(guild.tags)
+
+    @override
+    async def remove_users(self, guild_id: int, user_ids: Iterable[int]) -> int:
+        guild = self._guilds.get(guild_id)
+        if guild is None:
+            return 0
+
+        user_ids = set(user_ids)
+        deltas: Counter[str] = Counter()
+        removed_greeters = 0
+        removed = 0
+        for user_id in user_ids:
+            removed += guild.tags.pop(user_id, 0).bit_count()
+            greeter_mask = guild.greeter_tags.pop(user_id, 0)
+            if greeter_mask:
+                deltas.subtract(guild.names(greeter_mask))
+                removed_greeters += 1
+
+        guild.counts.apply(deltas, -removed_greeters)
+        guild.assignments = [
+            assignment
+            for assignment in guild.assignments
+            if assignment.newcomer_id not in user_ids and assignment.greeter_id not in user_ids
+        ]
+        self._drop_if_empty(guild_id)
+        return removed
+
+    @override
+    async def remove_guilds(self, guild_ids: Iterable[int]) -> int:
+        removed = 0
+        for guild_id in guild_ids:
+            guild = self._guilds.pop(guild_id, None)
+            if guild is not None:
+                removed += sum(mask.bit_count() for mask in guild.tags.values())
+        return removed
+
+    @override
+    async def maintain(self) -> None:
+        # There's no database to maintain
+        pass
@@ -1,10 +1,23 @@
+import asyncio
+import heapq
+import itertools
+import math
+import re
+import weakref
 from abc import ABC, abstractmethod
-from collections import defaultdict
-from dataclasses import dataclass
-from typing import Literal, override
+from collections import Counter, defaultdict
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+from functools import cached_property
+from operator import itemgetter
+from typing import TYPE_CHECKING, Literal, NamedTuple, override
 
 import aiosqlite
 
+if TYPE_CHECKING:
+    from bot.maintenance import MaintenanceReport
+
 
 class UnknownUserError(Exception):
     """Raised when a user id is not found in the database."""
@@ -14,7 +27,9 @@ class DatabaseIntegrityError(Exception):
     """Raised when the database returns anomalous output."""
 
 
-TagType = Literal[
+# The tags of guilds that haven't changed their taxonomy. Their members' tags
+# are stored by position in this list, so tags may only be appended to it.
+DEFAULT_TAGS: tuple[str, ...] = (
     "algos-and-data-structs",
     "async-and-concurrency",
     "c-extensions",
@@ -36,7 +51,187 @@ TagType = Literal[
     "unit-testing",
     "unix",
     "user-interfaces",
-]
+)
+
+# Tag names are lowercase words joined by hyphens, like the default tags
+TAG_NAME_PATTERN = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)*")
+MAX_TAG_NAME_LENGTH = 32
+# A guild's tags have to fit in the select menus of `/tag add`, 5 menus of 25 options
+MAX_GUILD_TAGS = 125
+
+# How friend suggestions are scored, see `jaccard` and `idf_weighted`
+Scoring = Literal["jaccard", "idf"]
+Scorer = Callable[[set[str], set[str]], float]
+
+# The row of the tag_counts table holding the number of greeters in a guild.
+# Tag IDs count from 1, so it can't clash with a tag.
+GREETERS_COUNT_TAG = 0
+
+
+def is_valid_tag_name(name: str) -> bool:
+    """Check whether a tag can be added to a guild's taxonomy with this name."""
+    return len(name) <= MAX_TAG_NAME_LENGTH and TAG_NAME_PATTERN.fullmatch(name) is not None
+
+
+# Keeps `IN (...)` lists below SQLite's limit on the number of parameters
+DELETE_CHUNK_SIZE = 500
+
+# Rows are read and written in chunks so bulk transfers run in constant memory
+EXPORT_CHUNK_SIZE = 10_000
+IMPORT_CHUNK_SIZE = 10_000
+# Committing rarely is much faster, as every commit waits for the disk
+IMPORT_TRANSACTION_SIZE = 500_000
+
+
+class TagRow(NamedTuple):
+    """A single tag of a user in a guild, as stored by a tag repository."""
+
+    guild_id: int
+    user_id: int
+    tag: str
+    greeter: bool
+
+
+class TagDefinition(NamedTuple):
+    """A tag in a guild's taxonomy.
+
+    Attributes:
+        tag_id: The tag's ID, which stands for it in storage (see `Taxonomy`).
+        name: The tag's name, as shown to members.
+        description: What the tag is about, if the guild described it.
+    """
+
+    tag_id: int
+    name: str
+    description: str | None = None
+
+
+@dataclass(frozen=True)
+class Taxonomy:
+    """The tags the members of a guild can pick from.
+
+    Every tag is interned to a small ID, counting from 1, and members' tags are
+    stored as IDs. Renaming a tag only changes its definition, and the IDs of
+    deleted tags aren't reused, so an ID always stands for the same tag.
+
+    Guilds use `DEFAULT_TAGS` until their taxonomy first changes. Taxonomies
+    aren't modified: changes make a new one, so holding onto one is safe.
+
+    Attributes:
+        tags: The definition of every tag, ordered by ID.
+        next_id: The ID the next tag added gets.
+        stored: Whether the guild has its own taxonomy, rather than the default.
+    """
+
+    tags: tuple[TagDefinition, ...]
+    next_id: int
+    stored: bool = True
+
+    @cached_property
+    def definitions(self) -> dict[str, TagDefinition]:
+        """The definition of every tag, by name."""
+        return {tag.name: tag for tag in self.tags}
+
+    @cached_property
+    def ids(self) -> dict[str, int]:
+        """The ID of every tag, by name."""
+        return {tag.name: tag.tag_id for tag in self.tags}
+
+    @cached_property
+    def names(self) -> dict[int, str]:
+        """The name of every tag, by ID."""
+        return {tag.tag_id: tag.name for tag in self.tags}
+
+    def with_tags(self, names: Iterable[str]) -> "Taxonomy":
+        """Intern tags, adding those the taxonomy doesn't have yet.
+
+        Returns:
+            The taxonomy with the tags, which is this one if it has them all.
+        """
+        tags = list(self.tags)
+        ids = dict(self.ids)
+        for name in names:
+            if name not in ids:
+                ids[name] = self.next_id + len(tags) - len(self.tags)
+                tags.append(TagDefinition(ids[name], name))
+
+        if len(tags) == len(self.tags):
+            return self
+        return Taxonomy(tuple(tags), self.next_id + len(tags) - len(self.tags))
+
+    def with_definition(self, name: str, description: str | None) -> "Taxonomy":
+        """Add a tag, or change the description of one the taxonomy has.
+
+        Returns:
+            The changed taxonomy, which is this one if nothing changed.
+        """
+        tag = self.definitions.get(name)
+        if tag is None:
+            return Taxonomy((*self.tags, TagDefinition(self.next_id, name, description)), self.next_id + 1)
+        if tag.description == description:
+            return self
+        return self._replace(tag, tag._replace(description=description))
+
+    def renamed(self, name: str, new_name: str) -> "Taxonomy | None":
+        """Rename a tag.
+
+        Returns:
+            The changed taxonomy, or None if it has no tag named `name` or
+            already has one named `new_name`.
+        """
+        tag = self.definitions.get(name)
+        if tag is None or new_name in self.definitions:
+            return None
+        return self._replace(tag, tag._replace(name=new_name))
+
+    def without(self, name: str) -> "Taxonomy":
+        """Delete a tag, if the taxonomy has it."""
+        if name not in self.definitions:
+            return self
+        return Taxonomy(tuple(tag for tag in self.tags if tag.name != name), self.next_id)
+
+    def _replace(self, tag: TagDefinition, new_tag: TagDefinition) -> "Taxonomy":
+        return Taxonomy(tuple(new_tag if other == tag else other for other in self.tags), self.next_id)
+
+
+DEFAULT_TAXONOMY = Taxonomy(
+    tuple(TagDefinition(tag_id, name) for tag_id, name in enumerate(DEFAULT_TAGS, start=1)),
+    len(DEFAULT_TAGS) + 1,
+    stored=False,
+)
+
+
+@dataclass
+class TagCounts:
+    """How many of a guild's greeters have each tag.
+
+    Attributes:
+        greeters: The number of greeters with at least one tag.
+        tags: The number of greeters with each tag.
+    """
+
+    greeters: int = 0
+    tags: Counter[str] = field(default_factory=Counter)
+
+    def idf(self, tag: str) -> float:
+        """Get the inverse document frequency of a tag among the greeters.
+
+        Rare tags weigh more than common ones. The weight is smoothed, so it's
+        always positive, even for tags that no greeter has.
+        """
+        return math.log((1 + self.greeters) / (1 + self.tags.get(tag, 0))) + 1
+
+    def apply(self, deltas: "Counter[str]", greeters_delta: int) -> None:
+        self.tags.update(deltas)
+        self.greeters += greeters_delta
+
+
+class GreeterAssignment(NamedTuple):
+    """A greeter paired with a newcomer by the matching job (see `bot.matching`)."""
+
+    newcomer_id: int
+    greeter_id: int
+    score: float
 
 
 class TagRepository(ABC):
@@ -54,13 +249,15 @@ class TagRepository(ABC):
         """
 
     @abstractmethod
-    async def add(self, user_id: int, tag: list[TagType], greeter: bool) -> None:
-        """Add a tag to a user.
+    async def add(self, guild_id: int, user_id: int, tags: list[str], greeter: bool) -> None:
+        """Add tags to a user.
+
+        Tags missing from the guild's taxonomy are added to it.
 
         Args:
             guild_id: the Discord Server ID
             user_id: The user's Discord ID.
-            tag: The tag to add.
+            tags: The tags to add.
             greeter: A flag for if the user has opted in to suggestions
         """
 
@@ -77,7 +274,7 @@ class TagRepository(ABC):
         """
 
     @abstractmethod
-    async def remove_tag(self, guild_id: int, user_id: int, tag: TagType) -> None:
+    async def remove_tag(self, guild_id: int, user_id: int, tag: str) -> None:
         """Remove a tag from a user.
 
         This does nothing if the user doesn't have the specified tag.
@@ -107,8 +304,9 @@ class TagRepository(ABC):
     async def get_greeter(self, guild_id: int, user_id: int) -> bool:
         """Check a given users status as a greeter within a guild.
 
-        Returns True if the user record has the Greeter role.
-        Else returns false.
+        Returns True if any of the user's tags were added while they had the
+        Greeter role (or since `update_greeter` made them one). Else returns
+        false.
 
         Note that the user record should be kept in sync with the Discord user.
 
@@ -118,6 +316,58 @@ class TagRepository(ABC):
             greeter: A flag for if the user opts in to suggestions
         """
 
+    @abstractmethod
+    async def get_taxonomy(self, guild_id: int) -> Taxonomy:
+        """Get the tags the members of a guild can pick from.
+
+        Args:
+            guild_id: The Discord Server ID.
+
+        Returns:
+            The guild's taxonomy, or `DEFAULT_TAXONOMY` if it never changed it.
+        """
+
+    @abstractmethod
+    async def define_tag(self, guild_id: int, name: str, description: str | None) -> TagDefinition:
+        """Add a tag to a guild's taxonomy, or change the description of one it has.
+
+        Args:
+            guild_id: The Discord Server ID.
+            name: The tag's name.
+            description: What the tag is about.
+
+        Returns:
+            The tag's definition.
+        """
+
+    @abstractmethod
+    async def rename_tag(self, guild_id: int, name: str, new_name: str) -> bool:
+        """Rename a tag of a guild's taxonomy. Members with the tag keep it.
+
+        Args:
+            guild_id: The Discord Server ID.
+            name: The tag's name.
+            new_name: The tag's new name.
+
+        Returns:
+            Whether the tag was renamed. It isn't if the guild has no tag named
+            `name`, or already has one named `new_name`.
+        """
+
+    @abstractmethod
+    async def delete_tag(self, guild_id: int, name: str) -> int:
+        """Delete a tag from a guild's taxonomy, and from every member with it.
+
+        This does nothing if the guild has no such tag.
+
+        Args:
+            guild_id: The Discord Server ID.
+            name: The tag's name.
+
+        Returns:
+            The number of members' tags removed.
+        """
+
     @abstractmethod
     async def get_friend_suggestions(self, guild_id: int, user_id: int) -> list[tuple[int, list[str]]]:
         """Suggest friends for a user based on their tags.
@@ -131,65 +381,361 @@ class TagRepository(ABC):
             the tags they have in common with the user.
         """
 
+    @abstractmethod
+    async def get_tag_counts(self, guild_id: int) -> TagCounts:
+        """Count how many greeters have each tag in a guild.
+
+        Args:
+            guild_id: The Discord Server ID.
+
+        Returns:
+            The counts, which must not be modified.
+        """
+
+    @abstractmethod
+    async def rank_friend_suggestions(self, guild_id: int, user_id: int) -> "FriendRanking":
+        """Rank every friend suggestion for a user, for paging through them.
+
+        Args:
+            user_id: The user's Discord ID.
+            guild_id: The Discord Server ID.
+
+        Returns:
+            The ranking, ordered the same way as `get_friend_suggestions`.
+        """
+
+    @abstractmethod
+    def export_rows(self, guild_id: int | None = None) -> AsyncIterator[TagRow]:
+        """Stream every stored tag, ordered by guild, user and tag.
+
+        Args:
+            guild_id: The Discord Server ID to export, or None to export every
+                      guild.
+
+        Yields:
+            The stored rows, one at a time.
+        """
+
+    @abstractmethod
+    async def import_rows(self, rows: AsyncIterable[TagRow]) -> int:
+        """Store every row from a stream of rows.
+
+        Rows that already exist have their greeter flag overwritten. Tags
+        missing from their guild's taxonomy are added to it.
+
+        Args:
+            rows: The rows to import.
+
+        Returns:
+            The number of rows imported.
+        """
+
+    @abstractmethod
+    async def save_assignments(self, guild_id: int, assignments: Iterable[GreeterAssignment]) -> None:
+        """Replace the greeter assignments of a guild.
+
+        Args:
+            guild_id: The Discord Server ID.
+            assignments: The new assignments.
+        """
+
+    @abstractmethod
+    async def get_assignments(self, guild_id: int, newcomer_id: int | None = None) -> list[GreeterAssignment]:
+        """Get the greeter assignments of a guild.
+
+        Args:
+            guild_id: The Discord Server ID.
+            newcomer_id: Only get the greeters assigned to this newcomer.
+
+        Returns:
+            The assignments, ordered by newcomer and then by descending score.
+        """
+
+    @abstractmethod
+    async def get_guild_ids(self) -> list[int]:
+        """Get the IDs of every guild with stored data."""
+
+    @abstractmethod
+    async def get_user_ids(self, guild_id: int) -> list[int]:
+        """Get the IDs of every user with tags in a guild.
+
+        Args:
+            guild_id: The Discord Server ID.
+        """
+
+    @abstractmethod
+    async def remove_users(self, guild_id: int, user_ids: Iterable[int]) -> int:
+        """Remove everything stored about some users of a guild.
+
+        This is used when members leave a guild.
+
+        Args:
+            guild_id: The Discord Server ID.
+            user_ids: The users' Discord IDs.
+
+        Returns:
+            The number of tags removed.
+        """
+
+    @abstractmethod
+    async def remove_guilds(self, guild_ids: Iterable[int]) -> int:
+        """Remove everything stored about some guilds.
+
+        This is used when the bot leaves a guild.
+
+        Args:
+            guild_ids: The Discord Server IDs.
+
+        Returns:
+            The number of tags removed.
+        """
+
+    @abstractmethod
+    async def maintain(self) -> "MaintenanceReport | None":
+        """Analyze the database, give free pages back and checkpoint the WAL.
+
+        Returns:
+            What the maintenance did, or None if there's no database to maintain.
+        """
+
 
 @dataclass
 class SqliteTagRepository(TagRepository):
-    """A tag repository that uses SQLite to store data."""
+    """A tag repository that uses SQLite to store data.
+
+    Members' tags are stored as IDs interned per guild (see `Taxonomy`), and
+    the taxonomies of guilds that changed theirs in the `taxonomies` and
+    `taxonomy_tags` tables. Taxonomies are cached in memory per guild, so
+    translating between names and IDs never queries the database.
+
+    Tag counts (see `get_tag_counts`) are kept in the `tag_counts` table and
+    updated along with the tags, so scoring never has to count rows. They're
+    also cached in memory per guild. Every guild is handled by a single shard,
+    and so a single process, so the caches stay in sync in a cluster too.
+
+    Every task shares the connection, and so its transaction: writes are made
+    one transaction at a time (see `_transaction`), and statements are read
+    to the end before anything else can run on the connection.
+
+    Attributes:
+        database: The connection to the database.
+        scoring: How friend suggestions are scored.
+    """
 
     database: aiosqlite.Connection
+    scoring: Scoring = "jaccard"
+    _tag_counts: dict[int, TagCounts] = field(default_factory=dict, init=False, repr=False)
+    _tag_count_versions: Counter[int] = field(default_factory=Counter, init=False, repr=False)
+    _taxonomies: dict[int, Taxonomy] = field(default_factory=dict, init=False, repr=False)
+    _taxonomy_versions: Counter[int] = field(default_factory=Counter, init=False, repr=False)
+    # Locks only live while they're held or waited on
+    _taxonomy_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = field(
+        default_factory=weakref.WeakValueDictionary,
+        init=False,
+        repr=False,
+    )
+    # Held from the first write of a transaction until it's committed or rolled back
+    _write_lock: asyncio.Lock = field(default_factory=asyncio.Lock, init=False, repr=False)
 
     @override
     async def initialize(self) -> None:
+        # Lets maintenance give free pages back to the OS. This only applies to
+        # new databases, `bot.maintenance` converts existing ones.
+        await self.database.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+        # Several processes may share the database when running as a cluster.
+        # WAL lets readers and a writer work concurrently, and the schema is
+        # created in a write transaction so that only one process does it.
+        await self.database.execute("PRAGMA journal_mode = WAL")
+        await self.database.execute("PRAGMA synchronous = NORMAL")
+
         async with self.database.cursor() as cursor:
+            await cursor.execute("BEGIN IMMEDIATE")
+
+            # Databases created before taxonomies stored the name of every tag
+            await cursor.execute("SELECT EXISTS (SELECT 1 FROM pragma_table_info('tags') WHERE name = 'tag')")
+            (stores_names,) = await cursor.fetchone()  # pyright: ignore[reportGeneralTypeIssues]
+            if stores_names:
+                await cursor.execute("ALTER TABLE tags RENAME TO tag_names")
+                await cursor.execute("DROP TABLE IF EXISTS tag_counts")
+
             await cursor.execute(
                 """
                CREATE TABLE IF NOT EXISTS tags (
                     guild_id INTEGER NOT NULL,
                     user_id INTEGER NOT NULL,
-                    tag TEXT NOT NULL,
+                    tag_id INTEGER NOT NULL,
                     greeter BOOLEAN,
-                    PRIMARY KEY (guild_id, user_id, tag)
+                    PRIMARY KEY (guild_id, user_id, tag_id)
                 )
                 """,
             )
+            await cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS greeter_assignments (
+                    guild_id INTEGER NOT NULL,
+                    newcomer_id INTEGER NOT NULL,
+                    greeter_id INTEGER NOT NULL,
+                    score REAL NOT NULL,
+                    PRIMARY KEY (guild_id, newcomer_id, greeter_id)
+                )
+                """,
+            )
+            # The row with tag ID 0 holds the number of greeters in the guild
+            await cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tag_counts (
+                    guild_id INTEGER NOT NULL,
+                    tag_id INTEGER NOT NULL,
+                    greeters INTEGER NOT NULL,
+                    PRIMARY KEY (guild_id, tag_id)
+                )
+                """,
+            )
+            # Guilds without a row use the default taxonomy
+            await cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS taxonomies (
+                    guild_id INTEGER PRIMARY KEY,
+                    next_tag_id INTEGER NOT NULL
+                )
+                """,
+            )
+            await cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS taxonomy_tags (
+                    guild_id INTEGER NOT NULL,
+                    tag_id INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    description TEXT,
+                    PRIMARY KEY (guild_id, tag_id),
+                    UNIQUE (guild_id, name)
+                )
+                """,
+            )
+
+            if stores_names:
+                await self._intern_tag_names()
+
+            # Databases created before tag counts existed need them counted once
+            await cursor.execute("SELECT EXISTS (SELECT 1 FROM tags) AND NOT EXISTS (SELECT 1 FROM tag_counts)")
+            (needs_counting,) = await cursor.fetchone()  # pyright: ignore[reportGeneralTypeIssues]
+            if needs_counting:
+                await self._recount_tags(None)
         await self.database.commit()
 
+    async def _intern_tag_names(self) -> None:
+        """Convert the tags of a database created before taxonomies to IDs, in the caller's transaction."""
+        async with self.database.execute(
+            "SELECT DISTINCT guild_id, tag FROM tag_names ORDER BY guild_id, tag",
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+        tag_ids: list[tuple[int, str, int]] = []
+        for guild_id, guild_rows in itertools.groupby(rows, key=itemgetter(0)):
+            names = [name for _, name in guild_rows]
+            taxonomy = DEFAULT_TAXONOMY.with_tags(names)
+            # Guilds that only have default tags keep the default taxonomy
+            if taxonomy is not DEFAULT_TAXONOMY:
+                await self._save_taxonomy(guild_id, DEFAULT_TAXONOMY, taxonomy)
+            tag_ids.extend((guild_id, name, taxonomy.ids[name]) for name in names)
+
+        await self.database.execute(
+            """
+            CREATE TEMPORARY TABLE tag_ids (
+                guild_id INTEGER,
+                name TEXT,
+                tag_id INTEGER,
+                PRIMARY KEY (guild_id, name)
+            )
+            """,
+        )
+        await self.database.executemany("INSERT INTO tag_ids VALUES (?, ?, ?)", tag_ids)
+        await self.database.execute(
+            """
+            INSERT OR IGNORE INTO tags (guild_id, user_id, tag_id, greeter)
+            SELECT t.guild_id, t.user_id, i.tag_id, t.greeter
+            FROM tag_names t
+            JOIN tag_ids i ON i.guild_id = t.guild_id AND i.name = t.tag
+            """,
+        )
+        await self.database.execute("DROP TABLE tag_ids")
+        await self.database.execute("DROP TABLE tag_names")
+
     @override
     async def add(
         self,
         guild_id: int,
         user_id: int,
-        tags: list[TagType],
+        tags: list[str],
         greeter: bool,
     ) -> None:
-        async with self.database.cursor() as cursor:
-            sql_script = "INSERT OR IGNORE INTO tags (guild_id, user_id, tag, greeter) VALUES (?, ?, ?, ?)"
-            for tag in tags:
-                await cursor.execute(
-                    sql_script,
-                    (guild_id, user_id, tag, greeter),
-                )
-            await self.database.commit()
+        # Tags deleted from the taxonomy meanwhile mustn't be added back by ID
+        async with self._taxonomy_lock(guild_id):
+            taxonomy = await self.get_taxonomy(guild_id)
+            interned = taxonomy.with_tags(tags)
+
+            deltas: Counter[str] = Counter()
+            async with self._transaction(), self.database.cursor() as cursor:
+                # Read in the transaction, so that other writers can't change it meanwhile
+                was_greeter = greeter and await self._has_greeter_tags(guild_id, user_id)
+                if interned is not taxonomy:
+                    await self._save_taxonomy(guild_id, taxonomy, interned)
+
+                sql_script = "INSERT OR IGNORE INTO tags (guild_id, user_id, tag_id, greeter) VALUES (?, ?, ?, ?)"
+                for tag in tags:
+                    await cursor.execute(
+                        sql_script,
+                        (guild_id, user_id, interned.ids[tag], greeter),
+                    )
+                    # Tags the user already had are ignored, so they aren't counted again
+                    if greeter and cursor.rowcount == 1:
+                        deltas[tag] += 1
+
+                greeters_delta = 1 if deltas and not was_greeter else 0
+                await self._update_tag_counts(guild_id, interned, deltas, greeters_delta)
+
+            if interned is not taxonomy:
+                self._apply_taxonomy(guild_id, interned)
+            self._apply_tag_counts(guild_id, deltas, greeters_delta)
 
     @override
     async def get_tags(self, guild_id: int, user_id: int) -> list[str]:
+        taxonomy = await self.get_taxonomy(guild_id)
         async with self.database.cursor() as cursor:
             await cursor.execute(
-                "SELECT tag FROM tags WHERE guild_id = ? AND user_id = ?",
+                "SELECT tag_id FROM tags WHERE guild_id = ? AND user_id = ?",
                 (guild_id, user_id),
             )
             rows = await cursor.fetchall()
-            return [row[0] for row in rows]
+            return sorted(taxonomy.names[row[0]] for row in rows)
 
     @override
-    async def remove_tag(self, guild_id: int, user_id: int, tag: TagType) -> None:
-        query = "DELETE FROM tags WHERE guild_id = ? AND user_id = ? AND tag = ?"
-        async with self.database.cursor() as cursor:
+    async def remove_tag(self, guild_id: int, user_id: int, tag: str) -> None:
+        taxonomy = await self.get_taxonomy(guild_id)
+        tag_id = taxonomy.ids.get(tag)
+        if tag_id is None:
+            return
+
+        query = "DELETE FROM tags WHERE guild_id = ? AND user_id = ? AND tag_id = ? RETURNING greeter"
+        async with self._transaction(), self.database.cursor() as cursor:
             await cursor.execute(
                 query,
-                (guild_id, user_id, tag),
+                (guild_id, user_id, tag_id),
             )
-            await self.database.commit()
+            # The delete only finishes once every returned row is read
+            removed = await cursor.fetchall()
+
+            deltas: Counter[str] = Counter()
+            greeters_delta = 0
+            if removed and removed[0][0]:
+                deltas[tag] -= 1
+                if not await self._has_greeter_tags(guild_id, user_id):
+                    greeters_delta = -1
+
+            await self._update_tag_counts(guild_id, taxonomy, deltas, greeters_delta)
+
+        self._apply_tag_counts(guild_id, deltas, greeters_delta)
 
     @override
     async def update_greeter(
@@ -198,57 +744,612 @@ class SqliteTagRepository(TagRepository):
         user_id: int,
         greeter: bool,
     ) -> None:
-        async with self.database.cursor() as cursor:
+        taxonomy = await self.get_taxonomy(guild_id)
+        async with self._transaction(), self.database.cursor() as cursor:
+            # Only the tags whose flag actually flips change the counts
             await cursor.execute(
                 """
                 UPDATE tags
                 SET greeter = ?
-                WHERE guild_id = ? AND user_id = ?""",
-                (greeter, guild_id, user_id),
+                WHERE guild_id = ? AND user_id = ? AND greeter IS NOT ?
+                RETURNING tag_id""",
+                (greeter, guild_id, user_id, greeter),
             )
-        await self.database.commit()
+            flipped = [tag_id for (tag_id,) in await cursor.fetchall()]
+
+            deltas = Counter(dict.fromkeys((taxonomy.names[tag_id] for tag_id in flipped), 1 if greeter else -1))
+            greeters_delta = 0
+            if flipped and not greeter:
+                greeters_delta = -1
+            # When promoting, the user was already a greeter if any other tag was flagged
+            elif flipped and not await self._has_greeter_tags(guild_id, user_id, exclude=flipped):
+                greeters_delta = 1
+
+            await self._update_tag_counts(guild_id, taxonomy, deltas, greeters_delta)
+
+        self._apply_tag_counts(guild_id, deltas, greeters_delta)
 
     @override
     async def get_greeter(self, guild_id: int, user_id: int) -> bool:
-        async with self.database.cursor() as cursor:
-            await cursor.execute(
-                "SELECT greeter FROM tags WHERE guild_id = ? AND user_id = ?",
-                (guild_id, user_id),
-            )
+        # Users have a row per tag, and are greeters if any of them is flagged
+        return await self._has_greeter_tags(guild_id, user_id)
+
+    @override
+    async def get_taxonomy(self, guild_id: int) -> Taxonomy:
+        taxonomy = self._taxonomies.get(guild_id)
+        if taxonomy is not None:
+            return taxonomy
+
+        # Only the first request of a guild reads its taxonomy from the database
+        version = self._taxonomy_versions[guild_id]
+        async with self.database.execute(
+            """
+            SELECT next_tag_id, tag_id, name, description
+            FROM taxonomies LEFT JOIN taxonomy_tags USING (guild_id)
+            WHERE guild_id = ?
+            ORDER BY tag_id
+            """,
+            (guild_id,),
+        ) as cursor:
             rows = await cursor.fetchall()
-            if len(rows) == 0:
+
+        taxonomy = DEFAULT_TAXONOMY
+        if rows:
+            # A guild may have deleted every tag, leaving a single row of NULLs
+            tags = tuple(TagDefinition(*row[1:]) for row in rows if row[1] is not None)
+            taxonomy = Taxonomy(tags, rows[0][0])
+
+        # A taxonomy changed while it was read may be stale, so it isn't cached
+        if self._taxonomy_versions[guild_id] == version:
+            self._taxonomies[guild_id] = taxonomy
+        return taxonomy
+
+    @override
+    async def define_tag(self, guild_id: int, name: str, description: str | None) -> TagDefinition:
+        async with self._taxonomy_lock(guild_id):
+            taxonomy = await self.get_taxonomy(guild_id)
+            changed = taxonomy.with_definition(name, description)
+            if changed is not taxonomy:
+                await self._change_taxonomy(guild_id, taxonomy, changed)
+            return changed.definitions[name]
+
+    @override
+    async def rename_tag(self, guild_id: int, name: str, new_name: str) -> bool:
+        async with self._taxonomy_lock(guild_id):
+            taxonomy = await self.get_taxonomy(guild_id)
+            changed = taxonomy.renamed(name, new_name)
+            if changed is None:
                 return False
-            if len(rows) > 1:  # There should never be duplicate users.
-                raise DatabaseIntegrityError
-            return bool(rows[0][0])
+
+            # Members' tags are stored by ID, so only the definition changes
+            await self._change_taxonomy(guild_id, taxonomy, changed)
+            # The counts are cached by name
+            self._forget_tag_counts(guild_id)
+            return True
+
+    @override
+    async def delete_tag(self, guild_id: int, name: str) -> int:
+        async with self._taxonomy_lock(guild_id):
+            taxonomy = await self.get_taxonomy(guild_id)
+            tag_id = taxonomy.ids.get(name)
+            if tag_id is None:
+                return 0
+
+            changed = taxonomy.without(name)
+            async with self._transaction():
+                async with self.database.execute(
+                    "DELETE FROM tags WHERE guild_id = ? AND tag_id = ?",
+                    (guild_id, tag_id),
+                ) as cursor:
+                    removed = cursor.rowcount
+                await self._save_taxonomy(guild_id, taxonomy, changed)
+                await self._recount_tags([guild_id])
+
+            self._apply_taxonomy(guild_id, changed)
+            return removed
+
+    def _taxonomy_lock(self, guild_id: int) -> asyncio.Lock:
+        """Get the lock held while a guild's taxonomy may change."""
+        lock = self._taxonomy_locks.get(guild_id)
+        if lock is None:
+            lock = self._taxonomy_locks[guild_id] = asyncio.Lock()
+        return lock
+
+    @asynccontextmanager
+    async def _transaction(self) -> AsyncIterator[None]:
+        """Make writes in a transaction of their own, committed at the end or rolled back if they fail.
+
+        Writers take turns, as a commit or rollback would also apply to the
+        writes another task left uncommitted. Callers that also take a
+        guild's taxonomy lock must take it first.
+        """
+        async with self._write_lock:
+            try:
+                yield
+                await self.database.commit()
+            except BaseException:
+                await self.database.rollback()
+                raise
+
+    async def _change_taxonomy(self, guild_id: int, taxonomy: Taxonomy, changed: Taxonomy) -> None:
+        """Store a change to a guild's taxonomy, in its own transaction."""
+        async with self._transaction():
+            await self._save_taxonomy(guild_id, taxonomy, changed)
+
+        self._apply_taxonomy(guild_id, changed)
+
+    async def _save_taxonomy(self, guild_id: int, taxonomy: Taxonomy, changed: Taxonomy) -> None:
+        """Write the changes from one of a guild's taxonomies to another, in the caller's transaction."""
+        await self.database.execute(
+            """
+            INSERT INTO taxonomies (guild_id, next_tag_id) VALUES (?, ?)
+            ON CONFLICT (guild_id) DO UPDATE SET next_tag_id = excluded.next_tag_id
+            """,
+            (guild_id, changed.next_id),
+        )
+
+        # The default taxonomy is only written once a guild changes it
+        stored = set(taxonomy.tags) if taxonomy.stored else set()
+        await self.database.executemany(
+            "DELETE FROM taxonomy_tags WHERE guild_id = ? AND tag_id = ?",
+            [(guild_id, tag.tag_id) for tag in stored if tag.tag_id not in changed.names],
+        )
+        await self.database.executemany(
+            """
+            INSERT INTO taxonomy_tags (guild_id, tag_id, name, description) VALUES (?, ?, ?, ?)
+            ON CONFLICT (guild_id, tag_id) DO UPDATE SET name = excluded.name, description = excluded.description
+            """,
+            [(guild_id, *tag) for tag in changed.tags if tag not in stored],
+        )
+
+    def _apply_taxonomy(self, guild_id: int, taxonomy: Taxonomy) -> None:
+        """Cache a committed taxonomy."""
+        self._taxonomy_versions[guild_id] += 1
+        self._taxonomies[guild_id] = taxonomy
+
+    def _forget_taxonomy(self, guild_id: int) -> None:
+        """Drop the cached taxonomy of a guild, so it's read again."""
+        self._taxonomies.pop(guild_id, None)
+        self._taxonomy_versions[guild_id] += 1
 
     @override
     async def get_friend_suggestions(self, guild_id: int, user_id: int) -> list[tuple[int, list[str]]]:
-        async with self.database.cursor() as cursor:
-            user_tags = await self.get_tags(guild_id, user_id)
+        user_tags = await self.get_tags(guild_id, user_id)
+        if not user_tags:
+            return []
+
+        result_any_tags = await self._get_candidate_tags(guild_id, user_id)
+
+        # Limit to top 10 users with best ratio of tags in common
+        return await suggest_friends(result_any_tags, 10, user_tags, await self._get_scorer(guild_id))
+
+    @override
+    async def rank_friend_suggestions(self, guild_id: int, user_id: int) -> "FriendRanking":
+        user_tags = await self.get_tags(guild_id, user_id)
+        if not user_tags:
+            return FriendRanking({}, [])
+
+        result_any_tags = await self._get_candidate_tags(guild_id, user_id)
+        return FriendRanking(await group_friends(result_any_tags), user_tags, await self._get_scorer(guild_id))
+
+    @override
+    async def get_tag_counts(self, guild_id: int) -> TagCounts:
+        counts = self._tag_counts.get(guild_id)
+        if counts is not None:
+            return counts
+
+        # Only the first request of a guild reads the counts from the database
+        version = self._tag_count_versions[guild_id]
+        taxonomy = await self.get_taxonomy(guild_id)
+        counts = TagCounts()
+        # Another task's uncommitted counts may be rolled back, so they mustn't be read, let alone cached
+        async with (
+            self._write_lock,
+            self.database.execute(
+                "SELECT tag_id, greeters FROM tag_counts WHERE guild_id = ?",
+                (guild_id,),
+            ) as cursor,
+        ):
+            for tag_id, greeters in await cursor.fetchall():
+                if tag_id == GREETERS_COUNT_TAG:
+                    counts.greeters = greeters
+                else:
+                    counts.tags[taxonomy.names[tag_id]] = greeters
 
-            if not user_tags:
-                return []
+        # Counts changed while they were read may be stale, so they aren't cached
+        if self._tag_count_versions[guild_id] == version:
+            self._tag_counts[guild_id] = counts
+        return counts
 
+    async def _get_scorer(self, guild_id: int) -> Scorer:
+        if self.scoring == "idf":
+            return idf_weighted(await self.get_tag_counts(guild_id))
+        return jaccard
+
+    async def _has_greeter_tags(self, guild_id: int, user_id: int, exclude: Iterable[int] = ()) -> bool:
+        """Check whether any of a user's tags (other than the excluded IDs) are flagged as a greeter's."""
+        exclude = list(exclude)
+        query = "SELECT EXISTS (SELECT 1 FROM tags WHERE guild_id = ? AND user_id = ? AND greeter"
+        if exclude:
+            query += f" AND tag_id NOT IN ({', '.join('?' * len(exclude))})"
+        query += ")"
+
+        async with self.database.execute(query, (guild_id, user_id, *exclude)) as cursor:
+            (exists,) = await cursor.fetchone()  # pyright: ignore[reportGeneralTypeIssues]
+        return bool(exists)
+
+    async def _update_tag_counts(
+        self,
+        guild_id: int,
+        taxonomy: Taxonomy,
+        deltas: Counter[str],
+        greeters_delta: int,
+    ) -> None:
+        """Apply changes to the tag counts table, in the caller's transaction."""
+        changes = [(guild_id, taxonomy.ids[tag], delta) for tag, delta in deltas.items() if delta]
+        if greeters_delta:
+            changes.append((guild_id, GREETERS_COUNT_TAG, greeters_delta))
+        if not changes:
+            return
+
+        await self.database.executemany(
+            """
+            INSERT INTO tag_counts (guild_id, tag_id, greeters) VALUES (?, ?, ?)
+            ON CONFLICT (guild_id, tag_id) DO UPDATE SET greeters = greeters + excluded.greeters
+            """,
+            changes,
+        )
+
+    def _apply_tag_counts(self, guild_id: int, deltas: Counter[str], greeters_delta: int) -> None:
+        """Apply committed changes to the cached tag counts."""
+        self._tag_count_versions[guild_id] += 1
+        counts = self._tag_counts.get(guild_id)
+        if counts is not None:
+            counts.apply(deltas, greeters_delta)
+
+    async def _recount_tags(self, guild_ids: Iterable[int] | None) -> None:
+        """Count the tags of some guilds (or all of them) from scratch, in the caller's transaction."""
+        if guild_ids is None:
+            await self.database.execute("DELETE FROM tag_counts")
+            await self.database.execute(
+                """
+                INSERT INTO tag_counts (guild_id, tag_id, greeters)
+                SELECT guild_id, tag_id, COUNT(*) FROM tags WHERE greeter GROUP BY guild_id, tag_id
+                UNION ALL
+                SELECT guild_id, ?, COUNT(DISTINCT user_id) FROM tags WHERE greeter GROUP BY guild_id
+                """,
+                (GREETERS_COUNT_TAG,),
+            )
+            self._tag_counts.clear()
+            return
+
+        parameters = [(guild_id,) for guild_id in guild_ids]
+        await self.database.executemany("DELETE FROM tag_counts WHERE guild_id = ?", parameters)
+        await self.database.executemany(
+            """
+            INSERT INTO tag_counts (guild_id, tag_id, greeters)
+            SELECT guild_id, tag_id, COUNT(*) FROM tags WHERE guild_id = ? AND greeter GROUP BY tag_id
+            UNION ALL
+            SELECT guild_id, ?, COUNT(DISTINCT user_id) FROM tags WHERE guild_id = ? AND greeter GROUP BY guild_id
+            """,
+            # Numbered placeholders can't be bound from a sequence in Python 3.14
+            [(guild_id, GREETERS_COUNT_TAG, guild_id) for (guild_id,) in parameters],
+        )
+        for (guild_id,) in parameters:
+            self._forget_tag_counts(guild_id)
+
+    def _forget_tag_counts(self, guild_id: int) -> None:
+        """Drop the cached tag counts of a guild, so they're read again."""
+        self._tag_counts.pop(guild_id, None)
+        self._tag_count_versions[guild_id] += 1
+
+    @override
+    async def get_guild_ids(self) -> list[int]:
+        async with self.database.execute(
+            """
+            SELECT guild_id FROM tags
+            UNION SELECT guild_id FROM greeter_assignments
+            UNION SELECT guild_id FROM taxonomies
+            """,
+        ) as cursor:
+            return [guild_id for (guild_id,) in await cursor.fetchall()]
+
+    @override
+    async def get_user_ids(self, guild_id: int) -> list[int]:
+        async with self.database.execute(
+            "SELECT DISTINCT user_id FROM tags WHERE guild_id = ?",
+            (guild_id,),
+        ) as cursor:
+            return [user_id for (user_id,) in await cursor.fetchall()]
+
+    @override
+    async def remove_users(self, guild_id: int, user_ids: Iterable[int]) -> int:
+        user_ids = list(user_ids)
+        taxonomy = await self.get_taxonomy(guild_id)
+        deltas: Counter[str] = Counter()
+        removed_greeters: set[int] = set()
+        removed = 0
+
+        async with self._transaction():
+            for start in range(0, len(user_ids), DELETE_CHUNK_SIZE):
+                chunk = user_ids[start : start + DELETE_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+
+                query = f"""
+                    DELETE FROM tags WHERE guild_id = ? AND user_id IN ({placeholders})
+                    RETURNING user_id, tag_id, greeter
+                """  # noqa: S608
+                async with self.database.execute(query, (guild_id, *chunk)) as cursor:
+                    for user_id, tag_id, greeter in await cursor.fetchall():
+                        removed += 1
+                        if greeter:
+                            deltas[taxonomy.names[tag_id]] -= 1
+                            removed_greeters.add(user_id)
+
+                await self.database.execute(
+                    f"""
+                    DELETE FROM greeter_assignments
+                    WHERE guild_id = ? AND (newcomer_id IN ({placeholders}) OR greeter_id IN ({placeholders}))
+                    """,  # noqa: S608
+                    (guild_id, *chunk, *chunk),
+                )
+
+            await self._update_tag_counts(guild_id, taxonomy, deltas, -len(removed_greeters))
+
+        self._apply_tag_counts(guild_id, deltas, -len(removed_greeters))
+        return removed
+
+    @override
+    async def remove_guilds(self, guild_ids: Iterable[int]) -> int:
+        guild_ids = list(guild_ids)
+        removed = 0
+
+        async with self._transaction():
+            for start in range(0, len(guild_ids), DELETE_CHUNK_SIZE):
+                chunk = guild_ids[start : start + DELETE_CHUNK_SIZE]
+                placeholders = ", ".join("?" * len(chunk))
+
+                for table in ("tags", "tag_counts", "greeter_assignments", "taxonomies", "taxonomy_tags"):
+                    async with self.database.execute(
+                        f"DELETE FROM {table} WHERE guild_id IN ({placeholders})",  # noqa: S608
+                        chunk,
+                    ) as cursor:
+                        if table == "tags":
+                            removed += cursor.rowcount
+
+        for guild_id in guild_ids:
+            self._forget_tag_counts(guild_id)
+            self._forget_taxonomy(guild_id)
+        return removed
+
+    @override
+    async def maintain(self) -> "MaintenanceReport":
+        # bot.maintenance imports the settings, which import this module
+        from bot.maintenance import run_database_maintenance
+
+        # Maintenance commits whatever is pending and VACUUM needs no transaction to be open,
+        # so it mustn't run in the middle of another task's
+        async with self._write_lock:
+            return await run_database_maintenance(self.database)
+
+    async def _get_candidate_tags(self, guild_id: int, user_id: int) -> list[tuple[int, str]]:
+        """Get every tag of the greeters sharing at least one tag with the user."""
+        taxonomy = await self.get_taxonomy(guild_id)
+        async with self.database.cursor() as cursor:
             query = """
-                SELECT t.user_id, t.tag
+                SELECT t.user_id, t.tag_id
                 FROM tags t
-                WHERE t.user_id  IN (
+                WHERE t.guild_id = ? AND t.user_id IN (
                     SELECT t2.user_id
                     FROM tags t1
-                    JOIN tags t2 ON t1.tag = t2.tag
-                    WHERE t1.user_id = ? AND
+                    JOIN tags t2 ON t1.tag_id = t2.tag_id
+                    WHERE t1.guild_id = ? AND
+                    t1.user_id = ? AND
                     t2.user_id != t1.user_id AND
                     t1.guild_id = t2.guild_id AND
                     t2.greeter = TRUE
                 )
             """
-            await cursor.execute(query, (user_id,))
+            await cursor.execute(query, (guild_id, guild_id, user_id))
+
+            names = taxonomy.names
+            return [(candidate_id, names[tag_id]) for candidate_id, tag_id in await cursor.fetchall()]
+
+    @override
+    async def export_rows(
+        self,
+        guild_id: int | None = None,
+        *,
+        chunk_size: int = EXPORT_CHUNK_SIZE,
+    ) -> AsyncIterator[TagRow]:
+        # Each chunk is read whole, starting after the last row of the previous one, so that
+        # no statement is left running on the shared connection while rows are yielded. The
+        # chunks follow the primary key, so SQLite neither scans nor sorts.
+        if guild_id is None:
+            after = "(guild_id, user_id, tag_id) > (?, ?, ?)"
+            last_key: tuple[int, ...] = (-1, -1, -1)
+        else:
+            after = "guild_id = ? AND (user_id, tag_id) > (?, ?)"
+            last_key = (guild_id, -1, -1)
+        query = f"""
+            SELECT guild_id, user_id, tag_id, greeter FROM tags WHERE {after}
+            ORDER BY guild_id, user_id, tag_id LIMIT ?
+        """  # noqa: S608
+
+        taxonomy = DEFAULT_TAXONOMY
+        taxonomy_guild_id: int | None = None
+        # The rows of a user, which are sorted by name once they're all read
+        user_rows: list[TagRow] = []
 
-            result_any_tags: list[tuple[int, str]] = await cursor.fetchall()  # pyright: ignore[reportAssignmentType]
+        while True:
+            # Another task's uncommitted writes may be rolled back, so they mustn't be read
+            async with self._write_lock, self.database.execute(query, (*last_key, chunk_size)) as cursor:
+                rows = await cursor.fetchall()
+            if not rows:
+                break
+            last_key = rows[-1][:3]
 
-            # Limit to top 10 users with best ratio of tags in common
-            return await suggest_friends(result_any_tags, 10, user_tags)
+            for row_guild_id, user_id, tag_id, greeter in rows:
+                if user_rows and (user_rows[0].guild_id, user_rows[0].user_id) != (row_guild_id, user_id):
+                    for row in sorted(user_rows):
+                        yield row
+                    user_rows.clear()
+
+                if row_guild_id != taxonomy_guild_id:
+                    taxonomy = await self.get_taxonomy(row_guild_id)
+                    taxonomy_guild_id = row_guild_id
+                user_rows.append(TagRow(row_guild_id, user_id, taxonomy.names[tag_id], bool(greeter)))
+
+        for row in sorted(user_rows):
+            yield row
+
+    @override
+    async def import_rows(  # noqa: C901, PLR0915
+        self,
+        rows: AsyncIterable[TagRow],
+        *,
+        chunk_size: int = IMPORT_CHUNK_SIZE,
+        transaction_size: int = IMPORT_TRANSACTION_SIZE,
+    ) -> int:
+        query = """
+            INSERT INTO tags (guild_id, user_id, tag_id, greeter) VALUES (?, ?, ?, ?)
+            ON CONFLICT (guild_id, user_id, tag_id) DO UPDATE SET greeter = excluded.greeter
+        """
+        imported = 0
+        uncommitted = 0
+        chunk: list[tuple[int, int, int, bool]] = []
+        # The taxonomy of every guild imported into, and those that got new tags
+        taxonomies: dict[int, Taxonomy] = {}
+        changed: set[int] = set()
+        # Held until the import is done, for every guild imported into
+        locks = AsyncExitStack()
+        # Whether the write lock is held, from the first write of a transaction until it's committed
+        writing = False
+
+        async def begin() -> None:
+            nonlocal writing
+            if not writing:
+                await self._write_lock.acquire()
+                writing = True
+
+        async def commit() -> None:
+            nonlocal uncommitted, writing
+            if writing:
+                await self.database.commit()
+                self._write_lock.release()
+                writing = False
+            uncommitted = 0
+
+        async def intern(row: TagRow) -> int:
+            taxonomy = taxonomies.get(row.guild_id)
+            if taxonomy is None:
+                # Taxonomy locks are taken before the write lock, like every other writer does
+                await flush()
+                await commit()
+                await locks.enter_async_context(self._taxonomy_lock(row.guild_id))
+                taxonomy = taxonomies[row.guild_id] = await self.get_taxonomy(row.guild_id)
+
+            if row.tag not in taxonomy.ids:
+                interned = taxonomy.with_tags([row.tag])
+                await begin()
+                await self._save_taxonomy(row.guild_id, taxonomy, interned)
+                taxonomy = taxonomies[row.guild_id] = interned
+                changed.add(row.guild_id)
+            return taxonomy.ids[row.tag]
+
+        async def flush() -> None:
+            nonlocal imported, uncommitted
+            if not chunk:
+                return
+            await begin()
+            await self.database.executemany(query, chunk)
+            imported += len(chunk)
+            uncommitted += len(chunk)
+            chunk.clear()
+
+            if uncommitted >= transaction_size:
+                await commit()
+
+        async with locks:
+            try:
+                async for row in rows:
+                    chunk.append((row.guild_id, row.user_id, await intern(row), row.greeter))
+                    if len(chunk) >= chunk_size:
+                        await flush()
+                await flush()
+
+                # Counting once at the end is much cheaper than updating the counts per row
+                await begin()
+                await self._recount_tags(taxonomies)
+                await commit()
+            except BaseException:
+                # Transactions that were already committed are kept, along with their new tags
+                if writing:
+                    try:
+                        await self.database.rollback()
+                    finally:
+                        self._write_lock.release()
+                for guild_id in changed:
+                    self._forget_taxonomy(guild_id)
+                raise
+
+            for guild_id in changed:
+                self._apply_taxonomy(guild_id, taxonomies[guild_id])
+        return imported
+
+    @override
+    async def save_assignments(self, guild_id: int, assignments: Iterable[GreeterAssignment]) -> None:
+        # Both statements run in one transaction, so readers never see a half-written guild
+        async with self._transaction():
+            await self.database.execute("DELETE FROM greeter_assignments WHERE guild_id = ?", (guild_id,))
+            await self.database.executemany(
+                "INSERT INTO greeter_assignments (guild_id, newcomer_id, greeter_id, score) VALUES (?, ?, ?, ?)",
+                ((guild_id, *assignment) for assignment in assignments),
+            )
+
+    @override
+    async def get_assignments(self, guild_id: int, newcomer_id: int | None = None) -> list[GreeterAssignment]:
+        # Separate queries, so a newcomer's greeters are looked up in the primary key
+        if newcomer_id is None:
+            condition, parameters = "guild_id = ?", (guild_id,)
+        else:
+            condition, parameters = "guild_id = ? AND newcomer_id = ?", (guild_id, newcomer_id)
+        async with self.database.execute(
+            f"""
+            SELECT newcomer_id, greeter_id, score
+            FROM greeter_assignments
+            WHERE {condition}
+            ORDER BY newcomer_id, score DESC, greeter_id DESC
+            """,  # noqa: S608
+            parameters,
+        ) as cursor:
+            return [GreeterAssignment(*row) for row in await cursor.fetchall()]
+
+
+def jaccard(user_tags: set[str], tags: set[str]) -> float:
+    """Use ratio of tags in common:total tags to prevent gaming the system by having every tag."""
+    return len(user_tags & tags) / len(user_tags | tags)
+
+
+def idf_weighted(counts: TagCounts) -> Scorer:
+    """Make a scorer like `jaccard` where every tag is weighed by its rarity.
+
+    Sharing a tag that few greeters have (say `microcontrollers`) counts for
+    more than sharing one that many have (say `unix`), so popular tags don't
+    swamp the suggestions of big guilds.
+    """
+    weights: dict[str, float] = {}
+
+    def weight(tag: str) -> float:
+        if tag not in weights:
+            weights[tag] = counts.idf(tag)
+        return weights[tag]
+
+    def score(user_tags: set[str], tags: set[str]) -> float:
+        # fsum is exact, so scores don't depend on the order sets are iterated in
+        return math.fsum(map(weight, user_tags & tags)) / math.fsum(map(weight, user_tags | tags))
+
+    return score
 
 
 async def group_friends(result: list[tuple[int, str]]) -> dict[int, set[str]]:
@@ -263,14 +1364,59 @@ async def suggest_friends(
     result: list[tuple[int, str]],
     limit: int,
     user_tags: list[str],
+    scorer: Scorer = jaccard,
 ) -> list[tuple[int, list[str]]]:
     suggestions = await group_friends(result)
     deduplicated_user_tags = set(user_tags)
 
-    def key(tags: set[str]) -> float:
-        """Use ratio of tags in common:total tags to prevent gaming the system by having every tag."""
-        return len(deduplicated_user_tags & tags) / len(deduplicated_user_tags | tags)
-
     # Limit to top `limit` users with most common tags
-    res = sorted(suggestions.items(), key=lambda x: (key(x[1]), x[0]), reverse=True)[:limit]
+    res = sorted(
+        suggestions.items(),
+        key=lambda x: (scorer(deduplicated_user_tags, x[1]), x[0]),
+        reverse=True,
+    )[:limit]
     return [(k, sorted(v)) for k, v in res]
+
+
+class FriendRanking:
+    """Friend suggestions that are ranked lazily, as they are requested.
+
+    Building the ranking is linear in the number of candidates, and every
+    suggestion taken from it costs O(log n). Paging through the first few
+    suggestions never sorts the rest. The order is the same as
+    `suggest_friends`.
+    """
+
+    def __init__(
+        self,
+        suggestions: dict[int, set[str]],
+        user_tags: Iterable[str],
+        scorer: Scorer = jaccard,
+    ) -> None:
+        deduplicated_user_tags = set(user_tags)
+
+        # heapq is a min-heap, so negate the score and the tie-breaking user ID
+        self._heap = [
+            (-scorer(deduplicated_user_tags, tags), -user_id, user_id) for user_id, tags in suggestions.items()
+        ]
+        heapq.heapify(self._heap)
+
+        self._suggestions = suggestions
+        self._ranked: list[tuple[int, list[str]]] = []
+
+    def __len__(self) -> int:
+        return len(self._suggestions)
+
+    def take(self, count: int) -> list[tuple[int, list[str]]]:
+        """Get the best `count` suggestions."""
+        while len(self._ranked) < count and self._heap:
+            *_, user_id = heapq.heappop(self._heap)
+            self._ranked.append((user_id, sorted(self._suggestions[user_id])))
+        return self._ranked[:count]
+
+    def page(self, index: int, size: int) -> list[tuple[int, list[str]]]:
+        """Get the suggestions on a page, counting from 0."""
+        return self.take((index + 1) * size)[index * size :]
+
+    def page_count(self, size: int) -> int:
+        return -(-len(self) // size)
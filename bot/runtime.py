@@ -0,0 +1,84 @@
+"""An optional faster runtime, with uvloop's event loop and orjson.
+
+With `Settings.fast_runtime`, the bot runs on uvloop instead of asyncio's
+default event loop, and Discord's gateway events and HTTP payloads are decoded
+and encoded with orjson. Both are optional dependencies:
+
+    pdm install -G fast
+
+Each is skipped, with a warning, if it isn't installed (uvloop doesn't support
+Windows). Note that disnake already uses orjson on its own whenever it's
+installed.
+"""
+
+import asyncio
+import logging
+from collections.abc import Callable, Coroutine
+from importlib.util import find_spec
+from typing import Any
+
+import disnake.utils
+
+logger = logging.getLogger("zz.runtime")
+
+
+def use_fast_json() -> bool:
+    """Make disnake encode and decode JSON with orjson.
+
+    Returns:
+        Whether orjson is installed, and so used.
+    """
+    if find_spec("orjson") is None:
+        logger.warning("orjson isn't installed, so JSON is handled by the standard library")
+        return False
+
+    import orjson
+
+    def to_json(obj: object) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+
+    # disnake looks these up on every payload, so replacing them is enough
+    disnake.utils._to_json = to_json  # noqa: SLF001
+    disnake.utils._from_json = orjson.loads  # noqa: SLF001
+    return True
+
+
+def event_loop_factory(*, fast: bool) -> Callable[[], asyncio.AbstractEventLoop] | None:
+    """Get the factory of the event loop to run the bot on.
+
+    Returns:
+        uvloop's factory with `fast` if it's installed, or None for asyncio's
+        default event loop.
+    """
+    if not fast:
+        return None
+    if find_spec("uvloop") is None:
+        logger.warning("uvloop isn't installed, so the default event loop is used")
+        return None
+
+    import uvloop
+
+    return uvloop.new_event_loop
+
+
+def run(main: Coroutine[Any, Any, None], *, fast: bool) -> None:
+    """Run a coroutine until it completes, like `asyncio.run`.
+
+    Args:
+        main: The coroutine to run.
+        fast: Whether to use the fast runtime, see the module's documentation.
+    """
+    if fast:
+        use_fast_json()
+
+    with asyncio.Runner(loop_factory=event_loop_factory(fast=fast)) as runner:
+        runner.run(main)
+
+
+def describe_runtime() -> dict[str, str]:
+    """Describe the running event loop and JSON codec, for health reports."""
+    loop = asyncio.get_running_loop()
+    return {
+        "event_loop": f"{type(loop).__module__}.{type(loop).__name__}",
+        "json": getattr(disnake.utils._from_json, "__module__", None) or "unknown",  # noqa: SLF001
+    }
@@ -1,5 +1,9 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from bot.repositories.tags import Scoring
+
 
 class Settings(BaseSettings):
     """Settings for the bot.
@@ -14,16 +18,135 @@ class Settings(BaseSettings):
     Attributes:
         discord_bot_token: The Discord bot token. You may retrieve this from the
                            "Bot" tab of your Discord application.
+        tag_repository: Where tags are stored. "sqlite" keeps them in the
+                        database at `database_path`, "memory" keeps them in
+                        memory only, so they're lost when the bot stops (for
+                        development and throwaway deployments). Database
+                        maintenance and backups only apply to "sqlite".
         database_path: The path to the SQLite database.
+        database_busy_timeout: How many seconds to wait for another connection
+                               (possibly in another process) to release a
+                               lock on the database.
+        database_timeout: How many seconds a command waits for the database
+                          before giving up, which counts towards its circuit
+                          breaker (see `bot.breaker`).
         ollama_host: The host for server for Ollama requests.
                      See https://github.com/ollama/ollama
         ollama_model: The model used for Ollama requests.
                       See https://ollama.com/library
+        ollama_timeout: How many seconds `/help` waits for Ollama's answer
+                        before giving up, which counts towards its circuit
+                        breaker.
+        breaker_failure_threshold: How many calls to the database or Ollama
+                                   have to fail in a row for commands to stop
+                                   waiting for it.
+        breaker_open_duration: How many seconds commands fail straight away
+                               for, before the database or Ollama is tried
+                               again.
+        disabled_extensions: Names of the extensions in `bot.exts` that won't
+                             be loaded, e.g. `["help"]` to turn off AI help.
+        shard_count: The total number of shards. If unset, Discord's
+                     recommended shard count is used.
+        shard_ids: The shards this process runs. If unset, all of them.
+        cluster_processes: How many worker processes `bot.cluster` starts. If
+                           unset, one per CPU (but no more than the number of
+                           shards).
+        cluster_health_interval: How often, in seconds, cluster workers report
+                                 their health to the launcher, and the health
+                                 is published.
+        cluster_health_path: A file the launcher writes the aggregated cluster
+                             health to as JSON, if set. When every shard runs
+                             in a single process, it writes its own health.
+        suggestion_page_size: How many friend suggestions are shown per page.
+        suggestion_cache_ttl: How long, in seconds, a user's ranked friend
+                              suggestions are kept for paging and reruns.
+        suggestion_scoring: How friend suggestions are scored. "jaccard" ranks
+                            by the ratio of tags in common, "idf" does the
+                            same but weighs rare tags more than popular ones.
+        matching_interval_hours: How often the greeter matching job runs.
+        matching_start_delay: How long, in seconds, the first run of the
+                              greeter matching job waits once the bot is
+                              ready, so it doesn't compete with startup.
+        matching_greeters_per_newcomer: How many greeters the matching job
+                                        assigns to each newcomer.
+        matching_greeter_capacity: How many newcomers a greeter is assigned at
+                                   most. If unset, newcomers are spread evenly
+                                   across the greeters.
+        lean_cache: Whether to only cache what the cogs need from Discord
+                    (guilds, with their roles and channels), see
+                    `bot.cache`. Members are fetched when needed instead, and
+                    guilds aren't chunked, so members who left while the bot
+                    was offline aren't swept.
+        members_intent: Whether to request the privileged members intent. It
+                        lets the bot notice members leaving and delete their
+                        tags, and has to be enabled in the "Bot" tab of your
+                        Discord application too.
+        outbound_max_in_flight: How many requests to Discord's REST API are
+                                sent at once, at most. Background work
+                                (maintenance and matching) only gets half of
+                                them, see `bot.outbound`.
+        fast_runtime: Whether to run on uvloop's event loop and handle Discord's
+                      JSON payloads with orjson, when they're installed (see
+                      `bot.runtime`).
+        prune_interval: How often, in seconds, the tags of departed members
+                        and guilds are deleted.
+        prune_sweep_interval_hours: How often every stored member and guild is
+                                    checked, to catch those that left while the
+                                    bot was offline.
+        maintenance_interval_hours: How often the database is analyzed,
+                                    vacuumed and checkpointed.
+        maintenance_quiet_period: How long, in seconds, the bot has to go
+                                  without interactions before database
+                                  maintenance runs.
+        backup_directory: The directory database snapshots are written to.
+        backup_interval_hours: How often a snapshot of the database is taken.
+                               If unset, the bot doesn't take any (they can
+                               still be taken with `python -m bot.backup`).
+        backup_retention: How many snapshots are kept.
+        backup_pages_per_step: How many database pages a backup copies at a
+                               time. Writers may wait for a step to finish.
+        backup_step_delay: How long, in seconds, a backup sleeps between steps.
+        traffic_record_path: A file every interaction with the bot is recorded
+                             to, for replaying it in load tests (see
+                             `bot.recording`). If unset, nothing is recorded.
     """
 
     model_config = SettingsConfigDict(env_file=".env", env_prefix="ZZ_")
 
     discord_bot_token: str
+    tag_repository: Literal["sqlite", "memory"] = "sqlite"
     database_path: str = "zz.db"
+    database_busy_timeout: float = 5.0
+    database_timeout: float = 2.0
     ollama_host: str
     ollama_model: str
+    ollama_timeout: float = 60.0
+    breaker_failure_threshold: int = 5
+    breaker_open_duration: float = 30.0
+    disabled_extensions: list[str] = []
+    shard_count: int | None = None
+    shard_ids: list[int] | None = None
+    cluster_processes: int | None = None
+    cluster_health_interval: float = 15.0
+    cluster_health_path: str | None = None
+    suggestion_page_size: int = 5
+    suggestion_cache_ttl: float = 300.0
+    suggestion_scoring: Scoring = "jaccard"
+    matching_interval_hours: float = 24.0
+    matching_start_delay: float = 600.0
+    matching_greeters_per_newcomer: int = 3
+    matching_greeter_capacity: int | None = None
+    lean_cache: bool = False
+    members_intent: bool = False
+    outbound_max_in_flight: int = 8
+    fast_runtime: bool = False
+    prune_interval: float = 60.0
+    prune_sweep_interval_hours: float = 6.0
+    maintenance_interval_hours: float = 24.0
+    maintenance_quiet_period: float = 300.0
+    backup_directory: str = "backups"
+    backup_interval_hours: float | None = 6.0
+    backup_retention: int = 7
+    backup_pages_per_step: int = 256
+    backup_step_delay: float = 0.05
+    traffic_record_path: str | None = None
@@ -0,0 +1,105 @@
+import sqlite3
+from datetime import UTC, datetime
+from pathlib import Path
+
+import pytest
+
+from bot.backup import (
+    IntegrityError,
+    check_integrity,
+    create_backup,
+    list_backups,
+    restore_backup,
+    rotate_backups,
+    snapshot_path,
+)
+
+rows = 100
+
+
+def create_database(path, rows: int) -> None:
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode = WAL")
+    connection.execute("CREATE TABLE tags (guild_id INTEGER, user_id INTEGER, tag TEXT)")
+    connection.executemany("INSERT INTO tags VALUES (1, ?, 'unix')", ((user_id,) for user_id in range(rows)))
+    connection.commit()
+    connection.close()
+
+
+def count_rows(path) -> int:
+    connection = sqlite3.connect(path)
+    (count,) = connection.execute("SELECT COUNT(*) FROM tags").fetchone()
+    connection.close()
+    return count
+
+
+def test_create_backup(tmp_path) -> None:
+    database = str(tmp_path / "zz.db")
+    # Enough rows for the copy to take several steps
+    many_rows = 10_000
+    create_database(database, many_rows)
+
+    report = create_backup(database, str(tmp_path / "backups"), pages_per_step=4, step_delay=0)
+
+    assert report.steps > 1
+    assert report.restarts == 0
+    assert list_backups(database, str(tmp_path / "backups")) == [Path(report.path)]
+    check_integrity(report.path)
+    assert count_rows(report.path) == many_rows
+    # Snapshots don't depend on a write-ahead log
+    assert sqlite3.connect(report.path).execute("PRAGMA journal_mode").fetchone() == ("delete",)
+
+
+def test_failed_backup_leaves_nothing_behind(tmp_path) -> None:
+    database = tmp_path / "zz.db"
+    database.write_bytes(b"not a database" * 512)
+
+    with pytest.raises(sqlite3.DatabaseError):
+        create_backup(str(database), str(tmp_path / "backups"))
+
+    assert list((tmp_path / "backups").iterdir()) == []
+
+
+def test_rotate_backups(tmp_path) -> None:
+    database = str(tmp_path / "zz.db")
+    paths = [snapshot_path(database, str(tmp_path), datetime(2024, 1, day, tzinfo=UTC)) for day in range(1, 6)]
+    for path in paths:
+        path.touch()
+    # Other databases' snapshots are left alone
+    other = snapshot_path(str(tmp_path / "other.db"), str(tmp_path), datetime(2023, 1, 1, tzinfo=UTC))
+    other.touch()
+
+    assert rotate_backups(database, str(tmp_path), retention=2) == paths[:3]
+
+    assert list_backups(database, str(tmp_path)) == paths[3:]
+    assert other.exists()
+
+
+def test_restore_backup(tmp_path) -> None:
+    database = str(tmp_path / "zz.db")
+    create_database(database, rows)
+    report = create_backup(database, str(tmp_path))
+
+    connection = sqlite3.connect(database)
+    connection.execute("DELETE FROM tags")
+    connection.commit()
+    connection.close()
+
+    restore_backup(report.path, database)
+
+    assert count_rows(database) == rows
+
+
+def test_restore_rejects_corrupt_backups(tmp_path) -> None:
+    database = str(tmp_path / "zz.db")
+    create_database(database, rows)
+    snapshot = tmp_path / "corrupt.db"
+    snapshot.write_bytes(b"SQLite format 3\x00" + b"\xff" * 4096)
+
+    with pytest.raises(IntegrityError):
+        restore_backup(snapshot, database)
+
+    with pytest.raises(IntegrityError):
+        restore_backup(tmp_path / "missing.db", database)
+
+    assert count_rows(database) == rows
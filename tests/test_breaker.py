@@ -0,0 +1,151 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from bot.breaker import CircuitBreaker
+from bot.errors import DependencyUnavailableError
+from bot.repositories.guarded import GuardedTagRepository
+from bot.repositories.memory import MemoryTagRepository
+
+
+def make_breaker(*, timeout: float = 1.0, open_duration: float = 60.0, shield: bool = False) -> CircuitBreaker:
+    return CircuitBreaker(
+        "database",
+        timeout=timeout,
+        failure_threshold=3,
+        open_duration=open_duration,
+        failures=(sqlite3.Error,),
+        shield=shield,
+    )
+
+
+async def locked() -> None:
+    msg = "database is locked"
+    raise sqlite3.OperationalError(msg)
+
+
+async def succeed() -> str:
+    return "ok"
+
+
+async def fail_times(breaker: CircuitBreaker, times: int) -> None:
+    for _ in range(times):
+        with pytest.raises(sqlite3.OperationalError):
+            await breaker.call(locked)
+
+
+@pytest.mark.asyncio()
+async def test_opens_after_consecutive_failures() -> None:
+    breaker = make_breaker()
+
+    await fail_times(breaker, 2)
+    assert await breaker.call(succeed) == "ok"
+    await fail_times(breaker, 3)
+
+    assert breaker.state == "open"
+    called = False
+
+    async def call() -> None:
+        nonlocal called
+        called = True
+
+    with pytest.raises(DependencyUnavailableError) as raised:
+        await breaker.call(call)
+
+    assert not called
+    assert raised.value.retry_after > 0
+    assert breaker.collect_metrics()["rejected"] == 1
+
+
+@pytest.mark.asyncio()
+async def test_timeouts_count_as_failures() -> None:
+    breaker = make_breaker(timeout=0.01)
+
+    for _ in range(3):
+        with pytest.raises(DependencyUnavailableError):
+            await breaker.call(lambda: asyncio.sleep(1))
+
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio()
+async def test_other_errors_are_not_failures() -> None:
+    breaker = make_breaker()
+
+    async def bug() -> None:
+        raise ValueError
+
+    for _ in range(5):
+        with pytest.raises(ValueError):  # noqa: PT011
+            await breaker.call(bug)
+
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio()
+async def test_half_open_probe() -> None:
+    breaker = make_breaker(open_duration=0.01)
+    await fail_times(breaker, 3)
+    await asyncio.sleep(0.02)
+
+    probe_started = asyncio.Event()
+    recovered = asyncio.Event()
+
+    async def probe() -> str:
+        probe_started.set()
+        await recovered.wait()
+        return "ok"
+
+    probing = asyncio.create_task(breaker.call(probe))
+    await probe_started.wait()
+    # Only the probe goes through
+    with pytest.raises(DependencyUnavailableError):
+        await breaker.call(succeed)
+
+    recovered.set()
+    assert await probing == "ok"
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio()
+async def test_failed_probe_reopens() -> None:
+    breaker = make_breaker(open_duration=0.01)
+    await fail_times(breaker, 3)
+    await asyncio.sleep(0.02)
+
+    await fail_times(breaker, 1)
+
+    assert breaker.state == "open"
+    assert breaker.retry_after > 0
+    assert breaker.collect_metrics()["times_opened"] == 1
+
+
+@pytest.mark.asyncio()
+async def test_shielded_calls_finish_after_timing_out() -> None:
+    breaker = make_breaker(timeout=0.01, shield=True)
+    finished = asyncio.Event()
+
+    async def write() -> None:
+        await asyncio.sleep(0.03)
+        finished.set()
+
+    with pytest.raises(DependencyUnavailableError):
+        await breaker.call(write)
+
+    await asyncio.wait_for(finished.wait(), 1)
+
+
+@pytest.mark.asyncio()
+async def test_guarded_repository() -> None:
+    breaker = make_breaker()
+    repository = GuardedTagRepository(MemoryTagRepository(), breaker)
+    await repository.add(1234, 1, ["unix"], greeter=False)
+
+    assert await repository.get_tags(1234, 1) == ["unix"]
+
+    await fail_times(breaker, 3)
+    with pytest.raises(DependencyUnavailableError):
+        await repository.get_tags(1234, 1)
+    # Maintenance isn't guarded
+    assert await repository.get_user_ids(1234) == [1]
@@ -0,0 +1,122 @@
+import io
+from collections.abc import AsyncIterator
+
+import aiosqlite
+import pytest
+
+from bot.bulk import InvalidRowError, export_tags, import_tags, read_rows, write_rows
+from bot.repositories.tags import SqliteTagRepository, TagRow
+
+test_guild = 1234
+other_guild = 2468
+
+rows = [
+    TagRow(test_guild, 1, "databases", greeter=True),
+    TagRow(test_guild, 1, "unix", greeter=True),
+    TagRow(test_guild, 2, "unix", greeter=False),
+    TagRow(other_guild, 3, "networks", greeter=False),
+]
+
+
+async def rows_from(xs: list[TagRow]) -> AsyncIterator[TagRow]:
+    for row in xs:
+        yield row
+
+
+async def create_repository() -> SqliteTagRepository:
+    repository = SqliteTagRepository(await aiosqlite.connect(":memory:"))
+    await repository.initialize()
+    return repository
+
+
+@pytest.mark.asyncio()
+@pytest.mark.parametrize("format", ["jsonl", "csv"])
+async def test_round_trip(format) -> None:
+    source = await create_repository()
+    await source.import_rows(rows_from(rows))
+
+    file = io.StringIO()
+    assert await export_tags(source, file, format) == len(rows)
+
+    file.seek(0)
+    destination = await create_repository()
+    assert await import_tags(destination, file, format) == len(rows)
+
+    exported = [row async for row in destination.export_rows()]
+    await source.database.close()
+    await destination.database.close()
+    assert exported == rows
+
+
+@pytest.mark.asyncio()
+async def test_export_single_guild() -> None:
+    repository = await create_repository()
+    await repository.import_rows(rows_from(rows))
+
+    exported = [row async for row in repository.export_rows(other_guild)]
+    await repository.database.close()
+    assert exported == [rows[3]]
+
+
+@pytest.mark.asyncio()
+async def test_import_in_chunks_updates_greeters() -> None:
+    repository = await create_repository()
+    await repository.import_rows(rows_from(rows), chunk_size=1, transaction_size=2)
+
+    promoted = TagRow(test_guild, 2, "unix", greeter=True)
+    await repository.import_rows(rows_from([promoted]))
+
+    greeter = await repository.get_greeter(test_guild, 2)
+    count = len([row async for row in repository.export_rows()])
+    tag_counts = await repository.get_tag_counts(test_guild)
+    await repository.database.close()
+    assert greeter
+    assert count == len(rows)
+    assert tag_counts.greeters == len({row.user_id for row in rows if row.guild_id == test_guild})
+    assert tag_counts.tags == {"databases": 1, "unix": 2}
+
+
+@pytest.mark.asyncio()
+async def test_read_invalid_row() -> None:
+    file = io.StringIO('{"guild_id": 1, "user_id": "not a number", "tag": "unix"}\n')
+    with pytest.raises(InvalidRowError):
+        _ = [row async for row in read_rows(file, "jsonl")]
+
+
+@pytest.mark.asyncio()
+async def test_read_invalid_json() -> None:
+    file = io.StringIO('{"guild_id": 1, "user_id": 2, "tag": "unix"}\n\n{"guild_id": 1,\n')
+    with pytest.raises(InvalidRowError, match="^Line 3: "):
+        _ = [row async for row in read_rows(file, "jsonl")]
+
+
+@pytest.mark.asyncio()
+@pytest.mark.parametrize("format", ["jsonl", "csv"])
+async def test_import_checks_tags(format) -> None:
+    file = io.StringIO()
+    await write_rows(rows_from([*rows, TagRow(test_guild, 2, "rust", greeter=False)]), file, format)
+
+    repository = await create_repository()
+    file.seek(0)
+    # The CSV header is on the first line
+    with pytest.raises(InvalidRowError, match=f"^Line {len(rows) + 1 + (format == 'csv')}: .*'rust'"):
+        await import_tags(repository, file, format)
+
+    file.seek(0)
+    assert await import_tags(repository, file, format, add_tags=True) == len(rows) + 1
+    taxonomy = await repository.get_taxonomy(test_guild)
+    await repository.database.close()
+    assert "rust" in taxonomy.ids
+
+
+@pytest.mark.asyncio()
+async def test_import_rejects_invalid_tag_names() -> None:
+    repository = await create_repository()
+    file = io.StringIO('{"guild_id": 1, "user_id": 2, "tag": "Not a tag!"}\n')
+
+    with pytest.raises(InvalidRowError, match="Invalid tag name"):
+        await import_tags(repository, file, "jsonl", add_tags=True)
+
+    taxonomy = await repository.get_taxonomy(1)
+    await repository.database.close()
+    assert "Not a tag!" not in taxonomy.ids
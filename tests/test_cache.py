@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import pytest
+from disnake.ext.commands import NoPrivateMessage
+
+from bot.cache import gateway_options, require_guild
+from bot.errors import GuildNotCachedError
+
+
+def settings(*, lean_cache: bool, members_intent: bool) -> SimpleNamespace:
+    return SimpleNamespace(lean_cache=lean_cache, members_intent=members_intent)
+
+
+def test_lean_gateway_options() -> None:
+    options = gateway_options(settings(lean_cache=True, members_intent=True))  # pyright: ignore[reportArgumentType]
+
+    assert [name for name, enabled in options["intents"] if enabled] == ["guilds", "members"]
+    assert options["member_cache_flags"].value == 0
+    assert options["max_messages"] is None
+    assert not options["chunk_guilds_at_startup"]
+
+
+def test_default_gateway_options() -> None:
+    options = gateway_options(settings(lean_cache=False, members_intent=False))  # pyright: ignore[reportArgumentType]
+
+    assert options["intents"].guild_messages
+    assert not options["intents"].members
+    assert options.keys() == {"intents"}
+
+
+def test_require_guild() -> None:
+    guild = SimpleNamespace(id=1234)
+
+    assert require_guild(SimpleNamespace(guild=guild, guild_id=1234)) is guild  # pyright: ignore[reportArgumentType]
+    with pytest.raises(GuildNotCachedError):
+        require_guild(SimpleNamespace(guild=None, guild_id=1234))  # pyright: ignore[reportArgumentType]
+    with pytest.raises(NoPrivateMessage):
+        require_guild(SimpleNamespace(guild=None, guild_id=None))  # pyright: ignore[reportArgumentType]
@@ -0,0 +1,122 @@
+import asyncio
+import json
+import logging
+import time
+from types import SimpleNamespace
+
+import aiosqlite
+import pytest
+
+from bot.__main__ import publish_health
+from bot.cluster import ClusterSupervisor, split_shards
+from bot.repositories.tags import SqliteTagRepository
+from bot.settings import Settings
+
+RESTART_DELAY = 0.3
+
+
+def test_split_shards_even() -> None:
+    assert split_shards(8, 4) == [[0, 1], [2, 3], [4, 5], [6, 7]]
+
+
+def test_split_shards_uneven() -> None:
+    ranges = split_shards(10, 4)
+    assert ranges == [[0, 1, 2], [3, 4, 5], [6, 7], [8, 9]]
+    assert sorted(shard for shard_ids in ranges for shard in shard_ids) == list(range(10))
+
+
+def test_split_shards_more_processes_than_shards() -> None:
+    assert split_shards(2, 8) == [[0], [1]]
+
+
+@pytest.mark.asyncio()
+async def test_concurrent_initialize(tmp_path) -> None:
+    # Every cluster worker initializes the repository against the same file
+    path = tmp_path / "cluster.db"
+    connections = [await aiosqlite.connect(path) for _ in range(4)]
+
+    await asyncio.gather(*(SqliteTagRepository(connection).initialize() for connection in connections))
+
+    async with connections[0].execute("PRAGMA journal_mode") as cursor:
+        (journal_mode,) = await cursor.fetchone()
+    for connection in connections:
+        await connection.close()
+    assert journal_mode == "wal"
+
+
+def exited_supervisor() -> ClusterSupervisor:
+    supervisor = ClusterSupervisor(Settings.model_construct(), shard_count=2, processes=2)
+    for worker in supervisor.workers:
+        worker.process = supervisor.context.Process(target=time.sleep, args=(0,))
+        worker.process.start()
+        worker.process.join()
+    return supervisor
+
+
+def test_wait_for_workers_wakes_up_on_exit() -> None:
+    supervisor = exited_supervisor()
+    supervisor.workers[0].restart_at = time.monotonic() + RESTART_DELAY
+
+    start = time.monotonic()
+    supervisor.wait_for_workers()
+    # The other worker exited and hasn't been noticed yet
+    assert time.monotonic() - start < RESTART_DELAY
+
+
+def test_wait_for_workers_sleeps_until_restart() -> None:
+    supervisor = exited_supervisor()
+    for worker in supervisor.workers:
+        worker.restart_at = time.monotonic() + RESTART_DELAY
+
+    start = time.monotonic()
+    supervisor.wait_for_workers()
+    # Dead workers waiting for their restart don't wake the launcher up
+    assert RESTART_DELAY / 2 < time.monotonic() - start < 1.0
+
+
+def test_health_includes_breakers(tmp_path) -> None:
+    health_path = tmp_path / "health.json"
+    supervisor = exited_supervisor()
+    supervisor.settings.cluster_health_path = str(health_path)
+    breaker = {"state": "open", "consecutive_failures": 5, "retry_after": 30.0}
+    supervisor.workers[1].report = {"ready": True, "shards": {}, "breakers": {"database": breaker}}
+
+    supervisor.publish_health()
+
+    clusters = json.loads(health_path.read_text())["clusters"]
+    assert clusters["0"]["breakers"] == {}
+    assert clusters["1"]["breakers"] == {"database": breaker}
+
+
+def test_health_includes_outbound_and_maintenance() -> None:
+    supervisor = exited_supervisor()
+    outbound = {"in_flight": 1, "queued": 0, "routes": {"GET /users/{user_id}": {"requests": 3, "p95_delay": 0.2}}}
+    maintenance = {"pending_members": 2, "pending_guilds": 0, "last_run": None, "last_backup": None}
+    supervisor.workers[0].report = {"ready": True, "shards": {}, "outbound": outbound, "maintenance": maintenance}
+
+    clusters = supervisor.health()["clusters"]
+
+    assert clusters[0]["outbound"] == outbound
+    assert clusters[0]["maintenance"] == maintenance
+    assert clusters[1]["outbound"] == {}
+
+
+@pytest.mark.asyncio()
+async def test_single_process_publishes_health(tmp_path, caplog: pytest.LogCaptureFixture) -> None:
+    health_path = tmp_path / "health.json"
+    metrics = {"ready": True, "breakers": {"ollama": {"state": "half-open"}, "database": {"state": "closed"}}}
+    bot = SimpleNamespace(
+        settings=Settings.model_construct(cluster_health_interval=0.01, cluster_health_path=str(health_path)),
+        collect_metrics=lambda: metrics,
+        logger=logging.getLogger("zz"),
+        guilds=[],
+        latency=float("nan"),
+    )
+
+    publisher = asyncio.create_task(publish_health(bot))  # pyright: ignore[reportArgumentType]
+    with caplog.at_level(logging.INFO, logger="zz"):
+        await asyncio.sleep(0.05)
+    publisher.cancel()
+
+    assert json.loads(health_path.read_text()) == metrics
+    assert "Ready, 0 guilds, latency n/a, failing fast: ollama" in caplog.messages
@@ -0,0 +1,150 @@
+import asyncio
+import sqlite3
+from collections import Counter
+from collections.abc import AsyncIterator
+from types import SimpleNamespace
+
+import aiosqlite
+import pytest
+
+from bot.maintenance import MaintenanceReport, MaintenanceScheduler, run_database_maintenance, shard_of
+from bot.repositories.tags import GreeterAssignment, SqliteTagRepository, TagRow
+
+test_guild = 1234
+other_guild = 2468
+
+
+async def create_repository(database: aiosqlite.Connection) -> SqliteTagRepository:
+    repository = SqliteTagRepository(database)
+    await repository.initialize()
+    await repository.add(test_guild, 1, ["databases", "unix"], greeter=True)
+    await repository.add(test_guild, 2, ["unix"], greeter=True)
+    await repository.add(test_guild, 3, ["unix"], greeter=False)
+    await repository.add(other_guild, 1, ["networks"], greeter=True)
+    await repository.save_assignments(test_guild, [GreeterAssignment(3, 1, 0.5), GreeterAssignment(3, 2, 1.0)])
+    return repository
+
+
+async def newcomers(count: int) -> AsyncIterator[TagRow]:
+    for user_id in range(10, 10 + count):
+        yield TagRow(test_guild, user_id, "unix", greeter=False)
+
+
+@pytest.mark.asyncio()
+async def test_remove_users() -> None:
+    async with aiosqlite.connect(":memory:") as database:
+        repository = await create_repository(database)
+        await repository.get_tag_counts(test_guild)
+
+        # User 1 has two tags and user 3 has one
+        removed_tags = 3
+        assert await repository.remove_users(test_guild, [1, 3]) == removed_tags
+
+        assert await repository.get_user_ids(test_guild) == [2]
+        assert await repository.get_assignments(test_guild) == []
+        counts = await repository.get_tag_counts(test_guild)
+        assert counts.greeters == 1
+        assert counts.tags == Counter(unix=1)
+        # Other guilds are left alone
+        assert await repository.get_tags(other_guild, 1) == ["networks"]
+
+
+@pytest.mark.asyncio()
+async def test_remove_guilds() -> None:
+    async with aiosqlite.connect(":memory:") as database:
+        repository = await create_repository(database)
+        await repository.get_tag_counts(test_guild)
+
+        # The guild's users have four tags between them
+        removed_tags = 4
+        assert await repository.remove_guilds([test_guild]) == removed_tags
+
+        assert await repository.get_guild_ids() == [other_guild]
+        assert await repository.get_assignments(test_guild) == []
+        assert (await repository.get_tag_counts(test_guild)).greeters == 0
+
+
+@pytest.mark.asyncio()
+async def test_prune_departed() -> None:
+    async with aiosqlite.connect(":memory:") as database:
+        repository = await create_repository(database)
+        bot = SimpleNamespace(
+            settings=SimpleNamespace(
+                prune_sweep_interval_hours=6.0,
+                maintenance_interval_hours=24.0,
+                backup_interval_hours=None,
+            ),
+            add_listener=lambda _: None,
+        )
+        scheduler = MaintenanceScheduler(bot)  # pyright: ignore[reportArgumentType]
+
+        member = SimpleNamespace(id=2, guild=SimpleNamespace(id=test_guild))
+        await scheduler.on_raw_member_remove(SimpleNamespace(guild_id=test_guild, user=SimpleNamespace(id=3)))  # pyright: ignore[reportArgumentType]
+        await scheduler.on_raw_member_remove(SimpleNamespace(guild_id=test_guild, user=member))  # pyright: ignore[reportArgumentType]
+        await scheduler.on_member_join(member)  # pyright: ignore[reportArgumentType]
+        await scheduler.on_guild_remove(SimpleNamespace(id=other_guild))  # pyright: ignore[reportArgumentType]
+        assert scheduler.collect_metrics()["pending_members"] == 1
+
+        await scheduler.prune_departed(repository)
+
+        assert await repository.get_guild_ids() == [test_guild]
+        assert sorted(await repository.get_user_ids(test_guild)) == [1, 2]
+        assert scheduler.collect_metrics()["pending_members"] == 0
+
+
+@pytest.mark.asyncio()
+async def test_database_maintenance(tmp_path) -> None:
+    async with aiosqlite.connect(tmp_path / "zz.db") as database:
+        repository = await create_repository(database)
+        await repository.import_rows(newcomers(2000))
+        await repository.remove_guilds([other_guild])
+        await repository.remove_users(test_guild, range(10, 2010))
+
+        report = await repository.maintain()
+
+        assert not report.converted
+        assert report.freed_pages > 0
+        async with database.execute("PRAGMA freelist_count") as cursor:
+            assert await cursor.fetchone() == (0,)
+        assert await repository.get_user_ids(test_guild)
+
+
+@pytest.mark.asyncio()
+async def test_database_maintenance_waits_for_transactions(tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    async with aiosqlite.connect(tmp_path / "zz.db") as database:
+        repository = await create_repository(database)
+        commit = database.commit
+        maintenance: list[asyncio.Task[MaintenanceReport]] = []
+
+        async def fail_once() -> None:
+            monkeypatch.setattr(database, "commit", commit)
+            # Maintenance starts while the tags are uncommitted, and mustn't commit them
+            maintenance.append(asyncio.create_task(repository.maintain()))
+            await asyncio.sleep(0.1)
+            msg = "disk I/O error"
+            raise sqlite3.OperationalError(msg)
+
+        monkeypatch.setattr(database, "commit", fail_once)
+        with pytest.raises(sqlite3.OperationalError):
+            await repository.add(test_guild, 4, ["networks"], greeter=False)
+
+        assert not (await maintenance[0]).converted
+        assert await repository.get_tags(test_guild, 4) == []
+
+
+@pytest.mark.asyncio()
+async def test_database_maintenance_converts_old_databases(tmp_path) -> None:
+    async with aiosqlite.connect(tmp_path / "zz.db") as database:
+        await database.execute("CREATE TABLE tags (guild_id INTEGER, user_id INTEGER, tag TEXT, greeter BOOLEAN)")
+        await database.commit()
+
+        report = await run_database_maintenance(database)
+
+        assert report.converted
+        async with database.execute("PRAGMA auto_vacuum") as cursor:
+            assert await cursor.fetchone() == (2,)
+
+
+def test_shard_of() -> None:
+    assert shard_of(4 << 22, 2) == 0
+    assert shard_of(5 << 22 | 1234, 2) == 1
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import sqlite3
+from collections import Counter
+from collections.abc import AsyncIterator
+from types import SimpleNamespace
+
+import aiosqlite
+import pytest
+
+from bot.exts.matching import Matching
+from bot.repositories.tags import GreeterAssignment, SqliteTagRepository, TagRow, jaccard
+
+# Matching needs NumPy, which is an optional dependency
+matching = pytest.importorskip("bot.matching")
+
+test_guild = 1234
+other_guild = 2468
+
+
+async def rows_from(xs: list[TagRow]) -> AsyncIterator[TagRow]:
+    for row in xs:
+        yield row
+
+
+async def create_repository(rows: list[TagRow]) -> SqliteTagRepository:
+    repository = SqliteTagRepository(await aiosqlite.connect(":memory:"))
+    await repository.initialize()
+    await repository.import_rows(rows_from(rows))
+    return repository
+
+
+@pytest.mark.asyncio()
+async def test_scores_are_jaccard() -> None:
+    # user 1 and 2 are newcomers, users 3 and 4 are greeters
+    tags = {1: {"a", "b"}, 2: {"c"}, 3: {"a", "b", "c"}, 4: {"b", "d"}}
+    last_newcomer = 2
+    rows = [
+        TagRow(test_guild, user_id, tag, user_id > last_newcomer) for user_id in tags for tag in sorted(tags[user_id])
+    ]
+    repository = await create_repository(rows)
+
+    matrix = await matching.load_tag_matrix(repository, test_guild)
+    assignments = matching.match_newcomers(matrix, greeters_per_newcomer=2, greeter_capacity=2)
+    await repository.database.close()
+
+    for newcomer_id, greeter_id, score in assignments:
+        assert score == pytest.approx(jaccard(tags[newcomer_id], tags[greeter_id]))
+    # user 2 shares no tags with user 4, so they aren't paired
+    assert sorted((a.newcomer_id, a.greeter_id) for a in assignments) == [(1, 3), (1, 4), (2, 3)]
+
+
+@pytest.mark.asyncio()
+async def test_greeter_capacity_spreads_load() -> None:
+    # Greeter 10 is everyone's best match, but can only take two newcomers
+    rows = [TagRow(test_guild, 10, tag, greeter=True) for tag in "ab"]
+    rows += [TagRow(test_guild, 11, "a", greeter=True)]
+    newcomers = 4
+    rows += [TagRow(test_guild, user_id, tag, greeter=False) for user_id in range(1, newcomers + 1) for tag in "ab"]
+    repository = await create_repository(rows)
+
+    matrix = await matching.load_tag_matrix(repository, test_guild)
+    assignments = matching.match_newcomers(matrix, greeters_per_newcomer=1, greeter_capacity=2)
+    await repository.database.close()
+
+    load = Counter(assignment.greeter_id for assignment in assignments)
+    assert load == {10: 2, 11: 2}
+    assert len({assignment.newcomer_id for assignment in assignments}) == newcomers
+
+
+@pytest.mark.asyncio()
+async def test_small_blocks_give_same_result() -> None:
+    rows = [
+        TagRow(test_guild, user_id, tag, user_id % 3 == 0)
+        for user_id in range(1, 40)
+        for tag in "abcdef"[user_id % 4 : user_id % 4 + 3]
+    ]
+    repository = await create_repository(rows)
+
+    matrix = await matching.load_tag_matrix(repository, test_guild)
+    whole = matching.match_newcomers(matrix, greeters_per_newcomer=2)
+    # Only a single newcomer fits in every block
+    blocked = matching.match_newcomers(matrix, greeters_per_newcomer=2, block_memory=1)
+    await repository.database.close()
+
+    assert sorted(whole) == sorted(blocked)
+
+
+@pytest.mark.asyncio()
+async def test_save_assignments_replaces_guild() -> None:
+    repository = await create_repository([])
+
+    await repository.save_assignments(test_guild, [GreeterAssignment(1, 2, 0.5)])
+    await repository.save_assignments(other_guild, [GreeterAssignment(3, 4, 1.0)])
+    await repository.save_assignments(test_guild, [GreeterAssignment(1, 5, 0.25), GreeterAssignment(1, 6, 0.75)])
+
+    test_assignments = await repository.get_assignments(test_guild)
+    other_assignments = await repository.get_assignments(other_guild)
+    await repository.database.close()
+
+    assert test_assignments == [GreeterAssignment(1, 6, 0.75), GreeterAssignment(1, 5, 0.25)]
+    assert other_assignments == [GreeterAssignment(3, 4, 1.0)]
+
+
+@pytest.mark.asyncio()
+async def test_get_newcomer_assignments() -> None:
+    repository = await create_repository([])
+    await repository.save_assignments(test_guild, [GreeterAssignment(1, 2, 0.5), GreeterAssignment(3, 4, 1.0)])
+
+    assignments = await repository.get_assignments(test_guild, newcomer_id=3)
+    missing = await repository.get_assignments(test_guild, newcomer_id=2)
+    await repository.database.close()
+
+    assert assignments == [GreeterAssignment(3, 4, 1.0)]
+    assert missing == []
+
+
+@pytest.mark.asyncio()
+async def test_failing_guild_doesnt_stop_the_job(caplog: pytest.LogCaptureFixture) -> None:
+    matched: list[int] = []
+
+    class FlakyMatching(Matching):
+        async def match_guild(self, _tag_repo: object, guild_id: int) -> None:
+            if guild_id == test_guild:
+                message = "database is locked"
+                raise sqlite3.OperationalError(message)
+            matched.append(guild_id)
+
+    # The cog isn't constructed, as that starts the job
+    cog = FlakyMatching.__new__(FlakyMatching)
+    guilds = [SimpleNamespace(id=test_guild), SimpleNamespace(id=other_guild)]
+    cog.bot = SimpleNamespace(tag_repository=object(), guilds=guilds, logger=logging.getLogger("zz"))  # pyright: ignore[reportAttributeAccessIssue]
+
+    await Matching.match_guilds.coro(cog)
+
+    assert matched == [other_guild]
+    assert f"guild {test_guild}" in caplog.text
+
+
+@pytest.mark.asyncio()
+async def test_first_run_waits_after_ready() -> None:
+    events: list[str] = []
+
+    async def wait_until_ready() -> None:
+        events.append("ready")
+
+    cog = Matching.__new__(Matching)
+    cog.bot = SimpleNamespace(  # pyright: ignore[reportAttributeAccessIssue]
+        wait_until_ready=wait_until_ready,
+        settings=SimpleNamespace(matching_start_delay=0.05),
+    )
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await Matching.before_match_guilds(cog)
+
+    assert events == ["ready"]
+    assert loop.time() - start >= cog.bot.settings.matching_start_delay
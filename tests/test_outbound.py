@@ -0,0 +1,222 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiohttp import web
+from disnake.http import HTTPClient, Route
+
+from bot.outbound import OutboundScheduler, background
+
+route = "GET /guilds/{guild_id}/members/{user_id}"
+# How long rate limited requests are told to wait, in seconds
+retry_after = 0.05
+
+
+async def record(sent: list[str], name: str, delay: float = 0.0) -> str:
+    await asyncio.sleep(delay)
+    sent.append(name)
+    return name
+
+
+@pytest.mark.asyncio()
+async def test_interactive_requests_go_first() -> None:
+    scheduler = OutboundScheduler(max_in_flight=1)
+    sent: list[str] = []
+
+    blocker = asyncio.create_task(scheduler.submit(route, "a", lambda: record(sent, "blocker", 0.01)))
+    await asyncio.sleep(0)
+
+    async def submit_background(name: str) -> str:
+        with background():
+            return await scheduler.submit(route, name, lambda: record(sent, name))
+
+    queued = [asyncio.create_task(submit_background(f"background{index}")) for index in range(3)]
+    await asyncio.sleep(0)
+    queued.append(asyncio.create_task(scheduler.submit(route, "b", lambda: record(sent, "interactive"))))
+
+    await asyncio.gather(blocker, *queued)
+    assert sent == ["blocker", "interactive", "background0", "background1", "background2"]
+
+
+@pytest.mark.asyncio()
+async def test_same_bucket_is_sent_one_at_a_time() -> None:
+    scheduler = OutboundScheduler(max_in_flight=4)
+    in_flight = 0
+    most_in_flight = 0
+
+    async def send() -> None:
+        nonlocal in_flight, most_in_flight
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+
+    requests = 5
+    await asyncio.gather(*(scheduler.submit(route, "bucket", send) for _ in range(requests)))
+
+    assert most_in_flight == 1
+    assert scheduler.collect_metrics()["routes"][route]["requests"] == requests
+
+
+@pytest.mark.asyncio()
+async def test_bucket_sends_its_remaining_requests_at_once() -> None:
+    scheduler = OutboundScheduler(max_in_flight=8)
+    remaining = 3
+    headers = {"X-RateLimit-Limit": "5", "X-RateLimit-Remaining": str(remaining), "X-RateLimit-Reset-After": "60"}
+    scheduler.observe(route, "bucket", 200, headers)
+    in_flight = 0
+    most_in_flight = 0
+
+    async def send() -> None:
+        nonlocal in_flight, most_in_flight
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        await asyncio.sleep(0.001)
+        in_flight -= 1
+
+    await asyncio.gather(*(scheduler.submit(route, "bucket", send) for _ in range(remaining + 2)))
+
+    assert most_in_flight == remaining
+
+
+@pytest.mark.asyncio()
+async def test_routes_in_the_same_bucket_share_its_limit() -> None:
+    scheduler = OutboundScheduler(max_in_flight=4)
+    roles = "PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}"
+    scheduler.observe(roles, "guild", 200, {"X-RateLimit-Bucket": "members", "X-RateLimit-Remaining": "1"})
+    headers = {
+        "X-RateLimit-Bucket": "members",
+        "X-RateLimit-Remaining": "0",
+        "X-RateLimit-Reset-After": str(retry_after),
+    }
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    scheduler.observe(route, "guild", 200, headers)
+
+    await scheduler.submit(roles, "guild", lambda: record([], "role"))
+
+    assert loop.time() - start >= retry_after
+    # Other guilds have buckets of their own
+    assert scheduler.bucket(roles, "other guild") is not scheduler.bucket(roles, "guild")
+
+
+@pytest.mark.asyncio()
+async def test_identical_requests_are_merged() -> None:
+    scheduler = OutboundScheduler(max_in_flight=4)
+    sent: list[str] = []
+
+    requests = 3
+    results = await asyncio.gather(
+        *(
+            scheduler.submit(route, "bucket", lambda: record(sent, "member", 0.01), key="member")
+            for _ in range(requests)
+        ),
+    )
+
+    assert results == ["member"] * requests
+    assert sent == ["member"]
+    # Only the first one was sent
+    assert scheduler.routes[route].merged == requests - 1
+
+
+@pytest.mark.asyncio()
+async def test_exhausted_bucket_waits_for_reset() -> None:
+    scheduler = OutboundScheduler(max_in_flight=4)
+    sent: list[str] = []
+
+    await scheduler.submit(route, "bucket", lambda: record(sent, "first"))
+    headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": str(retry_after)}
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    scheduler.observe(route, "bucket", 200, headers)
+
+    other = asyncio.create_task(scheduler.submit(route, "other", lambda: record(sent, "other bucket")))
+    await scheduler.submit(route, "bucket", lambda: record(sent, "second"))
+    await other
+
+    assert loop.time() - start >= retry_after
+    assert sent == ["first", "other bucket", "second"]
+    assert scheduler.routes[route].to_dict()["max_delay"] >= retry_after
+
+
+@pytest.mark.asyncio()
+async def test_global_rate_limit_holds_every_bucket() -> None:
+    scheduler = OutboundScheduler(max_in_flight=4)
+    headers = {"Retry-After": str(retry_after), "X-RateLimit-Global": "true"}
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    scheduler.observe(route, "a", 429, headers)
+
+    await scheduler.submit(route, "b", lambda: record([], "b"))
+
+    assert loop.time() - start >= retry_after
+    assert scheduler.routes[route].rate_limited == 1
+
+
+@pytest.mark.asyncio()
+async def test_install_merges_gets_only() -> None:
+    scheduler = OutboundScheduler(max_in_flight=4)
+    sent: list[str] = []
+
+    async def request(route: Route, **_kwargs: object) -> str:
+        return await record(sent, route.method, 0.01)
+
+    http = SimpleNamespace(request=request)
+    scheduler.install(http)  # pyright: ignore[reportArgumentType]
+
+    member = Route("GET", "/guilds/{guild_id}/members/{user_id}", guild_id=1, user_id=2)
+    roles = Route("PUT", "/guilds/{guild_id}/members/{user_id}/roles/{role_id}", guild_id=1, user_id=2, role_id=3)
+    await asyncio.gather(http.request(member), http.request(member), http.request(roles), http.request(roles))
+
+    assert sorted(sent) == ["GET", "PUT", "PUT"]
+
+
+@pytest.mark.asyncio()
+async def test_install_reads_disnake_responses(monkeypatch: pytest.MonkeyPatch) -> None:
+    # The scheduler reads the rate limit headers through disnake's private session
+    remaining = 2
+    in_flight = 0
+    most_in_flight = 0
+
+    async def get_user(_request: web.Request) -> web.Response:
+        return web.json_response({"id": "1", "username": "zz"})
+
+    async def get_member(request: web.Request) -> web.Response:
+        nonlocal in_flight, most_in_flight
+        in_flight += 1
+        most_in_flight = max(most_in_flight, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        headers = {
+            "X-RateLimit-Bucket": "members",
+            "X-RateLimit-Limit": "3",
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset-After": "0.05",
+        }
+        return web.json_response({"user": {"id": request.match_info["user_id"]}}, headers=headers)
+
+    app = web.Application()
+    app.router.add_get("/api/v10/users/@me", get_user)
+    app.router.add_get("/api/v10/guilds/{guild_id}/members/{user_id}", get_member)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    _, port = runner.addresses[0]
+    monkeypatch.setattr(Route, "BASE", f"http://127.0.0.1:{port}/api/v10")
+
+    http = HTTPClient(loop=asyncio.get_running_loop())
+    scheduler = OutboundScheduler(max_in_flight=8)
+    scheduler.install(http)
+    try:
+        await http.static_login("token")
+        await http.request(Route("GET", "/guilds/{guild_id}/members/{user_id}", guild_id=1, user_id=1))
+        members = (Route("GET", "/guilds/{guild_id}/members/{user_id}", guild_id=1, user_id=i) for i in range(2, 6))
+        await asyncio.gather(*(http.request(member) for member in members))
+    finally:
+        await http.close()
+        await runner.cleanup()
+
+    assert scheduler.route_buckets == {route: "members"}
+    # disnake would send them one at a time
+    assert most_in_flight == remaining
@@ -0,0 +1,64 @@
+import argparse
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.load import run
+from bot.recording import TrafficEvent, describe_command, read_events, write_event
+
+
+def option(name: str, value: object = None, options: list | None = None) -> SimpleNamespace:
+    return SimpleNamespace(name=name, value=value, options=options or [])
+
+
+def test_describe_command() -> None:
+    member = SimpleNamespace(id=1234)
+    data = SimpleNamespace(name="tag", options=[option("info", options=[option("member", member)])])
+
+    assert describe_command(data) == ("tag info", {"member": 1234})  # pyright: ignore[reportArgumentType]
+    assert describe_command(SimpleNamespace(name="help", options=[option("question", "Hi?")])) == (  # pyright: ignore[reportArgumentType]
+        "help",
+        {"question": "Hi?"},
+    )
+
+
+def test_read_written_events(tmp_path) -> None:
+    events = [
+        TrafficEvent(0.5, 1, 2, "command", "tag add"),
+        TrafficEvent(1.25, 1, 2, "select", "Choose your tags", {"values": ["unix", "rust"]}),
+    ]
+    path = tmp_path / "traffic.jsonl"
+    with path.open("w") as file:
+        for event in events:
+            write_event(file, event)
+
+    assert list(read_events(path)) == events
+
+
+@pytest.mark.asyncio()
+async def test_replay_generated_traffic(tmp_path) -> None:
+    arguments = argparse.Namespace(
+        database=None,
+        members=200,
+        skew=1.0,
+        traffic=None,
+        events=100,
+        rate=1000.0,
+        save_traffic=str(tmp_path / "traffic.jsonl"),
+        concurrency=5,
+        pace=False,
+        speed=1.0,
+        discord_latency=0.0,
+        ollama_latency=0.0,
+        ollama_tokens_per_second=1000.0,
+        ollama_tokens=3,
+        seed=0,
+    )
+
+    result = await run(arguments)
+
+    assert result["events"] == len(list(read_events(tmp_path / "traffic.jsonl")))
+    commands = result["commands"]
+    assert commands["tag add"]["ok"] == commands["tag add"]["count"] > 0
+    assert commands["select: Choose your tags"]["ok"] > 0
+    assert all(stats.get("skipped", 0) == 0 for stats in commands.values())
@@ -0,0 +1,244 @@
+import asyncio
+import sqlite3
+from collections import Counter
+from collections.abc import AsyncIterator
+from typing import Any
+
+import aiosqlite
+import pytest
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
+from bot.repositories.memory import MemoryTagRepository
+from bot.repositories.tags import (
+    DEFAULT_TAGS,
+    DEFAULT_TAXONOMY,
+    GreeterAssignment,
+    SqliteTagRepository,
+    TagCounts,
+    TagRepository,
+    TagRow,
+)
+
+test_guild = 1234
+other_guild = 2468
+user_id_range = range(1, 7)
+# Enough concurrent writers for their statements to interleave on the connection
+concurrent_users = 200
+
+guild_ids = st.sampled_from([test_guild, other_guild])
+user_ids = st.sampled_from(user_id_range)
+# A few tags, so that users often share some, and some that aren't default tags
+tags = st.sampled_from([*DEFAULT_TAGS[:5], "rust", "zig"])
+descriptions = st.sampled_from([None, "Systems", "Scripts"])
+
+operations = st.one_of(
+    st.tuples(st.just("add"), st.tuples(guild_ids, user_ids, st.lists(tags, max_size=3), st.booleans())),
+    st.tuples(st.just("remove_tag"), st.tuples(guild_ids, user_ids, tags)),
+    st.tuples(st.just("update_greeter"), st.tuples(guild_ids, user_ids, st.booleans())),
+    st.tuples(
+        st.just("import_rows"),
+        st.tuples(st.lists(st.builds(TagRow, guild_ids, user_ids, tags, st.booleans()), max_size=6)),
+    ),
+    st.tuples(
+        st.just("save_assignments"),
+        st.tuples(
+            guild_ids,
+            st.lists(
+                st.builds(GreeterAssignment, user_ids, user_ids, st.floats(0, 1)),
+                max_size=4,
+                unique_by=lambda assignment: (assignment.newcomer_id, assignment.greeter_id),
+            ),
+        ),
+    ),
+    st.tuples(st.just("define_tag"), st.tuples(guild_ids, tags, descriptions)),
+    st.tuples(st.just("rename_tag"), st.tuples(guild_ids, tags, tags)),
+    st.tuples(st.just("delete_tag"), st.tuples(guild_ids, tags)),
+    st.tuples(st.just("remove_users"), st.tuples(guild_ids, st.lists(user_ids, max_size=3))),
+    st.tuples(st.just("remove_guilds"), st.tuples(st.lists(guild_ids, max_size=2))),
+)
+
+
+async def stream(rows: list[TagRow]) -> AsyncIterator[TagRow]:
+    for row in rows:
+        yield row
+
+
+async def apply(repository: TagRepository, name: str, arguments: tuple[Any, ...]) -> object:
+    if name == "import_rows":
+        return await repository.import_rows(stream(*arguments))
+    return await getattr(repository, name)(*arguments)
+
+
+async def observe(repository: TagRepository) -> dict[str, object]:
+    """Read everything a repository can tell about its guilds."""
+    observed: dict[str, object] = {
+        "rows": [row async for row in repository.export_rows()],
+        "guild_ids": sorted(await repository.get_guild_ids()),
+    }
+    for guild_id in (test_guild, other_guild):
+        counts = await repository.get_tag_counts(guild_id)
+        observed[f"{guild_id} counts"] = (counts.greeters, +counts.tags)
+        observed[f"{guild_id} user ids"] = sorted(await repository.get_user_ids(guild_id))
+        observed[f"{guild_id} assignments"] = await repository.get_assignments(guild_id)
+        observed[f"{guild_id} taxonomy"] = await repository.get_taxonomy(guild_id)
+
+        for user_id in user_id_range:
+            ranking = await repository.rank_friend_suggestions(guild_id, user_id)
+            observed[f"{guild_id} {user_id}"] = (
+                sorted(await repository.get_tags(guild_id, user_id)),
+                await repository.get_greeter(guild_id, user_id),
+                await repository.get_friend_suggestions(guild_id, user_id),
+                ranking.take(len(ranking)),
+                await repository.get_assignments(guild_id, user_id),
+            )
+    return observed
+
+
+@pytest.mark.asyncio()
+@pytest.mark.parametrize("scoring", ["jaccard", "idf"])
+@settings(deadline=None)
+@given(st.lists(operations, max_size=12))
+async def test_memory_repository_matches_sqlite(scoring, steps: list[tuple[str, tuple[Any, ...]]]) -> None:
+    memory = MemoryTagRepository(scoring=scoring)
+    async with aiosqlite.connect(":memory:") as database:
+        sqlite = SqliteTagRepository(database, scoring=scoring)
+        await sqlite.initialize()
+        # Load the cached counts first, so they're kept up to date rather than read back
+        await sqlite.get_tag_counts(test_guild)
+
+        for name, arguments in steps:
+            assert await apply(memory, name, arguments) == await apply(sqlite, name, arguments), name
+
+        assert await observe(memory) == await observe(sqlite)
+
+
+@pytest.mark.asyncio()
+async def test_greeter_with_several_tags() -> None:
+    async with aiosqlite.connect(":memory:") as database:
+        sqlite = SqliteTagRepository(database)
+        await sqlite.initialize()
+
+        for repository in (sqlite, MemoryTagRepository()):
+            await repository.add(test_guild, 1, ["unix", "networks"], greeter=True)
+            await repository.add(test_guild, 2, ["unix", "networks"], greeter=False)
+
+            assert await repository.get_greeter(test_guild, 1)
+            assert not await repository.get_greeter(test_guild, 2)
+
+
+@pytest.mark.asyncio()
+async def test_tags_stored_by_name_are_interned() -> None:
+    async with aiosqlite.connect(":memory:") as database:
+        # The schema from before taxonomies
+        await database.execute(
+            """
+            CREATE TABLE tags (
+                guild_id INTEGER NOT NULL,
+                user_id INTEGER NOT NULL,
+                tag TEXT NOT NULL,
+                greeter BOOLEAN,
+                PRIMARY KEY (guild_id, user_id, tag)
+            )
+            """,
+        )
+        await database.execute("CREATE TABLE tag_counts (guild_id INTEGER, tag TEXT, greeters INTEGER)")
+        await database.executemany(
+            "INSERT INTO tags VALUES (?, ?, ?, ?)",
+            [
+                (test_guild, 1, "unix", True),
+                (test_guild, 1, "rust", True),
+                (test_guild, 2, "unix", False),
+                (other_guild, 3, "networks", True),
+            ],
+        )
+        await database.commit()
+
+        sqlite = SqliteTagRepository(database)
+        await sqlite.initialize()
+
+        assert await sqlite.get_tags(test_guild, 1) == ["rust", "unix"]
+        assert (await sqlite.get_taxonomy(test_guild)).ids["rust"] == len(DEFAULT_TAGS) + 1
+        # Guilds with only default tags keep the default taxonomy
+        assert await sqlite.get_taxonomy(other_guild) is DEFAULT_TAXONOMY
+        assert await sqlite.get_tags(other_guild, 3) == ["networks"]
+
+        counts = await sqlite.get_tag_counts(test_guild)
+        assert counts.greeters == 1
+        assert +counts.tags == {"rust": 1, "unix": 1}
+
+
+@pytest.mark.asyncio()
+async def test_concurrent_writes_share_the_connection(tmp_path) -> None:
+    async with aiosqlite.connect(tmp_path / "zz.db") as database:
+        sqlite = SqliteTagRepository(database)
+        await sqlite.initialize()
+        await sqlite.get_tag_counts(test_guild)
+
+        async def write(user_id: int, round_: int) -> None:
+            tags = list(DEFAULT_TAGS[user_id % 5 : user_id % 5 + 3])
+            await sqlite.add(test_guild, user_id, tags, greeter=(user_id + round_) % 2 == 0)
+            await sqlite.remove_tag(test_guild, user_id, tags[round_ % len(tags)])
+            await sqlite.update_greeter(test_guild, user_id, (user_id + round_) % 3 == 0)
+            await sqlite.remove_users(test_guild, [user_id + round_ + 1])
+
+        for round_ in range(3):
+            await asyncio.gather(*(write(user_id, round_) for user_id in range(concurrent_users)))
+
+        # Every write was committed whole, so the counts add up
+        greeter_rows = [row async for row in sqlite.export_rows(test_guild) if row.greeter]
+        counts = await sqlite.get_tag_counts(test_guild)
+        assert counts.greeters == len({row.user_id for row in greeter_rows})
+        assert +counts.tags == Counter(row.tag for row in greeter_rows)
+
+
+@pytest.mark.asyncio()
+async def test_rolled_back_counts_arent_cached(tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    async with aiosqlite.connect(tmp_path / "zz.db") as database:
+        sqlite = SqliteTagRepository(database)
+        await sqlite.initialize()
+        reads: list[asyncio.Task[TagCounts]] = []
+
+        async def fail() -> None:
+            # The counts are read after the tags were added, but before they're rolled back
+            reads.append(asyncio.create_task(sqlite.get_tag_counts(test_guild)))
+            await asyncio.sleep(0.1)
+            msg = "disk I/O error"
+            raise sqlite3.OperationalError(msg)
+
+        monkeypatch.setattr(database, "commit", fail)
+        with pytest.raises(sqlite3.OperationalError):
+            await sqlite.add(test_guild, 1, ["unix", "networks"], greeter=True)
+
+        assert await reads[0] == TagCounts()
+        assert await sqlite.get_tag_counts(test_guild) == TagCounts()
+
+
+@pytest.mark.asyncio()
+async def test_export_skips_uncommitted_writes(tmp_path, monkeypatch: pytest.MonkeyPatch) -> None:
+    async with aiosqlite.connect(tmp_path / "zz.db") as database:
+        sqlite = SqliteTagRepository(database)
+        await sqlite.initialize()
+        for user_id in user_id_range:
+            await sqlite.add(test_guild, user_id, ["unix", "networks"], greeter=True)
+
+        async def fail_later() -> None:
+            # The export reads on while the update is uncommitted
+            await asyncio.sleep(0.1)
+            msg = "disk I/O error"
+            raise sqlite3.OperationalError(msg)
+
+        monkeypatch.setattr(database, "commit", fail_later)
+        exported: list[TagRow] = []
+        update: asyncio.Task[None] | None = None
+        async for row in sqlite.export_rows(test_guild, chunk_size=1):
+            exported.append(row)
+            if update is None:
+                update = asyncio.create_task(sqlite.update_greeter(test_guild, user_id_range[-1], greeter=False))
+                await asyncio.sleep(0.05)
+
+        with pytest.raises(sqlite3.OperationalError):
+            await update  # pyright: ignore[reportGeneralTypeIssues]
+        assert exported == [
+            TagRow(test_guild, user_id, tag, greeter=True) for user_id in user_id_range for tag in ("networks", "unix")
+        ]
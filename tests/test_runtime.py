@@ -0,0 +1,51 @@
+import json
+
+import disnake.utils
+import pytest
+
+from bot import runtime
+
+
+@pytest.fixture(autouse=True)
+def _restore_codec(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Tests may replace disnake's codec, so have it put back afterwards
+    codec = vars(disnake.utils)
+    monkeypatch.setitem(codec, "_from_json", codec["_from_json"])
+    monkeypatch.setitem(codec, "_to_json", codec["_to_json"])
+
+
+def test_run_falls_back_without_dependencies(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(runtime, "find_spec", lambda _name: None)
+    monkeypatch.setitem(vars(disnake.utils), "_from_json", json.loads)
+    runtime_info: list[dict[str, str]] = []
+
+    async def main() -> None:
+        runtime_info.append(runtime.describe_runtime())
+
+    runtime.run(main(), fast=True)
+
+    assert runtime_info[0]["event_loop"].startswith("asyncio")
+    assert runtime_info[0]["json"] == "json"
+
+
+def test_fast_json_round_trips() -> None:
+    pytest.importorskip("orjson")
+    codec = vars(disnake.utils)
+
+    assert runtime.use_fast_json()
+    payload = codec["_to_json"]({"t": "READY", "d": [1]})
+    assert isinstance(payload, str)
+    assert codec["_from_json"](payload) == {"t": "READY", "d": [1]}
+
+
+def test_run_uses_uvloop() -> None:
+    pytest.importorskip("uvloop")
+    runtime_info: list[dict[str, str]] = []
+
+    async def main() -> None:
+        runtime_info.append(runtime.describe_runtime())
+
+    runtime.run(main(), fast=True)
+
+    assert runtime_info[0]["event_loop"].startswith("uvloop")
+    assert runtime_info[0]["json"] == "orjson"
@@ -0,0 +1,155 @@
+from types import SimpleNamespace
+from typing import Any
+
+import pytest
+from disnake import NotFound
+
+from bot.errors import DependencyUnavailableError
+from bot.exts import tags
+from bot.exts.greetings import GREETER_ROLE_NAME
+from bot.exts.tags import SuggestionCache, SuggestionsView
+from bot.repositories.tags import FriendRanking
+
+test_guild = 1234
+page_size = 2
+
+
+class FakeGuild:
+    """A guild where every member is cached, and the others have left."""
+
+    def __init__(self, greeter_ids: set[int], member_ids: set[int]) -> None:
+        greeter_role = SimpleNamespace(name=GREETER_ROLE_NAME)
+        self.members = {
+            user_id: SimpleNamespace(mention=f"<@{user_id}>", roles=[greeter_role] if user_id in greeter_ids else [])
+            for user_id in member_ids | greeter_ids
+        }
+
+    def get_member(self, user_id: int) -> SimpleNamespace | None:
+        return self.members.get(user_id)
+
+    async def fetch_member(self, _user_id: int) -> SimpleNamespace:
+        raise NotFound(SimpleNamespace(status=404, reason="Not Found"), "Unknown Member")  # pyright: ignore[reportArgumentType]
+
+
+def suggestions_view(
+    greeter_ids: set[int],
+    member_ids: set[int],
+    suggested_ids: range,
+    assigned_ids: list[int] | None = None,
+) -> SuggestionsView:
+    ranking = FriendRanking({user_id: {"python"} for user_id in suggested_ids}, ["python"])
+    guild = FakeGuild(greeter_ids, member_ids)
+    view = SuggestionsView(guild, ranking, page_size=page_size, timeout=60)  # pyright: ignore[reportArgumentType]
+    view.assigned_ids = assigned_ids or []
+    return view
+
+
+@pytest.fixture()
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    now = [0.0]
+    monkeypatch.setattr(tags.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_cache_hit(clock: list[float]) -> None:
+    cache = SuggestionCache(ttl=10)
+    ranking = FriendRanking({2: {"a"}}, ["a"])
+    cache.put(test_guild, 1, ranking)
+
+    clock[0] = 9
+    assert cache.get(test_guild, 1) is ranking
+    assert cache.get(test_guild, 2) is None
+
+
+def test_cache_expiry(clock: list[float]) -> None:
+    cache = SuggestionCache(ttl=10)
+    cache.put(test_guild, 1, FriendRanking({}, []))
+    clock[0] = 5
+    cache.put(test_guild, 2, FriendRanking({}, []))
+
+    clock[0] = 11
+    assert cache.get(test_guild, 1) is None
+    assert cache.get(test_guild, 2) is not None
+
+
+def test_cache_invalidate() -> None:
+    cache = SuggestionCache(ttl=10)
+    cache.put(test_guild, 1, FriendRanking({}, []))
+    cache.invalidate(test_guild, 1)
+    assert cache.get(test_guild, 1) is None
+
+
+def test_cache_invalidate_guild() -> None:
+    cache = SuggestionCache(ttl=10)
+    ranking = FriendRanking({}, [])
+    cache.put(test_guild, 1, ranking)
+    cache.put(test_guild, 2, ranking)
+    cache.put(2468, 1, ranking)
+
+    cache.invalidate_guild(test_guild)
+
+    assert cache.get(test_guild, 1) is None
+    assert cache.get(test_guild, 2) is None
+    assert cache.get(2468, 1) is ranking
+
+
+@pytest.mark.asyncio()
+async def test_suggestions_skip_non_greeters_before_paging() -> None:
+    # Every other suggestion isn't a greeter, and some left the guild
+    view = suggestions_view({2, 4, 6}, {1, 3}, range(1, 8))
+
+    first = await view.render()
+    assert first is not None
+    assert first.description is not None
+    assert "<@6>" in first.description
+    assert "<@4>" in first.description
+    assert not view.next_page.disabled
+
+    view.cursor = 1
+    last = await view.render()
+    assert last is not None
+    assert last.description is not None
+    assert "<@2>" in last.description
+    assert last.footer.text == "Page 2/2"
+    assert view.next_page.disabled
+
+
+@pytest.mark.asyncio()
+async def test_suggestions_without_greeters() -> None:
+    view = suggestions_view(set(), {1, 2}, range(1, 4))
+
+    assert await view.render() is None
+
+
+@pytest.mark.asyncio()
+async def test_suggestions_show_assigned_greeters() -> None:
+    # Greeter 9 was assigned, but has left the guild since
+    view = suggestions_view({2, 4}, set(), range(1, 5), assigned_ids=[4, 9])
+
+    first = await view.render()
+    assert first is not None
+    (field,) = first.fields
+    assert field.value == "<@4>"
+
+
+class FakeInteraction:
+    def __init__(self) -> None:
+        self.sent: list[dict[str, Any]] = []
+
+    async def send(self, **kwargs: Any) -> None:  # noqa: ANN401
+        self.sent.append(kwargs)
+
+
+@pytest.mark.asyncio()
+async def test_suggestions_explain_unavailable_database() -> None:
+    view = suggestions_view({2}, set(), range(1, 3))
+    interaction = FakeInteraction()
+
+    error = DependencyUnavailableError("database", retry_after=12.5)
+    await view.on_error(error, view.next_page, interaction)  # pyright: ignore[reportArgumentType]
+
+    (sent,) = interaction.sent
+    assert sent["embed"].description == "Tags are temporarily unavailable."
+    assert sent["embed"].footer.text == "💡 Try again in 13 seconds."
+    assert sent["components"] == []
+    assert sent["ephemeral"]
@@ -0,0 +1,42 @@
+import pytest
+
+from bot.exts.tags import MAX_GUILD_TAGS, OPTIONS_PER_MENU, DropdownView, TagMenuCache, TagMenus
+from bot.repositories.tags import DEFAULT_TAXONOMY
+
+test_guild = 1234
+
+
+def test_default_tags_fit_one_menu() -> None:
+    menus = TagMenus(DEFAULT_TAXONOMY)
+
+    assert len(menus.pages) == 1
+    labels = [option.label for option in menus.pages[0]]
+    assert labels == sorted(DEFAULT_TAXONOMY.ids)
+    assert {option.value for option in menus.pages[0]} == {str(tag_id) for tag_id in DEFAULT_TAXONOMY.names}
+
+
+@pytest.mark.asyncio()
+async def test_tags_are_paged_across_menus() -> None:
+    taxonomy = DEFAULT_TAXONOMY.with_tags(f"topic-{index:03}" for index in range(MAX_GUILD_TAGS))
+    menus = TagMenus(taxonomy)
+
+    assert [len(page) for page in menus.pages] == [OPTIONS_PER_MENU] * 5
+    view = DropdownView(None, None, menus)  # pyright: ignore[reportArgumentType]
+    placeholders = [item.placeholder for item in view.children]  # pyright: ignore[reportAttributeAccessIssue]
+    assert placeholders[0] == "Choose your tags (algos-and-data-structs to topic-008)"
+    assert len(set(placeholders)) == len(placeholders)
+
+
+def test_menus_are_rebuilt_when_the_taxonomy_changes() -> None:
+    cache = TagMenuCache()
+    assert cache.get(test_guild, DEFAULT_TAXONOMY) is cache.get(2468, DEFAULT_TAXONOMY)
+
+    taxonomy = DEFAULT_TAXONOMY.with_definition("rust", "Crabs")
+    menus = cache.get(test_guild, taxonomy)
+    assert cache.get(test_guild, taxonomy) is menus
+
+    renamed = taxonomy.renamed("rust", "ferris")
+    assert renamed is not None
+    rebuilt = cache.get(test_guild, renamed)
+    assert rebuilt is not menus
+    assert "ferris" in (option.label for option in rebuilt.pages[0])
@@ -1,11 +1,22 @@
+from collections.abc import AsyncIterator
 from random import sample
 from string import ascii_lowercase
 
 import aiosqlite
 import pytest
+import pytest_asyncio
 from hypothesis import given
 from hypothesis import strategies as st
-from repositories.tags import SqliteTagRepository, group_friends, suggest_friends
+from repositories.memory import MemoryTagRepository
+from repositories.tags import (
+    FriendRanking,
+    SqliteTagRepository,
+    TagCounts,
+    TagRepository,
+    group_friends,
+    idf_weighted,
+    suggest_friends,
+)
 
 characters = st.sampled_from(ascii_lowercase)
 test_guild = 1234
@@ -15,6 +26,19 @@ not_greeter = False
 # more likely to be desired duplicates than with st.text()
 
 
+@pytest_asyncio.fixture(params=["sqlite", "memory"])
+async def repos(request: pytest.FixtureRequest) -> AsyncIterator[TagRepository]:
+    """A fresh, empty repository of each kind."""
+    if request.param == "memory":
+        yield MemoryTagRepository()
+        return
+
+    async with aiosqlite.connect(":memory:") as database_connection:
+        repository = SqliteTagRepository(database_connection)
+        await repository.initialize()
+        yield repository
+
+
 @pytest.mark.asyncio()
 async def test_suggested_friends_basic_1() -> None:
     friends = [(1, "a"), (2, "a"), (2, "b")]
@@ -38,22 +62,12 @@ async def test_group_friends_nonempty(xs: list[tuple[int, str]]) -> None:
 
 
 @pytest.mark.asyncio()
-async def test_full_tag_suggestions_1() -> None:
-    database_connection = await aiosqlite.connect("test.db")
-
-    repos = SqliteTagRepository(database_connection)
-    await repos.initialize()
-
+async def test_full_tag_suggestions_1(repos: TagRepository) -> None:
     data = [(1, "a"), (2, "a"), (3, "b")]
     for id, tag in data:
         await repos.add(guild_id=test_guild, user_id=id, tags=[tag], greeter=is_greeter)
 
     res = await repos.get_friend_suggestions(guild_id=test_guild, user_id=1)
-
-    for id, tag in data:
-        await repos.remove_tag(test_guild, id, tag)
-
-    await database_connection.close()
     assert res == list({2: ["a"]}.items())
 
 
@@ -98,13 +112,9 @@ async def test_suggested_friends_order_irrelevant(
     d = await suggest_friends(xs2, amt, user_tags2)
     assert a == b == c == d
 
-@pytest.mark.asyncio()
-async def test_full_tag_suggestions_2() -> None:
-    database_connection = await aiosqlite.connect("test.db")
-
-    repos = SqliteTagRepository(database_connection)
-    await repos.initialize()
 
+@pytest.mark.asyncio()
+async def test_full_tag_suggestions_2(repos: TagRepository) -> None:
     data = [(1, "a"), (2, "a"), (3, "b"), (4, "a")]
 
     for id, tag in data:
@@ -112,11 +122,6 @@ async def test_full_tag_suggestions_2() -> None:
 
     res = await repos.get_friend_suggestions(test_guild, 1)
 
-    for id, tag in data:
-        await repos.remove_tag(test_guild, id, tag)
-
-    await database_connection.close()
-
     assert res == [(4, ["a"]), (2, ["a"])]
 
 
@@ -139,16 +144,11 @@ async def test_suggested_friends_suggestion_ratio() -> None:
     assert res == [(2, ["b", "c", "d"])]
 
 @pytest.mark.asyncio()
-async def test_suggestions_in_same_guild() -> None:
+async def test_suggestions_in_same_guild(repos: TagRepository) -> None:
     # user 1: Alice has tags a, b and is a member of test guild
     # user 2: Bob has tag b and is a member of test guild
     # user 3: Mal has tags a, b, and is a member of other guild
 
-    database_connection = await aiosqlite.connect("test.db")
-
-    repos = SqliteTagRepository(database_connection)
-    await repos.initialize()
-
     data = [
         (test_guild, 1, "a"),
         (test_guild, 1, "b"),
@@ -160,23 +160,14 @@ async def test_suggestions_in_same_guild() -> None:
         await repos.add(guild, id, tag, is_greeter)
 
     res = await repos.get_friend_suggestions(test_guild, 1)
-
-    for guild, id, tag in data:
-        await repos.remove_tag(guild, id, tag)
-    await database_connection.close()
     assert res == [(2, ["b"])]
 
 
 @pytest.mark.asyncio()
-async def test_suggestions_are_greeters() -> None:
+async def test_suggestions_are_greeters(repos: TagRepository) -> None:
     # user 1: Alice has tags a, b and is a greeter
     # user 2: Bob has tag b and is a greeter
     # user 3: Lilly has tags a, b, and is not a greeter
-    database_connection = await aiosqlite.connect("test.db")
-
-    repos = SqliteTagRepository(database_connection)
-    await repos.initialize()
-
     data = [
         (1, "a", is_greeter),
         (1, "b", is_greeter),
@@ -188,24 +179,15 @@ async def test_suggestions_are_greeters() -> None:
         await repos.add(test_guild, id, tag, greeter)
 
     res = await repos.get_friend_suggestions(test_guild, 1)
-
-    for row in data:
-        await repos.remove_tag(test_guild, row[0], row[1])
-    await database_connection.close()
     assert res == [(2, ["b"])]
 
 
 @pytest.mark.asyncio()
-async def test_greeters_update() -> None:
+async def test_greeters_update(repos: TagRepository) -> None:
     # In this test, Lilly becomes a greeter
     # user 1: Alice has tags a, b and is a greeter
     # user 2: Bob has tag b and is a greeter
     # user 3: Lilly has tags a, b, and is not INITALLY a greeter
-    database_connection = await aiosqlite.connect("test.db")
-
-    repos = SqliteTagRepository(database_connection)
-    await repos.initialize()
-
     data = [
         (1, "a", is_greeter),
         (1, "b", is_greeter),
@@ -218,9 +200,158 @@ async def test_greeters_update() -> None:
 
     await repos.update_greeter(test_guild, 3, is_greeter)
     res = await repos.get_friend_suggestions(test_guild, 1)
+    assert res[0] == (3, ["a", "b"])
 
-    for row in data:
-        await repos.remove_tag(test_guild, row[0], row[1])
+
+@pytest.mark.asyncio()
+@given(
+    st.lists(st.tuples(st.integers(), characters)),
+    st.lists(characters, min_size=1),
+    st.integers(min_value=1, max_value=5),
+)
+async def test_friend_ranking_pages_match_suggestions(
+    xs: list[tuple[int, str]],
+    user_tags: list[str],
+    page_size: int,
+) -> None:
+    ranking = FriendRanking(await group_friends(xs), user_tags)
+    expected = await suggest_friends(xs, len(xs) + 1, user_tags)
+
+    pages = [ranking.page(i, page_size) for i in range(ranking.page_count(page_size))]
+    assert [suggestion for page in pages for suggestion in page] == expected
+    assert all(0 < len(page) <= page_size for page in pages)
+
+
+@pytest.mark.asyncio()
+async def test_rank_friend_suggestions() -> None:
+    database_connection = await aiosqlite.connect(":memory:")
+
+    repos = SqliteTagRepository(database_connection)
+    await repos.initialize()
+
+    data = [(1, "a"), (1, "b"), (2, "a"), (3, "b"), (4, "a"), (4, "b"), (5, "c")]
+    for id, tag in data:
+        await repos.add(test_guild, id, [tag], is_greeter)
+
+    ranking = await repos.rank_friend_suggestions(test_guild, 1)
+    top = await repos.get_friend_suggestions(test_guild, 1)
 
     await database_connection.close()
-    assert res[0] == (3, ["a", "b"])
+    # Everyone but user 5 shares a tag with user 1
+    sharing_a_tag = 3
+    assert len(ranking) == sharing_a_tag
+    assert ranking.page(0, 2) == [(4, ["a", "b"]), (3, ["b"])]
+    assert ranking.page(1, 2) == [(2, ["a"])]
+    assert ranking.take(10) == top
+
+
+async def count_tags_from_rows(repos: SqliteTagRepository, guild_id: int) -> TagCounts:
+    counts = TagCounts()
+    greeters = set()
+    async for row in repos.export_rows(guild_id):
+        if row.greeter:
+            counts.tags[row.tag] += 1
+            greeters.add(row.user_id)
+    counts.greeters = len(greeters)
+    return counts
+
+
+@pytest.mark.asyncio()
+async def test_tag_counts_follow_changes() -> None:
+    database_connection = await aiosqlite.connect(":memory:")
+
+    repos = SqliteTagRepository(database_connection)
+    await repos.initialize()
+    # Load the counts into memory before changing anything
+    await repos.get_tag_counts(test_guild)
+
+    await repos.add(test_guild, 1, ["a", "b"], is_greeter)
+    await repos.add(test_guild, 1, ["b", "c"], is_greeter)
+    await repos.add(test_guild, 2, ["a"], not_greeter)
+    await repos.add(test_guild, 3, ["c"], is_greeter)
+    await repos.update_greeter(test_guild, 2, is_greeter)
+    await repos.update_greeter(test_guild, 3, not_greeter)
+    await repos.remove_tag(test_guild, 1, "a")
+    await repos.remove_tag(test_guild, 2, "a")
+    await repos.add(other_guild, 4, ["a"], is_greeter)
+
+    cached = await repos.get_tag_counts(test_guild)
+    expected = await count_tags_from_rows(repos, test_guild)
+
+    # A new repository reads the counts back from the database
+    stored = await SqliteTagRepository(database_connection).get_tag_counts(test_guild)
+    await database_connection.close()
+
+    assert cached.greeters == stored.greeters == expected.greeters == 1
+    assert +cached.tags == +stored.tags == +expected.tags == {"b": 1, "c": 1}
+
+
+@pytest.mark.asyncio()
+async def test_idf_prefers_rare_tags() -> None:
+    # Everyone has the popular tag "p", only greeter 3 shares the rare tag "r"
+    counts = TagCounts(greeters=10, tags={"p": 10, "r": 1})
+    friends = [(2, "p"), (2, "x"), (3, "r"), (3, "y")]
+
+    jaccard_res = await suggest_friends(friends, 2, ["p", "r"])
+    idf_res = await suggest_friends(friends, 2, ["p", "r"], idf_weighted(counts))
+
+    # With plain Jaccard both score 1/3, so the highest user ID wins the tie
+    assert [user_id for user_id, _ in jaccard_res] == [3, 2]
+    assert [user_id for user_id, _ in idf_res] == [3, 2]
+    score = idf_weighted(counts)
+    assert score({"p", "r"}, {"r", "y"}) > score({"p", "r"}, {"p", "x"})
+
+
+@pytest.mark.asyncio()
+@given(st.lists(st.tuples(st.integers(), characters)), st.lists(characters, min_size=1))
+async def test_idf_ties_are_deterministic(xs: list[tuple[int, str]], user_tags: list[str]) -> None:
+    scorer = idf_weighted(TagCounts())
+    ranking = FriendRanking(await group_friends(xs), user_tags, scorer)
+    expected = await suggest_friends(xs, len(xs) + 1, user_tags, scorer)
+    assert ranking.take(len(xs) + 1) == expected
+
+
+@pytest.mark.asyncio()
+async def test_idf_repository_scoring() -> None:
+    database_connection = await aiosqlite.connect(":memory:")
+
+    repos = SqliteTagRepository(database_connection, scoring="idf")
+    await repos.initialize()
+
+    # Greeters 2-5 have the popular tag "p", only greeter 6 shares the rare tag "r" with user 1
+    await repos.add(test_guild, 1, ["p", "r"], not_greeter)
+    for id in range(2, 6):
+        await repos.add(test_guild, id, ["p"], is_greeter)
+    await repos.add(test_guild, 6, ["r", "x"], is_greeter)
+
+    res = await repos.get_friend_suggestions(test_guild, 1)
+    await database_connection.close()
+
+    # Plain Jaccard would rank every "p" greeter (1/2) above greeter 6 (1/3)
+    assert res[0] == (6, ["r", "x"])
+
+
+@pytest.mark.asyncio()
+async def test_taxonomy_changes(repos: TagRepository) -> None:
+    await repos.add(test_guild, 1, ["unix", "networks"], is_greeter)
+    assert not (await repos.get_taxonomy(test_guild)).stored
+
+    # Members keep renamed tags
+    assert await repos.rename_tag(test_guild, "unix", "linux")
+    assert await repos.get_tags(test_guild, 1) == ["linux", "networks"]
+    assert not await repos.rename_tag(test_guild, "linux", "networks")
+    assert not await repos.rename_tag(test_guild, "unix", "bsd")
+
+    rust = await repos.define_tag(test_guild, "rust", "Crabs")
+    assert rust.description == "Crabs"
+    assert await repos.delete_tag(test_guild, "rust") == 0
+    # IDs of deleted tags aren't reused
+    assert (await repos.define_tag(test_guild, "rust", None)).tag_id > rust.tag_id
+
+    assert await repos.delete_tag(test_guild, "networks") == 1
+    assert await repos.get_tags(test_guild, 1) == ["linux"]
+    assert +(await repos.get_tag_counts(test_guild)).tags == {"linux": 1}
+    assert "networks" not in (await repos.get_taxonomy(test_guild)).ids
+
+    # Other guilds are untouched
+    assert not (await repos.get_taxonomy(other_guild)).stored